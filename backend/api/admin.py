@@ -1,7 +1,9 @@
 from django.contrib import admin
 from .models import (
     Hospital, Supplier, MedicalSupply, InventoryBatch, 
-    SupplyRequest, RequestItem, ItemFulfillment, InventoryAlert
+    SupplyRequest, RequestItem, ItemFulfillment, InventoryAlert, StockBalance,
+    InventoryMovement, InventorySnapshot, ArchivedRecord, ReorderThreshold, AlertDailyCount,
+    AlertNotification
 )
 
 @admin.register(Hospital)
@@ -54,3 +56,50 @@ class InventoryAlertAdmin(admin.ModelAdmin):
     list_filter = ('alert_type', 'is_resolved', 'hospital')
     search_fields = ('hospital__name', 'supply__name', 'message')
     date_hierarchy = 'created_at'
+
+@admin.register(StockBalance)
+class StockBalanceAdmin(admin.ModelAdmin):
+    list_display = ('hospital', 'supply', 'total_quantity', 'available_quantity', 'earliest_expiry', 'as_of')
+    list_filter = ('hospital', 'supply__category')
+    search_fields = ('hospital__name', 'supply__name')
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('occurred_at', 'hospital', 'supply', 'batch_number', 'movement_type', 'quantity', 'reference')
+    list_filter = ('movement_type', 'hospital')
+    search_fields = ('batch_number', 'supply__name', 'reference')
+    date_hierarchy = 'occurred_at'
+
+@admin.register(InventorySnapshot)
+class InventorySnapshotAdmin(admin.ModelAdmin):
+    list_display = ('snapshot_date', 'hospital', 'supply', 'quantity', 'cumulative_received', 'cumulative_issued')
+    list_filter = ('hospital',)
+    search_fields = ('hospital__name', 'supply__name')
+    date_hierarchy = 'snapshot_date'
+
+@admin.register(ArchivedRecord)
+class ArchivedRecordAdmin(admin.ModelAdmin):
+    list_display = ('archived_at', 'model', 'object_id', 'root_model', 'root_id', 'reason', 'closed_at')
+    list_filter = ('model', 'reason')
+    search_fields = ('object_id', 'root_id')
+    date_hierarchy = 'archived_at'
+
+@admin.register(ReorderThreshold)
+class ReorderThresholdAdmin(admin.ModelAdmin):
+    list_display = ('hospital', 'supply', 'avg_daily_demand', 'safety_stock', 'reorder_point', 'computed_at')
+    list_filter = ('hospital',)
+    search_fields = ('hospital__name', 'supply__name')
+
+@admin.register(AlertDailyCount)
+class AlertDailyCountAdmin(admin.ModelAdmin):
+    list_display = ('day', 'hospital', 'category', 'alert_type', 'count')
+    list_filter = ('alert_type', 'category')
+    search_fields = ('hospital__name',)
+    date_hierarchy = 'day'
+
+@admin.register(AlertNotification)
+class AlertNotificationAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'hospital', 'alert_type', 'recipient', 'alert_count', 'status', 'attempts', 'sent_at')
+    list_filter = ('status', 'alert_type')
+    search_fields = ('hospital__name', 'recipient', 'subject')
+    date_hierarchy = 'created_at'
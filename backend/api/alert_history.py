@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .archive import _alert_records
+from .models import AlertDailyCount, ArchivedRecord, InventoryAlert
+
+# 预警保留与压缩：超过保留期的已解决预警按 (创建日期, 医院, 物资类型, 预警类型) 计数累加到 AlertDailyCount，
+# 再删除 (或移入归档表) 明细。每批在一个事务中完成计数和删除，同一条预警只会计入日统计或留在明细表其中一处，
+# 趋势和总数统计把两处相加即可得到与压缩前一致的结果
+
+DEFAULT_ALERT_RETENTION_DAYS = 90
+COMPACT_BATCH_SIZE = 1000
+
+
+def compactable_alerts(cutoff):
+    return InventoryAlert.objects.filter(is_resolved=True).filter(
+        Q(resolved_time__lt=cutoff) | Q(resolved_time__isnull=True, updated_at__lt=cutoff)
+    )
+
+
+def _daily_key(alert):
+    category = alert.supply.category if alert.supply_id else ''
+    return alert.created_at.date(), alert.hospital_id, category, alert.alert_type
+
+
+def _add_daily_counts(counts):
+    """把 {(日期, 医院, 物资类型, 预警类型): 数量} 累加到日统计：先补齐不存在的行，再用一条 UPDATE 增加计数"""
+    AlertDailyCount.objects.bulk_create([
+        AlertDailyCount(day=day, hospital_id=hospital_id, category=category, alert_type=alert_type)
+        for day, hospital_id, category, alert_type in counts
+    ], ignore_conflicts=True)
+    rows = AlertDailyCount.objects.filter(
+        day__in={key[0] for key in counts}, hospital_id__in={key[1] for key in counts},
+    ).values_list('pk', 'day', 'hospital_id', 'category', 'alert_type')
+    deltas = {pk: counts[key] for pk, *key in rows if tuple(key) in counts}
+    AlertDailyCount.objects.filter(pk__in=list(deltas)).update(
+        count=F('count') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def compact_alerts(retention_days=DEFAULT_ALERT_RETENTION_DAYS, batch_size=COMPACT_BATCH_SIZE, archive=False,
+                   dry_run=False):
+    """
+    压缩解决超过 retention_days 天的预警，返回 (压缩的预警数, 涉及的日统计行数)。
+    archive=True 时明细写入 ArchivedRecord 后再删除；dry_run=True 时只统计待压缩的预警数。
+    """
+    queryset = compactable_alerts(timezone.now() - timedelta(days=retention_days))
+    if dry_run:
+        return queryset.count(), None
+
+    alerts_count = 0
+    daily_keys = set()
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            chunk = queryset.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            alerts = list(chunk.select_related('supply').select_for_update(of=('self',))[:batch_size])
+            if not alerts:
+                break
+            counts = defaultdict(int)
+            for alert in alerts:
+                counts[_daily_key(alert)] += 1
+            _add_daily_counts(counts)
+            if archive:
+                ArchivedRecord.objects.bulk_create(_alert_records(alerts), batch_size=batch_size)
+            InventoryAlert.all_objects.filter(pk__in=[alert.pk for alert in alerts]).delete()
+        alerts_count += len(alerts)
+        daily_keys.update(counts)
+        last_pk = alerts[-1].pk
+    return alerts_count, len(daily_keys)
+
+
+def alert_counts_by_day(start, end):
+    """[start, end] 内每天各类型新建的预警数 (含已压缩的)，返回 {(日期, 预警类型): 数量}"""
+    counts = defaultdict(int)
+    live = InventoryAlert.objects.filter(
+        created_at__gte=datetime.combine(start, time.min),
+        created_at__lt=datetime.combine(end + timedelta(days=1), time.min),
+    ).annotate(day=TruncDate('created_at')).values('day', 'alert_type').annotate(total=Count('pk'))
+    for day, alert_type, total in live.values_list('day', 'alert_type', 'total').order_by():
+        counts[(day, alert_type)] += total
+    compacted = AlertDailyCount.objects.filter(day__gte=start, day__lte=end).values('day', 'alert_type').annotate(
+        total=Sum('count')
+    )
+    for day, alert_type, total in compacted.values_list('day', 'alert_type', 'total').order_by():
+        counts[(day, alert_type)] += int(total)
+    return counts
+
+
+def total_alert_count():
+    """全部预警数：明细表中未删除的预警加上已压缩的计数"""
+    compacted = AlertDailyCount.objects.aggregate(total=Sum('count'))['total'] or 0
+    return InventoryAlert.objects.count() + int(compacted)
@@ -0,0 +1,263 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.utils import timezone
+from .functions import bulk_upsert
+from .models import Hospital, InventoryAlert, InventoryBatch, StockBalance, alert_open_key
+from .reorder import reorder_level
+from .stock import quarantine_expired_batches, refresh_stale_stock_balances, release_unexpired_batches
+
+# 预警检查：每类预警用一次分组查询找出当前满足条件的 (医院, 物资, 批次)，
+# 与一次性读取的未解决预警键 (open_key) 集合比较，只批量插入新出现的预警，
+# 条件已不再满足的未解决预警由系统用户批量标记为已解决。
+# hospital_ids/supply_ids 用于限定检查范围 (命令行 --hospital、按变动的医院/物资增量检查)。
+# 批次/分配记录写入后，受影响的 (医院, 物资) 在事务提交后增量评估；
+# 请求内 (AlertEvaluationMiddleware) 的多次写入合并为请求结束时的一次评估
+
+logger = logging.getLogger(__name__)
+
+AlertType = InventoryAlert.AlertType
+
+# 失效日期在多少天内视为即将过期
+EXPIRY_WARNING_DAYS = 30
+ALERT_BATCH_SIZE = 1000
+# 自动解决预警时记录的解决人
+SYSTEM_USERNAME = 'system'
+
+_state = threading.local()
+
+
+def open_alerts(alert_type, hospital_ids=None, supply_ids=None):
+    """检查范围内的未解决预警，返回 {open_key: alert_id}"""
+    alerts = InventoryAlert.objects.filter(alert_type=alert_type, is_resolved=False, is_deleted=False)
+    if hospital_ids is not None:
+        alerts = alerts.filter(hospital_id__in=hospital_ids)
+    # 仓储容量预警不区分物资
+    if supply_ids is not None and alert_type != AlertType.CAPACITY:
+        alerts = alerts.filter(supply_id__in=supply_ids)
+    return dict(alerts.values_list('open_key', 'alert_id'))
+
+
+def system_user():
+    """自动解决预警的解决人：不可登录的系统用户，不存在时创建"""
+    user, _ = User.objects.get_or_create(
+        username=SYSTEM_USERNAME, defaults={'is_active': False, 'password': make_password(None)}
+    )
+    return user
+
+
+def resolve_alerts(alert_ids, resolver=None):
+    """把给定预警批量标记为已解决 (每 ALERT_BATCH_SIZE 条一条 UPDATE)，返回更新行数"""
+    alert_ids = list(alert_ids)
+    if not alert_ids:
+        return 0
+    resolver = resolver or system_user()
+    now = timezone.now()
+    count = 0
+    for start in range(0, len(alert_ids), ALERT_BATCH_SIZE):
+        count += InventoryAlert.objects.filter(
+            pk__in=alert_ids[start:start + ALERT_BATCH_SIZE], is_resolved=False
+        ).update(is_resolved=True, resolved_by=resolver, resolved_time=now, open_key=None, updated_at=now)
+    return count
+
+
+def _scoped(queryset, hospital_ids, supply_ids):
+    if hospital_ids is not None:
+        queryset = queryset.filter(hospital_id__in=hospital_ids)
+    if supply_ids is not None:
+        queryset = queryset.filter(supply_id__in=supply_ids)
+    return queryset
+
+
+def low_stock_alerts(today, hospital_ids=None, supply_ids=None):
+    """未过期库存低于补货阈值 (再订货点或最低库存量) 的医院/物资"""
+    refresh_stale_stock_balances(**({'hospital_id__in': hospital_ids} if hospital_ids is not None else {}))
+    rows = _scoped(StockBalance.objects, hospital_ids, supply_ids).annotate(threshold=reorder_level()).filter(
+        available_quantity__lt=models.F('threshold'), hospital__is_deleted=False, supply__is_deleted=False,
+    ).values_list('hospital_id', 'supply_id', 'supply__name', 'available_quantity', 'threshold')
+    return [
+        InventoryAlert(
+            hospital_id=hospital_id, supply_id=supply_id, alert_type=AlertType.LOW_STOCK,
+            message=f'{supply_name}库存不足，当前数量：{available}，最低要求：{threshold}',
+        )
+        for hospital_id, supply_id, supply_name, available, threshold in rows
+    ]
+
+
+def expiring_alerts(today, hospital_ids=None, supply_ids=None):
+    """失效日期在未来 EXPIRY_WARNING_DAYS 天内、仍有库存的批次"""
+    rows = _scoped(InventoryBatch.objects, hospital_ids, supply_ids).filter(
+        expiration_date__gt=today, expiration_date__lte=today + timedelta(days=EXPIRY_WARNING_DAYS),
+        is_deleted=False, quantity__gt=0,
+    ).values_list('batch_id', 'hospital_id', 'supply_id', 'supply__name', 'batch_number', 'expiration_date')
+    return [
+        InventoryAlert(
+            hospital_id=hospital_id, supply_id=supply_id, batch_id=batch_id, alert_type=AlertType.EXPIRING,
+            message=f'{supply_name}（批次：{batch_number}）将在{(expiration_date - today).days}天后过期',
+        )
+        for batch_id, hospital_id, supply_id, supply_name, batch_number, expiration_date in rows
+    ]
+
+
+def expired_alerts(today, hospital_ids=None, supply_ids=None):
+    """已过期 (失效日期早于今天) 仍有库存的批次，无论是否已被过期清扫隔离"""
+    rows = _scoped(InventoryBatch.objects, hospital_ids, supply_ids).filter(
+        expiration_date__lt=today, is_deleted=False, quantity__gt=0,
+    ).values_list('batch_id', 'hospital_id', 'supply_id', 'supply__name', 'batch_number', 'expiration_date', 'quantity')
+    return [
+        InventoryAlert(
+            hospital_id=hospital_id, supply_id=supply_id, batch_id=batch_id, alert_type=AlertType.EXPIRED,
+            message=f'{supply_name}（批次：{batch_number}）已于{expiration_date}过期，仍有库存{quantity}',
+        )
+        for batch_id, hospital_id, supply_id, supply_name, batch_number, expiration_date, quantity in rows
+    ]
+
+
+def capacity_alerts(today, hospital_ids=None, supply_ids=None):
+    """仓储使用率达到 (100 - 预警阈值)% 的医院；current_capacity 随出入库增量维护，直接在 SQL 中筛选"""
+    hospitals = Hospital.objects.all() if hospital_ids is None else Hospital.objects.filter(pk__in=hospital_ids)
+    rows = hospitals.filter(
+        is_active=True, storage_volume__gt=0,
+        current_capacity__gte=models.F('storage_volume') * (100 - models.F('warning_threshold')) / 100,
+    ).values_list('hospital_id', 'name', 'current_capacity', 'storage_volume')
+    return [
+        InventoryAlert(
+            hospital_id=hospital_id, alert_type=AlertType.CAPACITY,
+            message=f'{name}仓储容量接近上限，当前使用率: {current_capacity / storage_volume * 100:.2f}%',
+        )
+        for hospital_id, name, current_capacity, storage_volume in rows
+    ]
+
+
+ALERT_CHECKS = {
+    'low_stock': (AlertType.LOW_STOCK, low_stock_alerts),
+    'expiring': (AlertType.EXPIRING, expiring_alerts),
+    'expired': (AlertType.EXPIRED, expired_alerts),
+    'capacity': (AlertType.CAPACITY, capacity_alerts),
+}
+
+
+def run_alert_check(name, hospital_ids=None, supply_ids=None, dry_run=False, today=None):
+    """
+    执行一类预警检查，返回 {'matched': 满足条件的数量, 'created': 新建预警数, 'resolved': 自动解决数, 'seconds': 耗时}。
+    范围内条件已不再满足的未解决预警自动解决。dry_run=True 时只统计不写入。
+    """
+    started = time.perf_counter()
+    today = today or timezone.now().date()
+    alert_type, find_alerts = ALERT_CHECKS[name]
+    candidates = find_alerts(today, hospital_ids, supply_ids)
+    existing = open_alerts(alert_type, hospital_ids, supply_ids)
+    current = set()
+    new_alerts = []
+    for alert in candidates:
+        alert.open_key = alert_open_key(alert_type, alert.hospital_id, alert.supply_id, alert.batch_id)
+        if alert.open_key not in existing and alert.open_key not in current:
+            new_alerts.append(alert)
+        current.add(alert.open_key)
+    cleared = [alert_id for key, alert_id in existing.items() if key not in current]
+    resolved = len(cleared)
+    if not dry_run:
+        if new_alerts:
+            # 并发检查可能已插入同一预警：按 open_key 唯一约束 upsert，只更新信息，不会产生重复行
+            bulk_upsert(InventoryAlert, new_alerts, ['open_key'], ['message', 'updated_at'],
+                        batch_size=ALERT_BATCH_SIZE)
+        resolved = resolve_alerts(cleared)
+    return {
+        'matched': len(candidates),
+        'created': len(new_alerts),
+        'resolved': resolved,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def run_alert_checks(checks=None, hospital_ids=None, supply_ids=None, dry_run=False):
+    """按顺序执行各类预警检查，返回 {检查名称: 统计}"""
+    today = timezone.now().date()
+    return {
+        name: run_alert_check(name, hospital_ids, supply_ids, dry_run=dry_run, today=today)
+        for name in (checks or ALERT_CHECKS)
+    }
+
+
+def sweep_expired_stock(hospital_ids=None, dry_run=False):
+    """
+    过期清扫：隔离已过期仍有库存的批次，并为其批量创建已过期预警；同时解除失效日期已更正为未过期的批次的隔离。
+    返回 (隔离的批次数, 解除隔离的批次数, 已过期预警检查的统计)。
+    """
+    today = timezone.now().date()
+    quarantined = quarantine_expired_batches(hospital_ids, today=today, dry_run=dry_run)
+    released = release_unexpired_batches(hospital_ids, today=today, dry_run=dry_run)
+    return quarantined, released, run_alert_check('expired', hospital_ids, dry_run=dry_run, today=today)
+
+
+def evaluate_alerts(keys):
+    """增量评估：只检查 keys 中的 (医院, 物资) 及其所属医院的仓储容量"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    hospital_ids = sorted({hospital_id for hospital_id, _ in keys}, key=str)
+    supply_ids = sorted({supply_id for _, supply_id in keys})
+    return run_alert_checks(hospital_ids=hospital_ids, supply_ids=supply_ids)
+
+
+def _evaluate_quietly(keys):
+    # 数据已经提交，预警评估失败不影响本次写入，记录日志后由定时全量检查补齐
+    try:
+        evaluate_alerts(keys)
+    except Exception:
+        logger.exception('Incremental alert evaluation failed for %d keys', len(keys))
+
+
+def _committed(keys):
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        _evaluate_quietly(keys)
+    else:
+        pending.update(keys)
+
+
+def queue_alert_evaluation(keys):
+    """
+    记录库存发生变化的 (医院, 物资)，所在事务提交后评估预警 (回滚时丢弃)。
+    在 deferred_alert_evaluation 代码块内推迟到代码块结束时合并评估，在 alert_evaluation_suspended 代码块内不评估。
+    """
+    if alert_evaluation_is_suspended():
+        return
+    keys = {(hospital_id, supply_id) for hospital_id, supply_id in keys if hospital_id and supply_id}
+    if keys:
+        transaction.on_commit(lambda: _committed(keys))
+
+
+@contextmanager
+def alert_evaluation_suspended():
+    """在代码块内 (当前线程) 不做增量预警评估，由调用方之后运行全量检查或不需要预警 (如压测数据)"""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def alert_evaluation_is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+@contextmanager
+def deferred_alert_evaluation():
+    """在代码块内收集已提交写入影响的 (医院, 物资)，结束时一次性评估；嵌套时由最外层评估"""
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = set()
+    try:
+        yield
+    finally:
+        pending, _state.pending = _state.pending, None
+        if pending:
+            _evaluate_quietly(pending)
@@ -0,0 +1,198 @@
+from collections import defaultdict, namedtuple
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from .alerts import queue_alert_evaluation
+from .ledger import build_movement, record_movements
+from .models import InventoryBatch, InventoryMovement, ItemFulfillment, RequestItem
+from .stock import adjust_stock_balance, stock_maintenance_suspended
+
+# 先到期先出 (FEFO) 的批次拣选：
+# 候选批次按失效日期、入库日期排序，先不加锁读取，再只对补足需求所需的批次以 SELECT ... FOR UPDATE SKIP LOCKED 加锁，
+# 并发的分配事务各自拿到互不重叠的批次，不会重复扣减同一批次；跳过后仍不足时再等待被锁定的批次；
+# 分配记录批量插入，批次数量用一条 UPDATE ... CASE 扣减，出库流水、库存余额和仓储占用在同一事务中增量维护
+
+# 每次读取的候选批次数
+PICK_CHUNK_SIZE = 20
+
+AllocationResult = namedtuple('AllocationResult', ['allocated', 'picked', 'released', 'shortfall', 'fulfillments'])
+
+
+def _candidate_batches(hospital_id, supply_id, today):
+    return InventoryBatch.objects.filter(
+        hospital_id=hospital_id, supply_id=supply_id, is_deleted=False, is_quarantined=False,
+        quality_check_passed=True, quantity__gt=0, expiration_date__gte=today,
+    ).order_by('expiration_date', 'received_date', 'batch_id').only(
+        'batch_id', 'batch_number', 'hospital_id', 'supply_id', 'quantity', 'expiration_date'
+    )
+
+
+def _lock_in_groups(hospital_id, supply_id, today, candidates, remaining, picks, skip_locked):
+    """
+    按 FEFO 顺序把 candidates ([(batch_id, 未加锁读到的数量)]) 分成小组加锁，每组只取预计恰好补足缺口的批次，
+    按加锁后的最新数量拣选。返回 (剩余缺口, 被其他事务锁定而跳过的候选)。
+    """
+    skipped = []
+    group, estimate = [], 0
+    for index, (batch_id, quantity) in enumerate(candidates):
+        group.append((batch_id, quantity))
+        estimate += quantity
+        if estimate < remaining and index < len(candidates) - 1:
+            continue
+        locked = list(
+            _candidate_batches(hospital_id, supply_id, today)
+            .filter(pk__in=[batch_id for batch_id, _ in group])
+            .select_for_update(skip_locked=skip_locked)
+        )
+        locked_ids = {batch.pk for batch in locked}
+        skipped.extend(candidate for candidate in group if candidate[0] not in locked_ids)
+        for batch in locked:
+            take = min(batch.quantity, remaining)
+            picks.append((batch, take))
+            remaining -= take
+            if not remaining:
+                return remaining, skipped
+        group, estimate = [], 0
+    return remaining, skipped
+
+
+def pick_batches(hospital_id, supply_id, quantity, today=None):
+    """
+    按 FEFO 顺序加锁拣选批次，返回 ([(batch, 拣选数量)], 缺口数量)。必须在事务中调用。
+    候选批次先不加锁读取，再按需要的数量分小组以 SKIP LOCKED 加锁，并发分配只占用各自需要的批次；
+    仍有缺口时对被跳过的批次阻塞加锁，等其他事务提交后按最新数量再拣选，缺口即为真实缺货。
+    """
+    today = today or timezone.now().date()
+    picks = []
+    seen = []
+    skipped = []
+    remaining = quantity
+    while remaining > 0:
+        chunk = list(
+            _candidate_batches(hospital_id, supply_id, today)
+            .exclude(pk__in=seen)
+            .values_list('batch_id', 'quantity')[:PICK_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        seen.extend(batch_id for batch_id, _ in chunk)
+        remaining, chunk_skipped = _lock_in_groups(
+            hospital_id, supply_id, today, chunk, remaining, picks, skip_locked=True
+        )
+        skipped.extend(chunk_skipped)
+        if len(chunk) < PICK_CHUNK_SIZE:
+            break
+    if remaining and skipped:
+        remaining, _ = _lock_in_groups(hospital_id, supply_id, today, skipped, remaining, picks, skip_locked=False)
+    return picks, remaining
+
+
+def _change_batch_quantities(deltas, now):
+    """用一条 UPDATE 按批次增减数量，deltas 为 {batch_id: 变动量}"""
+    InventoryBatch.objects.filter(pk__in=list(deltas)).update(
+        quantity=F('quantity') + Case(
+            *[When(pk=batch_id, then=Value(delta)) for batch_id, delta in deltas.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=now,
+    )
+
+
+def _issue(item, hospital_id, picks, operator_id, today, now):
+    fulfillments = [
+        ItemFulfillment(request_item=item, inventory_batch=batch, quantity=take, fulfilled_by_id=operator_id)
+        for batch, take in picks
+    ]
+    ItemFulfillment.objects.bulk_create(fulfillments)
+    _change_batch_quantities({batch.pk: -take for batch, take in picks}, now)
+    record_movements([
+        build_movement(batch, -take, InventoryMovement.MovementType.ISSUE,
+                       reference=str(fulfillment.pk), operator_id=operator_id)
+        for (batch, take), fulfillment in zip(picks, fulfillments)
+    ])
+    adjust_stock_balance(
+        hospital_id, item.supply_id, [(batch.expiration_date, -take) for batch, take in picks], today
+    )
+    queue_alert_evaluation({(hospital_id, item.supply_id)})
+    return fulfillments
+
+
+def _release(item, quantity, operator_id, today, now):
+    """减少分配时按最近的分配记录依次退回批次 (同时锁定分配记录和批次)，返回退回数量"""
+    fulfillments = list(
+        ItemFulfillment.objects.filter(request_item=item, is_deleted=False)
+        .select_related('inventory_batch')
+        .select_for_update()
+        .order_by('-fulfilled_time')
+    )
+    remaining = quantity
+    returned = []
+    for fulfillment in fulfillments:
+        if not remaining:
+            break
+        give_back = min(fulfillment.quantity, remaining)
+        returned.append((fulfillment, give_back))
+        remaining -= give_back
+    if not returned:
+        return 0
+
+    emptied = [fulfillment.pk for fulfillment, give_back in returned if give_back == fulfillment.quantity]
+    reduced = [(fulfillment, give_back) for fulfillment, give_back in returned if give_back < fulfillment.quantity]
+    # 分配记录的信号会逐行刷新库存余额，这里统一增量维护，因此暂停信号维护
+    with stock_maintenance_suspended():
+        if emptied:
+            ItemFulfillment.objects.filter(pk__in=emptied).delete()
+        for fulfillment, give_back in reduced:
+            ItemFulfillment.objects.filter(pk=fulfillment.pk).update(
+                quantity=F('quantity') - give_back, updated_at=now
+            )
+
+    batch_deltas = defaultdict(int)
+    for fulfillment, give_back in returned:
+        batch_deltas[fulfillment.inventory_batch_id] += give_back
+    _change_batch_quantities(batch_deltas, now)
+    record_movements([
+        build_movement(fulfillment.inventory_batch, give_back, InventoryMovement.MovementType.RETURN,
+                       reference=str(fulfillment.pk), operator_id=operator_id)
+        for fulfillment, give_back in returned
+    ])
+    changes_by_key = defaultdict(list)
+    for fulfillment, give_back in returned:
+        batch = fulfillment.inventory_batch
+        changes_by_key[(batch.hospital_id, batch.supply_id)].append((batch.expiration_date, give_back))
+    for (hospital_id, supply_id), changes in changes_by_key.items():
+        adjust_stock_balance(hospital_id, supply_id, changes, today)
+    queue_alert_evaluation(changes_by_key)
+    return quantity - remaining
+
+
+def allocate_item(item, target, operator_id=None, source_hospital_id=None, allow_partial=False):
+    """
+    把请求项的已分配数量调整为 target：增加时按 FEFO 从 source_hospital_id (默认请求所属医院) 的批次出库，
+    减少时退回最近的分配记录 (没有分配记录支撑的历史分配数量直接扣除)。
+    item 需已在当前事务中以 select_for_update 锁定。
+    库存不足且 allow_partial=False 时不写入任何数据，返回的 shortfall 大于 0。
+    """
+    now = timezone.now()
+    today = now.date()
+    delta = target - item.allocated
+    if not delta:
+        return AllocationResult(item.allocated, 0, 0, 0, [])
+
+    with transaction.atomic():
+        fulfillments, picked, released, shortfall = [], 0, 0, 0
+        if delta > 0:
+            hospital_id = source_hospital_id or item.request.hospital_id
+            picks, shortfall = pick_batches(hospital_id, item.supply_id, delta, today)
+            if shortfall and not allow_partial:
+                return AllocationResult(item.allocated, 0, 0, shortfall, [])
+            if picks:
+                fulfillments = _issue(item, hospital_id, picks, operator_id, today, now)
+            picked = delta - shortfall
+            item.allocated += picked
+        else:
+            released = _release(item, -delta, operator_id, today, now)
+            item.allocated = target
+        item.updated_at = now
+        RequestItem.objects.filter(pk=item.pk).update(allocated=item.allocated, updated_at=now)
+    return AllocationResult(item.allocated, picked, released, shortfall, fulfillments)
@@ -0,0 +1,158 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import ArchivedRecord, InventoryAlert, InventoryBatch, ItemFulfillment, RequestItem, SupplyRequest
+from .stock import stock_maintenance_suspended
+
+# 归档：把已逻辑删除、或关闭超过保留期的记录连同子记录写入 ArchivedRecord 后从业务表删除。
+# 每批在一个事务中加锁读取至多 batch_size 条根记录，写入归档后级联删除，单个事务的锁和 undo 量有上限；
+# 分配记录只是出库的历史凭证，删除时不影响批次数量，因此暂停库存余额的信号维护
+
+ARCHIVE_BATCH_SIZE = 500
+DEFAULT_RETENTION_DAYS = 180
+
+CLOSED_REQUEST_STATUSES = [
+    SupplyRequest.RequestStatus.FULFILLED,
+    SupplyRequest.RequestStatus.REJECTED,
+    SupplyRequest.RequestStatus.CANCELLED,
+]
+
+Reason = ArchivedRecord.Reason
+
+
+def _record(instance, root, hospital_id, reason, closed_at):
+    return ArchivedRecord(
+        model=instance._meta.model_name,
+        object_id=str(instance.pk),
+        root_model=root._meta.model_name,
+        root_id=str(root.pk),
+        hospital_id=hospital_id,
+        reason=reason,
+        closed_at=closed_at,
+        data={field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields},
+    )
+
+
+def _reason(instance):
+    return Reason.DELETED if instance.is_deleted else Reason.CLOSED
+
+
+def _request_records(requests):
+    """请求及其请求项、分配记录"""
+    requests_by_pk = {request.pk: request for request in requests}
+    items = {
+        item.pk: item for item in RequestItem.all_objects.filter(request__in=list(requests_by_pk))
+    }
+    records = []
+    for request in requests:
+        records.append(_record(request, request, request.hospital_id, _reason(request), request.updated_at))
+    for item in items.values():
+        request = requests_by_pk[item.request_id]
+        records.append(_record(item, request, request.hospital_id, _reason(request), request.updated_at))
+    for fulfillment in ItemFulfillment.all_objects.filter(request_item__in=list(items)):
+        request = requests_by_pk[items[fulfillment.request_item_id].request_id]
+        records.append(_record(fulfillment, request, request.hospital_id, _reason(request), request.updated_at))
+    return records
+
+
+def _item_records(items):
+    """未删除请求中已删除的请求项及其分配记录，归档根为所属请求，便于与请求一起查询"""
+    items_by_pk = {item.pk: item for item in items}
+    records = [
+        _record(item, item.request, item.request.hospital_id, Reason.DELETED, item.updated_at) for item in items
+    ]
+    for fulfillment in ItemFulfillment.all_objects.filter(request_item__in=list(items_by_pk)):
+        item = items_by_pk[fulfillment.request_item_id]
+        records.append(_record(fulfillment, item.request, item.request.hospital_id, Reason.DELETED, item.updated_at))
+    return records
+
+
+def _alert_records(alerts):
+    return [
+        _record(alert, alert, alert.hospital_id, _reason(alert), alert.resolved_time or alert.updated_at)
+        for alert in alerts
+    ]
+
+
+def _batch_records(batches):
+    """已删除的批次及引用它的预警"""
+    batches_by_pk = {batch.pk: batch for batch in batches}
+    records = [_record(batch, batch, batch.hospital_id, Reason.DELETED, batch.updated_at) for batch in batches]
+    for alert in InventoryAlert.all_objects.filter(batch__in=list(batches_by_pk)):
+        batch = batches_by_pk[alert.batch_id]
+        records.append(_record(alert, batch, batch.hospital_id, Reason.DELETED, batch.updated_at))
+    return records
+
+
+def archivable_requests(cutoff):
+    return SupplyRequest.all_objects.filter(
+        Q(is_deleted=True) | Q(status__in=CLOSED_REQUEST_STATUSES, updated_at__lt=cutoff)
+    )
+
+
+def archivable_items(cutoff):
+    # 所属请求整体归档时请求项随请求一起处理，这里只处理仍在使用的请求中已删除的请求项
+    return RequestItem.all_objects.filter(is_deleted=True, request__is_deleted=False).select_related('request')
+
+
+def archivable_alerts(cutoff):
+    # 已解决的预警由 compact_alerts 计入日统计后再删除/归档，这里只处理已删除的预警
+    return InventoryAlert.all_objects.filter(is_deleted=True)
+
+
+def archivable_batches(cutoff):
+    # 仍被分配记录引用的批次要等对应请求归档后再归档
+    return InventoryBatch.all_objects.filter(is_deleted=True).filter(
+        ~Exists(ItemFulfillment.all_objects.filter(inventory_batch=OuterRef('pk')))
+    )
+
+
+# 归档顺序：请求先于批次，使已关闭请求的分配记录先移出，批次才不再被引用
+ARCHIVE_TARGETS = {
+    'requests': (archivable_requests, _request_records),
+    'items': (archivable_items, _item_records),
+    'alerts': (archivable_alerts, _alert_records),
+    'batches': (archivable_batches, _batch_records),
+}
+
+
+def _archive_in_batches(queryset, build_records, batch_size):
+    """按主键分批加锁、写入归档并删除，返回归档的根记录数和归档行数"""
+    roots_count, records_count = 0, 0
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            chunk = queryset.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            roots = list(chunk.select_for_update(of=('self',))[:batch_size])
+            if not roots:
+                break
+            records = build_records(roots)
+            ArchivedRecord.objects.bulk_create(records, batch_size=batch_size)
+            with stock_maintenance_suspended():
+                queryset.model.all_objects.filter(pk__in=[root.pk for root in roots]).delete()
+        roots_count += len(roots)
+        records_count += len(records)
+        last_pk = roots[-1].pk
+    return roots_count, records_count
+
+
+def archive_records(targets=None, retention_days=DEFAULT_RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                    dry_run=False):
+    """
+    归档各类记录，返回 {类别: (根记录数, 归档行数)}。
+    dry_run=True 时只统计待归档的根记录数，不写入。
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    results = {}
+    for name, (candidates, build_records) in ARCHIVE_TARGETS.items():
+        if targets and name not in targets:
+            continue
+        queryset = candidates(cutoff)
+        if dry_run:
+            results[name] = (queryset.count(), None)
+        else:
+            results[name] = _archive_in_batches(queryset, build_records, batch_size)
+    return results
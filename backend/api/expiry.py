@@ -0,0 +1,57 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import Sum
+from .models import ExpiryBucket, InventoryBatch, expiry_week
+
+# 失效日历查询：[start, end) 内完整的周直接汇总 ExpiryBucket，
+# 首尾不足一周的部分 (至多各 6 天) 再按失效日期范围汇总批次，结果与逐批次统计一致
+
+
+def _bucket_totals(totals, first_week, last_week, filters):
+    buckets = ExpiryBucket.objects.filter(week_start__lt=last_week, quantity__gt=0, **filters)
+    if first_week is not None:
+        buckets = buckets.filter(week_start__gte=first_week)
+    for hospital_id, supply_id, quantity in buckets.values('hospital_id', 'supply_id').annotate(
+        total=Sum('quantity')
+    ).values_list('hospital_id', 'supply_id', 'total').order_by():
+        totals[(hospital_id, supply_id)] += int(quantity)
+
+
+def _batch_totals(totals, start, end, filters):
+    batches = InventoryBatch.objects.filter(is_deleted=False, quantity__gt=0, expiration_date__lt=end, **filters)
+    if start is not None:
+        batches = batches.filter(expiration_date__gte=start)
+    for hospital_id, supply_id, quantity in batches.values('hospital_id', 'supply_id').annotate(
+        total=Sum('quantity')
+    ).values_list('hospital_id', 'supply_id', 'total').order_by():
+        totals[(hospital_id, supply_id)] += int(quantity)
+
+
+def expiring_quantities(start, end, hospital_id=None, supply_id=None):
+    """
+    失效日期在 [start, end) 内的在库数量，返回 {(hospital_id, supply_id): 数量}。
+    start 为 None 表示不限起始日期 (用于统计已过期仍在库的数量)。
+    """
+    filters = {}
+    if hospital_id:
+        filters['hospital_id'] = hospital_id
+    if supply_id:
+        filters['supply_id'] = supply_id
+
+    totals = defaultdict(int)
+    # 第一个完整周从 start 当天或之后的第一个周一开始，最后一个完整周在 end 所在周之前结束
+    if start is None:
+        first_week = None
+    else:
+        first_week = start if start.weekday() == 0 else expiry_week(start) + timedelta(days=7)
+    last_week = expiry_week(end)
+
+    if first_week is None or first_week < last_week:
+        _bucket_totals(totals, first_week, last_week, filters)
+        if first_week is not None and start < first_week:
+            _batch_totals(totals, start, first_week, filters)
+        if last_week < end:
+            _batch_totals(totals, last_week, end, filters)
+    elif start < end:
+        _batch_totals(totals, start, end, filters)
+    return {key: quantity for key, quantity in totals.items() if quantity}
@@ -0,0 +1,36 @@
+from django.db import connections, router
+from django.db.models import DateField, Func, IntegerField, Value
+
+
+# 数据库函数：计算日期字段距离给定日期的天数 (expression - date)，用于在 SQL 中直接求剩余有效天数
+# MySQL 的 DATEDIFF(a, b) 即 a - b 的天数，其他后端单独给出等价写法
+class DaysUntil(Func):
+    function = 'DATEDIFF'
+    output_field = IntegerField()
+
+    def __init__(self, expression, date, **extra):
+        super().__init__(expression, Value(date, output_field=DateField()), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=500):
+    """
+    bulk_create(update_conflicts=True) 的跨数据库封装。
+    MySQL 的 ON DUPLICATE KEY UPDATE 不能指定冲突字段，其他后端 (PostgreSQL/SQLite) 则必须指定。
+    """
+    connection = connections[router.db_for_write(model)]
+    kwargs = {'update_conflicts': True, 'update_fields': update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = unique_fields
+    return model.objects.bulk_create(objs, batch_size=batch_size, **kwargs)
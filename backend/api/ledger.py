@@ -0,0 +1,202 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+from .functions import bulk_upsert
+from .models import Hospital, InventoryMovement, InventorySnapshot
+from .stock import adjust_hospital_capacity
+
+# 出入库流水与每日快照：
+# 单条批次写入由信号处理函数根据加载时/当前的数量生成流水，批量写入由调用方用 build_movement 生成后 record_movements；
+# 流水类型默认按 入库(新建批次)/盘点调整(修改数量)/调拨(批次改变医院或物资) 推断，
+# 出库、过期报损等业务操作在 movement_context 中写入批次，以指定类型和关联单据
+
+MovementType = InventoryMovement.MovementType
+
+SNAPSHOT_UPDATE_FIELDS = ['quantity', 'cumulative_received', 'cumulative_issued', 'created_at']
+
+_state = threading.local()
+
+
+@contextmanager
+def movement_context(movement_type, reference='', operator_id=None):
+    """在代码块内，信号记录的批次数量变动使用给定的流水类型、关联单据和操作人"""
+    previous = getattr(_state, 'context', None)
+    _state.context = (movement_type, str(reference) if reference else '', operator_id)
+    try:
+        yield
+    finally:
+        _state.context = previous
+
+
+def _current_context():
+    return getattr(_state, 'context', None)
+
+
+def build_movement(batch, quantity, movement_type, reference='', operator_id=None,
+                   hospital_id=None, supply_id=None, link_batch=True):
+    """
+    生成一条未保存的流水。hospital_id/supply_id 用于记录批次的原归属 (调出)；
+    批次已被物理删除时 link_batch=False，只保留批次号。
+    """
+    return InventoryMovement(
+        hospital_id=hospital_id or batch.hospital_id,
+        supply_id=supply_id or batch.supply_id,
+        batch_id=batch.pk if link_batch else None,
+        batch_number=batch.batch_number,
+        movement_type=movement_type,
+        quantity=quantity,
+        reference=reference,
+        operator_id=operator_id,
+    )
+
+
+def batch_movements(batch, created=False, deleted=False):
+    """
+    比较批次加载时与当前的状态，生成对应的流水 (无变动时返回空列表)。
+    已逻辑删除或物理删除的批次按在库数量为零处理。
+    """
+    loaded = {} if created else getattr(batch, '_loaded_values', {})
+    old_hospital_id = loaded.get('hospital_id', batch.hospital_id)
+    old_supply_id = loaded.get('supply_id', batch.supply_id)
+    if created:
+        old_quantity = 0
+    else:
+        old_quantity = 0 if loaded.get('is_deleted', batch.is_deleted) else loaded.get('quantity', batch.quantity)
+    new_quantity = 0 if deleted or batch.is_deleted else batch.quantity
+
+    context = _current_context()
+    if context:
+        movement_type, reference, operator_id = context
+    elif created:
+        movement_type, reference, operator_id = MovementType.RECEIPT, '', batch.received_by_id
+    else:
+        movement_type, reference, operator_id = MovementType.ADJUSTMENT, '', None
+    options = {'reference': reference, 'operator_id': operator_id, 'link_batch': not deleted}
+    if (old_hospital_id, old_supply_id) != (batch.hospital_id, batch.supply_id):
+        # 批次改变了归属：原医院/物资调出，新医院/物资调入
+        if not context:
+            movement_type = MovementType.TRANSFER
+        movements = []
+        if old_quantity:
+            movements.append(build_movement(
+                batch, -old_quantity, movement_type, hospital_id=old_hospital_id, supply_id=old_supply_id, **options
+            ))
+        if new_quantity:
+            movements.append(build_movement(batch, new_quantity, movement_type, **options))
+        return movements
+
+    if new_quantity == old_quantity:
+        return []
+    return [build_movement(batch, new_quantity - old_quantity, movement_type, **options)]
+
+
+def record_movements(movements, batch_size=500):
+    """保存流水，并按数量变动累加医院仓储占用"""
+    if movements:
+        InventoryMovement.objects.bulk_create(movements, batch_size=batch_size)
+        adjust_hospital_capacity(movements)
+    return len(movements)
+
+
+def _start_of_day(day):
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def _as_datetime(at):
+    """日期按当天结束 (次日零点) 处理"""
+    if isinstance(at, datetime):
+        return at
+    return _start_of_day(at + timedelta(days=1))
+
+
+def _movement_totals(movements):
+    """按物资汇总流水：{supply_id: (在库变动量, 入库量, 出库量)}"""
+    rows = movements.values('supply_id').annotate(
+        delta=Sum('quantity'),
+        received=Sum('quantity', filter=Q(movement_type=MovementType.RECEIPT)),
+        issued=Sum('quantity', filter=Q(movement_type__in=[MovementType.ISSUE, MovementType.RETURN])),
+    ).order_by()
+    # MySQL 的 SUM 返回 Decimal，出库流水的数量为负数；减少分配退回的数量 (正数) 从出库量中扣除，消耗量为净出库
+    return {
+        row['supply_id']: (int(row['delta'] or 0), int(row['received'] or 0), -int(row['issued'] or 0))
+        for row in rows
+    }
+
+
+def _levels_at(hospital_id, at, supply_ids=None, snapshot_before=None):
+    """
+    返回 {supply_id: [在库数量, 累计入库量, 累计出库量]}。
+    取 at 之前最近一次快照，再加上快照截止时间到 at 之间的流水，只扫描快照之后的短区间。
+    """
+    snapshot_before = snapshot_before or at.date()
+    latest = InventorySnapshot.objects.filter(
+        hospital_id=hospital_id, snapshot_date__lt=snapshot_before
+    ).aggregate(latest=Max('snapshot_date'))['latest']
+
+    levels = {}
+    movements = InventoryMovement.objects.filter(hospital_id=hospital_id, occurred_at__lt=at)
+    if latest:
+        snapshots = InventorySnapshot.objects.filter(hospital_id=hospital_id, snapshot_date=latest)
+        if supply_ids is not None:
+            snapshots = snapshots.filter(supply_id__in=supply_ids)
+        for supply_id, quantity, received, issued in snapshots.values_list(
+            'supply_id', 'quantity', 'cumulative_received', 'cumulative_issued'
+        ):
+            levels[supply_id] = [quantity, received, issued]
+        movements = movements.filter(occurred_at__gte=_start_of_day(latest + timedelta(days=1)))
+    if supply_ids is not None:
+        movements = movements.filter(supply_id__in=supply_ids)
+
+    for supply_id, totals in _movement_totals(movements).items():
+        level = levels.setdefault(supply_id, [0, 0, 0])
+        for i, value in enumerate(totals):
+            level[i] += value
+    return levels
+
+
+def stock_levels_at(hospital_id, at, supply_ids=None):
+    """某医院在 at (datetime，或日期表示当天结束) 时各物资的在库数量"""
+    at = _as_datetime(at)
+    return {supply_id: level[0] for supply_id, level in _levels_at(hospital_id, at, supply_ids).items()}
+
+
+def consumption_between(hospital_id, start, end, supply_ids=None):
+    """某医院在 [start, end) 区间内各物资的出库量，由两个时点的累计出库量相减得到"""
+    start, end = _as_datetime(start), _as_datetime(end)
+    issued_at_start = _levels_at(hospital_id, start, supply_ids)
+    issued_at_end = _levels_at(hospital_id, end, supply_ids)
+    return {
+        supply_id: level[2] - issued_at_start.get(supply_id, [0, 0, 0])[2]
+        for supply_id, level in issued_at_end.items()
+    }
+
+
+def take_snapshots(snapshot_date=None, hospital_ids=None):
+    """
+    生成 snapshot_date 当天结束时的库存快照 (默认昨天)，已存在则覆盖。
+    每家医院由上一次快照加一段流水推算，逐家医院各自提交。返回写入的快照行数。
+    """
+    snapshot_date = snapshot_date or timezone.now().date() - timedelta(days=1)
+    if hospital_ids is None:
+        hospital_ids = list(Hospital.objects.values_list('hospital_id', flat=True))
+
+    cutoff = _as_datetime(snapshot_date)
+    count = 0
+    for hospital_id in hospital_ids:
+        levels = _levels_at(hospital_id, cutoff, snapshot_before=snapshot_date)
+        snapshots = [
+            InventorySnapshot(
+                hospital_id=hospital_id, supply_id=supply_id, snapshot_date=snapshot_date,
+                quantity=quantity, cumulative_received=received, cumulative_issued=issued,
+            )
+            for supply_id, (quantity, received, issued) in levels.items()
+        ]
+        with transaction.atomic():
+            bulk_upsert(InventorySnapshot, snapshots, ['hospital', 'supply', 'snapshot_date'], SNAPSHOT_UPDATE_FIELDS)
+        count += len(snapshots)
+    return count
@@ -0,0 +1,49 @@
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from .models import Hospital, MedicalSupply
+
+# 下拉选择器使用的精简列表：每种列表只包含 id、名称和编码
+# 数据状态戳 (全部记录的条数和最大 updated_at) 每次请求从数据库读取，所有进程看到的状态一致；
+# 列表内容按状态戳缓存在进程内缓存中，版本号和 ETag 均为列表内容的哈希，相同内容在任何进程中得到相同的版本号
+LOOKUP_SOURCES = {
+    'hospitals': (
+        Hospital,
+        lambda: Hospital.objects.filter(is_active=True).order_by('name'),
+        ['hospital_id', 'org_code', 'name', 'region', 'level'],
+    ),
+    'supplies': (
+        MedicalSupply,
+        lambda: MedicalSupply.objects.order_by('name'),
+        ['unspsc_code', 'name', 'category', 'unit'],
+    ),
+}
+# 不更新 updated_at 的批量写入 (queryset.update) 不改变状态戳，内容缓存最多保留 5 分钟
+LOOKUP_PAYLOAD_TIMEOUT = 60 * 5
+
+
+def _data_stamp(model):
+    """包含已删除记录的条数和最大更新时间：新增、修改、逻辑删除和物理删除都会改变状态戳"""
+    stamp = model.all_objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+    return f"{stamp['count']}:{stamp['updated'].isoformat() if stamp['updated'] else ''}"
+
+
+def get_lookup_payload(name):
+    """
+    返回 (payload, etag)。payload 包含版本号和精简列表；
+    版本号与 ETag 由序列化后的列表内容计算，内容变化时必然变化，可以作为强 ETag 使用。
+    """
+    model, queryset_factory, fields = LOOKUP_SOURCES[name]
+    payload_key = f'lookups:{name}:{_data_stamp(model)}'
+    cached = cache.get(payload_key)
+    if cached is None:
+        results = list(queryset_factory().values(*fields))
+        digest = hashlib.sha1(
+            json.dumps(results, cls=DjangoJSONEncoder, ensure_ascii=False, sort_keys=True).encode()
+        ).hexdigest()
+        payload = {'version': digest[:16], 'count': len(results), 'results': results}
+        cached = (payload, f'"{digest}"')
+        cache.set(payload_key, cached, LOOKUP_PAYLOAD_TIMEOUT)
+    return cached
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.archive import ARCHIVE_BATCH_SIZE, ARCHIVE_TARGETS, DEFAULT_RETENTION_DAYS, archive_records
+import time
+
+TARGET_LABELS = {
+    'requests': '物资请求',
+    'items': '已删除的请求项',
+    'alerts': '已删除的库存预警',
+    'batches': '已删除的库存批次',
+}
+
+class Command(BaseCommand):
+    help = '将已逻辑删除或关闭超过保留期的请求、请求项、预警和批次分批移入归档表'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=DEFAULT_RETENTION_DAYS,
+            help='已完成/已拒绝/已取消的请求保留的天数 (已删除的记录不受此限制；已解决的预警由 compact_alerts 处理)',
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='每个事务归档的记录数')
+        parser.add_argument(
+            '--only', action='append', dest='targets', choices=list(ARCHIVE_TARGETS),
+            help='只归档指定类别，可重复指定',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='只统计待归档的记录数，不写入')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days 不能为负数，--batch-size 必须大于 0')
+
+        start_time = time.time()
+        results = archive_records(
+            options['targets'], retention_days=options['days'], batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        for name, (roots, records) in results.items():
+            if options['dry_run']:
+                self.stdout.write(f'{TARGET_LABELS[name]}: 待归档 {roots} 条')
+            else:
+                self.stdout.write(f'{TARGET_LABELS[name]}: 归档 {roots} 条 (含子记录共 {records} 行)')
+
+        duration = time.time() - start_time
+        action = '统计' if options['dry_run'] else '归档'
+        self.stdout.write(self.style.SUCCESS(f'{action}完成，耗时: {duration:.2f} 秒。'))
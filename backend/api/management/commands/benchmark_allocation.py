@@ -0,0 +1,183 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.db import connection, transaction, DatabaseError
+from django.db.models import Sum
+from django.utils import timezone
+from api.alerts import alert_evaluation_suspended
+from api.allocation import allocate_item
+from api.ledger import build_movement, record_movements
+from api.models import (
+    Hospital, MedicalSupply, InventoryBatch, SupplyRequest, RequestItem, ItemFulfillment,
+    InventoryMovement, StockBalance
+)
+from api.stock import refresh_stock_balances, stock_maintenance_suspended
+from datetime import timedelta
+import queue
+import threading
+import time
+import uuid
+
+class Command(BaseCommand):
+    help = '并发分配压测：多个线程同时按 FEFO 从同一医院同一物资的批次中分配，统计吞吐量并校验库存一致性'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='并发分配线程数')
+        parser.add_argument('--items', type=int, default=500, help='待分配的请求项数量')
+        parser.add_argument('--quantity', type=int, default=5, help='每个请求项的需求数量')
+        parser.add_argument('--batches', type=int, default=100, help='压测物资的库存批次数量')
+        parser.add_argument('--batch-quantity', type=int, default=30, help='每个批次的库存数量')
+        parser.add_argument('--keep', action='store_true', help='保留压测数据 (默认结束后删除)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['items'] < 1:
+            raise CommandError('--workers 和 --items 必须大于 0')
+        if not connection.features.has_select_for_update_skip_locked:
+            raise CommandError('当前数据库不支持 SELECT ... FOR UPDATE SKIP LOCKED')
+
+        fixture = self._create_fixture(options)
+        self.stdout.write(
+            f"压测数据已创建：{options['batches']} 个批次共 {options['batches'] * options['batch_quantity']} 件，"
+            f"{options['items']} 个请求项各需 {options['quantity']} 件，{options['workers']} 个线程"
+        )
+        try:
+            stats = self._run(fixture['item_ids'], options['workers'])
+            self._report(stats)
+            self._verify(fixture)
+        finally:
+            if not options['keep']:
+                self._cleanup(fixture)
+
+    def _create_fixture(self, options):
+        suffix = uuid.uuid4().hex[:10].upper()
+        today = timezone.now().date()
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'bench_{suffix.lower()}')
+            hospital = Hospital.objects.create(
+                org_code=f'BENCH{suffix}', name=f'压测医院{suffix}', level=Hospital.HospitalLevel.OTHER,
+                address='压测', geo_location=Point(114.3, 30.6), storage_volume=1000000,
+            )
+            supply = MedicalSupply.objects.create(
+                unspsc_code=f'BN{suffix}', name=f'压测物资{suffix}', category=MedicalSupply.SupplyCategory.OTHER,
+                unit='件', standard='压测', shelf_life=12, storage_temp='常温',
+            )
+            batches = [
+                InventoryBatch(
+                    batch_number=f'BN{suffix}{index:06d}', hospital=hospital, supply=supply,
+                    quantity=options['batch_quantity'],
+                    production_date=today - timedelta(days=30),
+                    expiration_date=today + timedelta(days=30 + index),
+                    received_date=today,
+                )
+                for index in range(options['batches'])
+            ]
+            InventoryBatch.objects.bulk_create(batches, batch_size=500)
+            record_movements([
+                build_movement(batch, batch.quantity, InventoryMovement.MovementType.RECEIPT) for batch in batches
+            ])
+            refresh_stock_balances({(hospital.pk, supply.pk)})
+
+            supply_request = SupplyRequest.objects.create(
+                hospital=hospital, required_by=timezone.now() + timedelta(days=7),
+                status=SupplyRequest.RequestStatus.APPROVED, requester=user,
+            )
+            items = [
+                RequestItem(request=supply_request, supply=supply, quantity=options['quantity'])
+                for _ in range(options['items'])
+            ]
+            RequestItem.objects.bulk_create(items, batch_size=500)
+
+        return {
+            'user': user, 'hospital': hospital, 'supply': supply,
+            'initial_quantity': options['batches'] * options['batch_quantity'],
+            'item_ids': [item.pk for item in items],
+        }
+
+    def _run(self, item_ids, workers):
+        pending = queue.Queue()
+        for item_id in item_ids:
+            pending.put(item_id)
+        lock = threading.Lock()
+        stats = {'latencies': [], 'allocated': 0, 'short': 0, 'errors': []}
+
+        def worker():
+            # 压测数据结束后即删除，不做增量预警评估，吞吐量只统计分配本身
+            try:
+                with alert_evaluation_suspended():
+                    while True:
+                        try:
+                            item_id = pending.get_nowait()
+                        except queue.Empty:
+                            return
+                        started = time.perf_counter()
+                        try:
+                            with transaction.atomic():
+                                item = RequestItem.objects.select_related('request') \
+                                    .select_for_update(of=('self',)).get(pk=item_id)
+                                result = allocate_item(item, item.quantity, allow_partial=True)
+                        except DatabaseError as e:
+                            with lock:
+                                stats['errors'].append(str(e))
+                            continue
+                        elapsed = time.perf_counter() - started
+                        with lock:
+                            stats['latencies'].append(elapsed)
+                            stats['allocated'] += result.picked
+                            stats['short'] += 1 if result.shortfall else 0
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats['duration'] = time.perf_counter() - started
+        return stats
+
+    def _report(self, stats):
+        latencies = sorted(stats['latencies'])
+        count = len(latencies)
+        if count:
+            p50 = latencies[count // 2] * 1000
+            p95 = latencies[min(count - 1, int(count * 0.95))] * 1000
+            self.stdout.write(
+                f"完成 {count} 次分配，耗时 {stats['duration']:.2f} 秒，吞吐量 {count / stats['duration']:.1f} 次/秒，"
+                f"延迟 p50 {p50:.1f} ms / p95 {p95:.1f} ms / max {latencies[-1] * 1000:.1f} ms"
+            )
+        self.stdout.write(f"共分配 {stats['allocated']} 件，{stats['short']} 个请求项未能足量分配")
+        if stats['errors']:
+            self.stdout.write(self.style.WARNING(f"{len(stats['errors'])} 次分配出错，例如: {stats['errors'][0]}"))
+
+    def _verify(self, fixture):
+        hospital, supply = fixture['hospital'], fixture['supply']
+        remaining = InventoryBatch.objects.filter(hospital=hospital, supply=supply).aggregate(
+            total=Sum('quantity'))['total'] or 0
+        fulfilled = ItemFulfillment.objects.filter(request_item__request__hospital=hospital).aggregate(
+            total=Sum('quantity'))['total'] or 0
+        allocated = RequestItem.objects.filter(request__hospital=hospital).aggregate(
+            total=Sum('allocated'))['total'] or 0
+        balance = StockBalance.objects.filter(hospital=hospital, supply=supply).values_list(
+            'total_quantity', flat=True).first()
+
+        problems = []
+        if remaining + fulfilled != fixture['initial_quantity']:
+            problems.append(f"批次剩余 {remaining} + 已出库 {fulfilled} ≠ 初始库存 {fixture['initial_quantity']}")
+        if fulfilled != allocated:
+            problems.append(f"分配记录合计 {fulfilled} ≠ 请求项已分配合计 {allocated}")
+        if balance != remaining:
+            problems.append(f"库存余额 {balance} ≠ 批次剩余 {remaining}")
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(problem))
+        else:
+            self.stdout.write(self.style.SUCCESS('一致性校验通过：没有超卖，分配记录、批次数量与库存余额一致。'))
+
+    def _cleanup(self, fixture):
+        # 删除医院会级联删除请求、分配记录、批次、流水和余额
+        with stock_maintenance_suspended():
+            fixture['hospital'].delete()
+            fixture['supply'].delete()
+            fixture['user'].delete()
+        self.stdout.write('压测数据已删除。')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.query_plans import FULL_INDEX_SCAN, HOT_QUERIES, explain_hot_queries
+import time
+
+class Command(BaseCommand):
+    help = '对登记的热点查询执行 EXPLAIN，检查是否走索引；任一查询出现全表扫描时以非零状态退出'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--query', action='append', dest='queries', choices=sorted(HOT_QUERIES),
+            help='只检查指定的查询，可重复指定',
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=0,
+            help='预估扫描行数低于该值的全表扫描不视为失败 (小表上优化器可能直接扫表)',
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        results = explain_hot_queries(options['queries'], min_rows=options['min_rows'])
+
+        failed = []
+        for name, label, accesses, full_scans in results:
+            plan = '，'.join(
+                f"{table} {access_type}{f' ({key})' if key else ''}{f' ~{rows} 行' if rows is not None else ''}"
+                for table, access_type, key, rows in accesses
+            ) or '无需访问表'
+            if full_scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'[全表扫描] {name} {label}: {plan}'))
+            elif any(access_type == FULL_INDEX_SCAN for _, access_type, _, _ in accesses):
+                self.stdout.write(self.style.WARNING(f'[全索引扫描] {name} {label}: {plan}'))
+            else:
+                self.stdout.write(f'[正常] {name} {label}: {plan}')
+
+        duration = time.time() - start_time
+        if failed:
+            raise CommandError(f"{len(failed)} 个热点查询出现全表扫描: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} 个热点查询均使用索引，耗时: {duration:.2f} 秒。'))
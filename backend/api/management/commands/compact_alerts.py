@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.alert_history import COMPACT_BATCH_SIZE, DEFAULT_ALERT_RETENTION_DAYS, compact_alerts
+import time
+
+class Command(BaseCommand):
+    help = '将解决超过保留期的预警汇总到预警日统计表，并分批删除 (或归档) 预警明细'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=DEFAULT_ALERT_RETENTION_DAYS, help='已解决的预警明细保留的天数',
+        )
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE, help='每个事务处理的预警数')
+        parser.add_argument('--archive', action='store_true', help='删除前把预警明细写入归档表')
+        parser.add_argument('--dry-run', action='store_true', help='只统计待压缩的预警数，不写入')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days 不能为负数，--batch-size 必须大于 0')
+
+        start_time = time.time()
+        alerts, daily_rows = compact_alerts(
+            retention_days=options['days'], batch_size=options['batch_size'], archive=options['archive'],
+            dry_run=options['dry_run'],
+        )
+        duration = time.time() - start_time
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'待压缩预警 {alerts} 条，耗时: {duration:.2f} 秒。'))
+        else:
+            action = '归档' if options['archive'] else '删除'
+            self.stdout.write(self.style.SUCCESS(
+                f'预警压缩完成，{action}明细 {alerts} 条，累加到 {daily_rows} 行日统计，耗时: {duration:.2f} 秒。'
+            ))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.apps import apps
 from django.db import connection
+from api.stock import stock_maintenance_suspended
 class Command(BaseCommand):
     help = '删除数据库中所有应用的所有数据。警告：此操作不可逆！'
 
@@ -87,19 +88,21 @@ class Command(BaseCommand):
                 final_model_order = ordered_models + remaining_models
 
 
-                for model in final_model_order:
-                    # 跳过 Django 内部模型 (如果上面没有过滤掉 auth，这里需要更精确的判断)
-                    # if model._meta.app_label in ['admin', 'contenttypes', 'sessions']:
-                    #     continue
-                    # if model._meta.app_label == 'auth' and model._meta.object_name not in ['User', 'Group']: # 如果保留 User/Group
-                    #      continue
-
-                    try:
-                        count, _ = model._base_manager.all().delete()
-                        if count > 0:
-                            self.stdout.write(f'删除了 {count} 条 {model._meta.verbose_name_plural} 数据')
-                    except Exception as e:
-                         self.stdout.write(self.style.ERROR(f'删除 {model._meta.verbose_name_plural} 时出错: {e}'))
+                # 清空数据时暂停逐行维护库存余额等派生数据
+                with stock_maintenance_suspended():
+                    for model in final_model_order:
+                        # 跳过 Django 内部模型 (如果上面没有过滤掉 auth，这里需要更精确的判断)
+                        # if model._meta.app_label in ['admin', 'contenttypes', 'sessions']:
+                        #     continue
+                        # if model._meta.app_label == 'auth' and model._meta.object_name not in ['User', 'Group']: # 如果保留 User/Group
+                        #      continue
+
+                        try:
+                            count, _ = model._base_manager.all().delete()
+                            if count > 0:
+                                self.stdout.write(f'删除了 {count} 条 {model._meta.verbose_name_plural} 数据')
+                        except Exception as e:
+                             self.stdout.write(self.style.ERROR(f'删除 {model._meta.verbose_name_plural} 时出错: {e}'))
 
 
             finally:
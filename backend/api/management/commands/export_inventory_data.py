@@ -3,14 +3,15 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from collections import defaultdict
 from datetime import date
-from django.db.models import Sum, F, ExpressionWrapper, fields
+from django.db.models import F, ExpressionWrapper, fields
 
 # 导入正确的模型
 try:
     # 确保导入的模型名称与你的 models.py 文件一致
-    from api.models import Hospital, InventoryBatch, MedicalSupply, SupplyRequest, RequestItem
+    from api.models import Hospital, InventoryBatch, MedicalSupply, SupplyRequest, RequestItem, StockBalance
 except ImportError:
-    raise ImportError("无法从 api.models 导入 Hospital, InventoryBatch, MedicalSupply, SupplyRequest 或 RequestItem。请检查模型位置和名称。")
+    raise ImportError("无法从 api.models 导入 Hospital, InventoryBatch, MedicalSupply, SupplyRequest, RequestItem 或 StockBalance。请检查模型位置和名称。")
+from api.stock import refresh_stale_stock_balances
 
 class Command(BaseCommand):
     help = '导出医院库存数据及待处理物资请求到 CSV 文件。'
@@ -50,13 +51,13 @@ class Command(BaseCommand):
     def _export_inventory_details(self):
         """导出各医院各物资的总库存量、医院容量预警阈值及物资全局最低库存"""
         try:
-            # 查询时包含医院阈值和物资最低库存
-            inventory_summary = InventoryBatch.objects.values(
+            # 直接读取库存余额表，包含物资最低库存；库存量取可用库存 (不含已过期/隔离的批次)
+            refresh_stale_stock_balances()
+            inventory_summary = StockBalance.objects.values(
                 'hospital__name',
                 'supply__name',
-                'supply__min_stock_level'      # <--- 物资全局最低库存 (单位)
-            ).annotate(
-                total_quantity=Sum('quantity')
+                'supply__min_stock_level',     # <--- 物资全局最低库存 (单位)
+                'available_quantity'
             ).order_by('hospital__name', 'supply__name')
 
             filepath = 'inventory_summary.csv'
@@ -74,7 +75,7 @@ class Command(BaseCommand):
                      writer.writerow({
                         'hospital_name': item['hospital__name'],
                         'supply_name': item['supply__name'],
-                        'total_quantity': item['total_quantity'],
+                        'total_quantity': item['available_quantity'],
                         'supply_global_min_stock_level': item['supply__min_stock_level']                   # <--- 物资阈值数据
                     })
             self.stdout.write(self.style.SUCCESS(f' -> {filepath}'))
@@ -1,10 +1,16 @@
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from api.alerts import deferred_alert_evaluation
 
 class Command(BaseCommand):
     help = '按照正确的顺序导入所有数据'
 
     def handle(self, *args, **kwargs):
+        # 各导入命令写入产生的增量预警评估合并到全部导入结束时执行一次
+        with deferred_alert_evaluation():
+            self._import_all()
+
+    def _import_all(self):
         self.stdout.write(self.style.NOTICE('开始导入医疗物资管理系统的所有数据...'))
         
         # 1. 导入医院数据
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from api.models import RequestItem, InventoryBatch, ItemFulfillment
+from api.models import RequestItem, InventoryBatch, ItemFulfillment, InventoryMovement
+from api.alerts import deferred_alert_evaluation
+from api.ledger import movement_context
 from django.contrib.auth.models import User
 from datetime import datetime, timedelta
 import random
@@ -8,6 +10,11 @@ class Command(BaseCommand):
     help = '导入物资分配记录数据'
 
     def handle(self, *args, **kwargs):
+        # 逐行保存会触发增量预警评估，合并到导入结束时评估一次
+        with deferred_alert_evaluation():
+            self._import_fulfillments()
+
+    def _import_fulfillments(self):
         # 检查是否已有数据，避免重复导入
         if ItemFulfillment.objects.exists():
             self.stdout.write(self.style.WARNING('数据库中已有物资分配记录数据，跳过导入。如需重新导入，请先清空ItemFulfillment表。'))
@@ -68,9 +75,10 @@ class Command(BaseCommand):
                 )
                 fulfillment.save()
                 
-                # 更新批次库存（实际应用中可能会有触发器或信号来处理这个逻辑）
+                # 更新批次库存，信号处理函数按出库类型记录流水
                 batch.quantity -= to_allocate
-                batch.save()
+                with movement_context(InventoryMovement.MovementType.ISSUE, fulfillment.pk, fulfillment.fulfilled_by_id):
+                    batch.save()
                 
                 remaining -= to_allocate
                 fulfillment_count += 1
@@ -25,7 +25,6 @@ class Command(BaseCommand):
                     'website': 'www.tjh.com.cn'
                 },
                 'storage_volume': 10000.00,
-                'current_capacity': 7500.00,
                 'region': '硚口区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -42,7 +41,6 @@ class Command(BaseCommand):
                     'website': 'www.hust-xh.com'
                 },
                 'storage_volume': 9500.00,
-                'current_capacity': 7000.00,
                 'region': '江汉区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -59,7 +57,6 @@ class Command(BaseCommand):
                     'website': 'www.rmhospital.com'
                 },
                 'storage_volume': 8000.00,
-                'current_capacity': 5500.00,
                 'region': '武昌区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -76,7 +73,6 @@ class Command(BaseCommand):
                     'website': 'www.znhospital.com'
                 },
                 'storage_volume': 7500.00,
-                'current_capacity': 5000.00,
                 'region': '武昌区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -93,7 +89,6 @@ class Command(BaseCommand):
                     'website': 'www.hbsrmyy.com'
                 },
                 'storage_volume': 7000.00,
-                'current_capacity': 4500.00,
                 'region': '江岸区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -110,7 +105,6 @@ class Command(BaseCommand):
                     'website': 'www.whsyy.com'
                 },
                 'storage_volume': 6500.00,
-                'current_capacity': 4000.00,
                 'region': '硚口区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -127,7 +121,6 @@ class Command(BaseCommand):
                     'website': 'www.whzxyy.com'
                 },
                 'storage_volume': 6000.00,
-                'current_capacity': 3800.00,
                 'region': '江岸区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -144,7 +137,6 @@ class Command(BaseCommand):
                     'website': 'www.whsdsyy.com'
                 },
                 'storage_volume': 5500.00,
-                'current_capacity': 3600.00,
                 'region': '武昌区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -161,7 +153,6 @@ class Command(BaseCommand):
                     'website': 'www.wh4h.com'
                 },
                 'storage_volume': 4500.00,
-                'current_capacity': 2800.00,
                 'region': '硚口区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -178,7 +169,6 @@ class Command(BaseCommand):
                     'website': 'www.wh5hospital.com'
                 },
                 'storage_volume': 4000.00,
-                'current_capacity': 2500.00,
                 'region': '汉阳区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -195,7 +185,6 @@ class Command(BaseCommand):
                     'website': 'www.wh6h.com'
                 },
                 'storage_volume': 3500.00,
-                'current_capacity': 2300.00,
                 'region': '江汉区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -212,7 +201,6 @@ class Command(BaseCommand):
                     'website': 'www.wh7yy.com'
                 },
                 'storage_volume': 3200.00,
-                'current_capacity': 2100.00,
                 'region': '武昌区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -229,7 +217,6 @@ class Command(BaseCommand):
                     'website': 'www.wh8h.com'
                 },
                 'storage_volume': 3000.00,
-                'current_capacity': 1900.00,
                 'region': '江岸区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -246,7 +233,6 @@ class Command(BaseCommand):
                     'website': 'www.liyuanyy.com'
                 },
                 'storage_volume': 2800.00,
-                'current_capacity': 1800.00,
                 'region': '武昌区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -263,7 +249,6 @@ class Command(BaseCommand):
                     'website': 'www.yzxzbyy.com'
                 },
                 'storage_volume': 2500.00,
-                'current_capacity': 1600.00,
                 'region': '江汉区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -280,7 +265,6 @@ class Command(BaseCommand):
                     'website': 'www.whdxkqyy.com'
                 },
                 'storage_volume': 2300.00,
-                'current_capacity': 1500.00,
                 'region': '洪山区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -297,7 +281,6 @@ class Command(BaseCommand):
                     'website': 'www.whszyyy.com'
                 },
                 'storage_volume': 4000.00,
-                'current_capacity': 2800.00,
                 'region': '江岸区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -314,7 +297,6 @@ class Command(BaseCommand):
                     'website': 'www.whetyyy.com'
                 },
                 'storage_volume': 3800.00,
-                'current_capacity': 2700.00,
                 'region': '江岸区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -331,7 +313,6 @@ class Command(BaseCommand):
                     'website': 'www.whfybj.com'
                 },
                 'storage_volume': 3500.00,
-                'current_capacity': 2400.00,
                 'region': '江岸区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -348,7 +329,6 @@ class Command(BaseCommand):
                     'website': 'www.whtyh.com'
                 },
                 'storage_volume': 3200.00,
-                'current_capacity': 2200.00,
                 'region': '武昌区',
                 'is_active': True,
                 'warning_threshold': 15.00
@@ -374,7 +354,6 @@ class Command(BaseCommand):
                 'geo_location': point, # 使用创建的Point对象
                 'contact_info': data['contact_info'],
                 'storage_volume': data['storage_volume'],
-                'current_capacity': data['current_capacity'],
                 'region': data['region'],
                 'is_active': data['is_active'],
                 'warning_threshold': data['warning_threshold']
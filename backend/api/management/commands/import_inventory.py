@@ -1,15 +1,62 @@
-from django.core.management.base import BaseCommand
-from api.models import Hospital, MedicalSupply, Supplier, InventoryBatch
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.alerts import queue_alert_evaluation
+from api.ledger import build_movement, record_movements
+from api.models import Hospital, MedicalSupply, Supplier, InventoryBatch, InventoryMovement
+from api.stock import refresh_stock_balances
 from django.contrib.auth.models import User
 from datetime import datetime, timedelta
+from itertools import islice
 import random
 import string
-import json
+import time
+
+DEFAULT_BATCH_SIZE = 5000
+
+# 批次号格式：两位大写字母 + 八位数字
+BATCH_NUMBER_DIGITS = 10 ** 8
+BATCH_NUMBER_SPACE = 26 * 26 * BATCH_NUMBER_DIGITS
+
+
+def _format_batch_number(value):
+    letters, numbers = divmod(value, BATCH_NUMBER_DIGITS)
+    first, second = divmod(letters, 26)
+    return f"{string.ascii_uppercase[first]}{string.ascii_uppercase[second]}{numbers:08d}"
+
+
+def generate_batch_numbers(count, taken=()):
+    """预先生成 count 个互不相同且不与 taken 重复的批次号 (无放回抽样，不会随机碰撞)"""
+    if count + len(taken) > BATCH_NUMBER_SPACE:
+        raise CommandError('批次号空间不足')
+    numbers = []
+    for value in random.sample(range(BATCH_NUMBER_SPACE), count + len(taken)):
+        number = _format_batch_number(value)
+        if number not in taken:
+            numbers.append(number)
+    return numbers[:count]
+
 
 class Command(BaseCommand):
     help = '导入库存批次数据'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'每次批量插入的批次数 (默认 {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--scale', type=int, default=1,
+            help='数据量倍数：每家医院每种物资的批次数乘以该倍数 (默认 1)，用于生成压测数据',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        scale = options['scale']
+        if batch_size <= 0:
+            raise CommandError('--batch-size 必须大于 0')
+        if scale <= 0:
+            raise CommandError('--scale 必须大于 0')
+
         # 检查是否已有数据，避免重复导入
         if InventoryBatch.objects.exists():
             self.stdout.write(self.style.WARNING('数据库中已有库存批次数据，跳过导入。如需重新导入，请先清空InventoryBatch表。'))
@@ -17,21 +64,21 @@ class Command(BaseCommand):
 
         # 检查是否有医院、医疗物资和供应商数据
         hospitals = list(Hospital.objects.all())
-        supplies = list(MedicalSupply.objects.all())
+        supplies = list(MedicalSupply.objects.select_related('supplier'))
         suppliers = list(Supplier.objects.all())
-        
+
         if not hospitals:
             self.stdout.write(self.style.ERROR('没有找到医院数据。请先运行python manage.py import_hospitals导入医院数据。'))
             return
-        
+
         if not supplies:
             self.stdout.write(self.style.ERROR('没有找到医疗物资数据。请先运行python manage.py import_supplies导入医疗物资数据。'))
             return
-        
+
         if not suppliers:
             self.stdout.write(self.style.ERROR('没有找到供应商数据。请先运行python manage.py import_suppliers导入供应商数据。'))
             return
-        
+
         # 获取或创建用户
         try:
             admin_user = User.objects.get(username='admin')
@@ -59,79 +106,89 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS(f'创建了普通用户: {name}'))
             users.append(user)
 
-        # 生成批次号的函数
-        def generate_batch_number():
-            prefix = ''.join(random.choices(string.ascii_uppercase, k=2))
-            numbers = ''.join(random.choices(string.digits, k=8))
-            return f"{prefix}{numbers}"
-        
-        # 获取当前日期和过去日期的函数
-        now = datetime.now().date()
-        
-        # 生成库存批次数据
-        batches_data = []
-        
-        # 为每家医院的每种物资创建1-3个批次
+        start_time = time.time()
+
+        # 为每家医院随机选择15-30种物资，每种物资创建 1-3 个批次 (乘以 --scale)
+        plan = []
         for hospital in hospitals:
-            # 为每家医院随机选择15-30种物资
-            selected_supplies = random.sample(supplies, random.randint(15, min(30, len(supplies))))
-            
+            selected_supplies = random.sample(supplies, random.randint(min(15, len(supplies)), min(30, len(supplies))))
             for supply in selected_supplies:
-                # 为每种物资创建1-3个批次
-                batch_count = random.randint(1, 3)
-                
+                plan.append((hospital, supply, random.randint(1, 3) * scale))
+        total = sum(count for _, _, count in plan)
+
+        # 批次号唯一约束同样覆盖已逻辑删除的批次，预先生成时避开这些批次号
+        taken = set(InventoryBatch.all_objects.values_list('batch_number', flat=True))
+        batch_numbers = iter(generate_batch_numbers(total, taken))
+
+        # 获取当前日期和过去日期的函数
+        now = datetime.now().date()
+
+        def generate_batches():
+            for hospital, supply, batch_count in plan:
+                # 创建存储条件 (JSONField 直接保存字典)
+                storage_condition = {
+                    'temperature': supply.storage_temp,
+                    'humidity': '适宜湿度',
+                    'light': '避光' if '避光' in supply.storage_temp else '普通光照',
+                    'special_requirements': '无'
+                }
                 for _ in range(batch_count):
                     # 生成批次数据
                     production_date = now - timedelta(days=random.randint(30, 365))
                     shelf_life_months = supply.shelf_life
                     expiration_date = production_date + timedelta(days=30 * shelf_life_months)
                     received_date = production_date + timedelta(days=random.randint(5, 30))
-                    
+
                     # 计算数量和价格
                     if supply.category in ['DV']:  # 医疗设备
                         quantity = random.randint(1, 5)
-                        unit_price = float(supply.avg_price) * random.uniform(0.9, 1.1)
                     elif supply.category in ['PP', 'RT']:  # 防护装备和检测试剂
                         quantity = random.randint(50, 500)
-                        unit_price = float(supply.avg_price) * random.uniform(0.9, 1.1)
                     elif supply.category in ['CS']:  # 一次性耗材
                         quantity = random.randint(500, 5000)
-                        unit_price = float(supply.avg_price) * random.uniform(0.9, 1.1)
                     else:  # 药品和其他
                         quantity = random.randint(100, 1000)
-                        unit_price = float(supply.avg_price) * random.uniform(0.9, 1.1)
-                    
-                    # 创建存储条件
-                    storage_condition = {
-                        'temperature': supply.storage_temp,
-                        'humidity': '适宜湿度',
-                        'light': '避光' if '避光' in supply.storage_temp else '普通光照',
-                        'special_requirements': '无'
-                    }
-                    
-                    batch_data = {
-                        'batch_number': generate_batch_number(),
-                        'hospital': hospital,
-                        'supply': supply,
-                        'quantity': quantity,
-                        'production_date': production_date,
-                        'expiration_date': expiration_date,
-                        'storage_condition': json.dumps(storage_condition),
-                        'received_date': received_date,
-                        'received_by': random.choice(users),
-                        'unit_price': unit_price,
-                        'supplier': supply.supplier or random.choice(suppliers),
-                        'quality_check_passed': True,
-                        'notes': f"{supply.name}的库存批次"
-                    }
-                    
-                    batches_data.append(batch_data)
-        
-        # 创建库存批次记录
+                    unit_price = round(float(supply.avg_price) * random.uniform(0.9, 1.1), 2)
+
+                    yield InventoryBatch(
+                        batch_number=next(batch_numbers),
+                        hospital=hospital,
+                        supply=supply,
+                        quantity=quantity,
+                        production_date=production_date,
+                        expiration_date=expiration_date,
+                        storage_condition=storage_condition,
+                        received_date=received_date,
+                        received_by=random.choice(users),
+                        unit_price=unit_price,
+                        supplier=supply.supplier or random.choice(suppliers),
+                        quality_check_passed=True,
+                        notes=f"{supply.name}的库存批次",
+                    )
+
+        # 分块生成并批量插入，整个导入在一个事务中完成，失败时全部回滚
         count = 0
-        for data in batches_data:
-            batch = InventoryBatch(**data)
-            batch.save()
-            count += 1
-            
-        self.stdout.write(self.style.SUCCESS(f'成功导入 {count} 条库存批次数据'))
+        batches = generate_batches()
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(batches, batch_size))
+                if not chunk:
+                    break
+                InventoryBatch.objects.bulk_create(chunk, batch_size=batch_size)
+                # bulk_create 不触发信号，显式记录入库流水 (同时累加仓储占用)
+                record_movements([
+                    build_movement(batch, batch.quantity, InventoryMovement.MovementType.RECEIPT,
+                                   operator_id=batch.received_by_id)
+                    for batch in chunk
+                ], batch_size=batch_size)
+                count += len(chunk)
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'已插入 {count}/{total} 条库存批次')
+            keys = {(hospital.pk, supply.pk) for hospital, supply, _ in plan}
+            refresh_stock_balances(keys)
+            queue_alert_evaluation(keys)
+
+        duration = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f'成功导入 {count} 条库存批次数据，耗时: {duration:.2f} 秒 ({count / duration if duration else 0:.0f} 条/秒)'
+        ))
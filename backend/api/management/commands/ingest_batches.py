@@ -0,0 +1,274 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.alerts import deferred_alert_evaluation, queue_alert_evaluation
+from api.functions import bulk_upsert
+from api.ledger import batch_movements, record_movements
+from api.models import Hospital, InventoryBatch, MedicalSupply
+from api.stock import refresh_stock_balances
+from itertools import islice
+import csv
+import os
+import time
+import pandas as pd
+
+# 库存批次文件导入：按块流式读取 CSV / JSONL / Excel (内存占用与文件大小无关)，
+# 每块用 pandas 向量化校验，机构编码/物资编码通过一次性加载的映射表解析为外键，
+# 有效行按批次号 upsert (新批次入库、已有批次覆盖数量和日期)，无效行连同原因写入拒绝文件。
+# 每块在一个事务中完成写入、出入库流水和库存余额刷新；预警在全部导入结束后合并评估一次
+
+DEFAULT_CHUNK_SIZE = 5000
+
+REQUIRED_COLUMNS = ['batch_number', 'org_code', 'unspsc_code', 'quantity', 'production_date', 'expiration_date']
+OPTIONAL_COLUMNS = ['received_date', 'unit_price', 'quality_check_passed', 'notes']
+COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+# 已有批次只覆盖文件中提供的列：必需列总是覆盖，可选列只在文件包含该列时覆盖，且空白单元格保留原值；
+# 入库人/供应商/存储条件保持不变
+UPSERT_REQUIRED_FIELDS = ['hospital', 'supply', 'quantity', 'production_date', 'expiration_date']
+UPSERT_SYSTEM_FIELDS = ['is_quarantined', 'updated_at']
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.xlsx': 'excel', '.xlsm': 'excel'}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', '是'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', '否'}
+
+MAX_QUANTITY = 2147483647
+MAX_UNIT_PRICE = 10 ** 8
+
+
+def _as_text(frame):
+    """统一为去除首尾空白的字符串，缺失值为空串"""
+    frame = frame.astype(object).where(frame.notna(), '')
+    return frame.apply(lambda column: column.map(str).str.strip())
+
+
+def read_csv_chunks(path, chunk_size):
+    yield from pd.read_csv(
+        path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding='utf-8-sig',
+    )
+
+
+def read_jsonl_chunks(path, chunk_size):
+    yield from pd.read_json(path, lines=True, dtype=False, convert_dates=False, chunksize=chunk_size)
+
+
+def read_excel_chunks(path, chunk_size, sheet=None):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CommandError('读取 Excel 文件需要安装 openpyxl')
+    # 只读模式按行流式读取，不把整个工作表载入内存
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else '' for value in next(rows, [])]
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def _blank_as_none(values, blank):
+    return values.astype(object).where(~blank, None)
+
+
+def validate_chunk(frame, hospitals, supplies):
+    """
+    向量化校验一块数据，返回 (有效行的 DataFrame, 拒绝原因 Series, 规范化后的原始列)。
+    拒绝原因为空串的行有效；每行只记录第一个不通过的检查。可选列的空白单元格为 None，由写入时补默认值或保留原值。
+    """
+    frame = _as_text(frame.reindex(columns=COLUMNS, fill_value=''))
+
+    hospital_id = frame['org_code'].map(hospitals)
+    supply = frame['unspsc_code'].map(supplies)
+    quantity = pd.to_numeric(frame['quantity'], errors='coerce')
+    production_date = pd.to_datetime(frame['production_date'], errors='coerce', format='ISO8601')
+    expiration_date = pd.to_datetime(frame['expiration_date'], errors='coerce', format='ISO8601')
+    received_date = pd.to_datetime(frame['received_date'], errors='coerce', format='ISO8601')
+    unit_price = pd.to_numeric(frame['unit_price'], errors='coerce')
+    quality = frame['quality_check_passed'].str.lower()
+
+    checks = [
+        (frame['batch_number'] == '', '缺少批次号'),
+        (frame['batch_number'].str.len() > 50, '批次号超过 50 个字符'),
+        (hospital_id.isna(), '机构编码不存在'),
+        (supply.isna(), '物资编码不存在'),
+        (quantity.isna() | (quantity < 0) | (quantity > MAX_QUANTITY) | (quantity % 1 != 0), '库存数量必须是非负整数'),
+        (production_date.isna(), '生产日期无效'),
+        (expiration_date.isna(), '失效日期无效'),
+        (expiration_date < production_date, '失效日期不能早于生产日期'),
+        ((frame['received_date'] != '') & received_date.isna(), '入库日期无效'),
+        ((frame['unit_price'] != '') & (unit_price.isna() | (unit_price < 0) | (unit_price >= MAX_UNIT_PRICE)),
+         '单价无效'),
+        ((quality != '') & ~quality.isin(TRUE_VALUES | FALSE_VALUES), '质检结果无效'),
+    ]
+    reasons = pd.Series('', index=frame.index)
+    for failed, reason in checks:
+        reasons = reasons.mask((reasons == '') & failed.fillna(False), reason)
+    # 同一块内批次号重复时以后出现的一行为准
+    valid_numbers = frame['batch_number'].where(reasons == '')
+    duplicated = valid_numbers.notna() & valid_numbers.duplicated(keep='last')
+    reasons = reasons.mask(duplicated, '文件中批次号重复，以后出现的一行为准')
+
+    valid = reasons == ''
+    rows = pd.DataFrame({
+        'batch_number': frame['batch_number'],
+        'hospital_id': hospital_id,
+        'supply_id': supply,
+        'quantity': quantity,
+        'production_date': production_date.dt.date,
+        'expiration_date': expiration_date.dt.date,
+        'received_date': _blank_as_none(received_date.dt.date, received_date.isna()),
+        'unit_price': _blank_as_none(unit_price.round(2), unit_price.isna()),
+        'quality_check_passed': _blank_as_none(quality.isin(TRUE_VALUES), quality == ''),
+        'notes': _blank_as_none(frame['notes'], frame['notes'] == ''),
+    })[valid]
+    return rows, reasons, frame
+
+
+def upsert_batches(rows, columns):
+    """
+    在一个事务中按批次号 upsert 一块有效行，返回 (新增数, 更新数, 拒绝原因 {行索引: 原因})。
+    columns 为文件中包含的列，已有批次只覆盖其中的可选列；可选列的空白单元格新批次取默认值，已有批次保留原值。
+    已有批次沿用原主键，并与原数量/归属比较生成流水；被逻辑删除的批次占用的批次号拒绝导入。
+    """
+    optional_fields = [column for column in OPTIONAL_COLUMNS if column in columns]
+    update_fields = UPSERT_REQUIRED_FIELDS + optional_fields + UPSERT_SYSTEM_FIELDS
+    rejected = {}
+    with transaction.atomic():
+        existing = {
+            values[0]: values[1:]
+            for values in InventoryBatch.all_objects.filter(batch_number__in=list(rows['batch_number']))
+            .select_for_update()
+            .values_list('batch_number', 'batch_id', 'hospital_id', 'supply_id', 'quantity', 'is_deleted',
+                         'is_quarantined', *OPTIONAL_COLUMNS)
+        }
+        now = timezone.now()
+        today = now.date()
+        defaults = {'received_date': today, 'unit_price': None, 'quality_check_passed': True, 'notes': ''}
+        batches = []
+        movements = []
+        keys = set()
+        created = updated = 0
+        for index, row in zip(rows.index, rows.itertuples(index=False)):
+            previous = existing.get(row.batch_number)
+            stored = dict(zip(OPTIONAL_COLUMNS, previous[6:])) if previous else defaults
+            optional = {
+                column: stored[column] if getattr(row, column) is None else getattr(row, column)
+                for column in OPTIONAL_COLUMNS
+            }
+            batch = InventoryBatch(
+                batch_number=row.batch_number, hospital_id=row.hospital_id, supply_id=row.supply_id,
+                quantity=int(row.quantity), production_date=row.production_date,
+                expiration_date=row.expiration_date, updated_at=now, **optional,
+            )
+            if previous is None:
+                movements.extend(batch_movements(batch, created=True))
+                created += 1
+            else:
+                batch_id, hospital_id, supply_id, quantity, is_deleted, is_quarantined = previous[:6]
+                if is_deleted:
+                    rejected[index] = '批次号已被删除的批次占用'
+                    continue
+                batch.batch_id = batch_id
+                # 已隔离的批次仍过期时保持隔离，失效日期更正为未过期时解除隔离
+                batch.is_quarantined = is_quarantined and batch.expiration_date < today
+                batch._loaded_values = {
+                    'hospital_id': hospital_id, 'supply_id': supply_id, 'quantity': quantity, 'is_deleted': False,
+                }
+                movements.extend(batch_movements(batch))
+                keys.add((hospital_id, supply_id))
+                updated += 1
+            keys.add((batch.hospital_id, batch.supply_id))
+            batches.append(batch)
+
+        if batches:
+            # bulk 写入不触发信号，显式记录出入库流水并刷新库存余额
+            bulk_upsert(InventoryBatch, batches, ['batch_number'], update_fields, batch_size=len(batches))
+            record_movements(movements, batch_size=len(batches))
+            refresh_stock_balances(keys)
+            queue_alert_evaluation(keys)
+    return created, updated, rejected
+
+
+class Command(BaseCommand):
+    help = '从 CSV / JSONL / Excel 文件流式导入库存批次，按批次号新增或更新，无效行写入拒绝文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='批次文件路径 (.csv, .jsonl/.ndjson, .xlsx)')
+        parser.add_argument(
+            '--format', choices=sorted(set(FORMATS.values())), help='文件格式 (默认按扩展名判断)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'每块读取并写入的行数 (默认 {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument('--sheet', help='Excel 工作表名称 (默认第一个工作表)')
+        parser.add_argument('--rejects', help='拒绝文件路径 (默认 <文件名>.rejects.csv)')
+        parser.add_argument('--dry-run', action='store_true', help='只校验并写出拒绝文件，不写入数据库')
+
+    def _chunks(self, path, file_format, options):
+        if file_format == 'csv':
+            return read_csv_chunks(path, options['chunk_size'])
+        if file_format == 'jsonl':
+            return read_jsonl_chunks(path, options['chunk_size'])
+        return read_excel_chunks(path, options['chunk_size'], options['sheet'])
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'文件不存在: {path}')
+        file_format = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError('无法根据扩展名判断文件格式，请使用 --format 指定')
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size 必须大于 0')
+        rejects_path = options['rejects'] or f'{path}.rejects.csv'
+        dry_run = options['dry_run']
+
+        start_time = time.time()
+        # 机构编码/物资编码映射只加载一次
+        hospitals = dict(Hospital.objects.values_list('org_code', 'hospital_id'))
+        supplies = {code: code for code in MedicalSupply.objects.values_list('unspsc_code', flat=True)}
+
+        total = created = updated = rejected_count = 0
+        with open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file, deferred_alert_evaluation():
+            writer = csv.DictWriter(rejects_file, fieldnames=['row', 'reject_reason'] + COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            for chunk in self._chunks(path, file_format, options):
+                chunk = chunk.reset_index(drop=True)
+                missing = [column for column in REQUIRED_COLUMNS if column not in chunk]
+                if missing:
+                    raise CommandError(f"文件缺少必需的列: {', '.join(missing)}")
+
+                rows, reasons, frame = validate_chunk(chunk, hospitals, supplies)
+                if not dry_run and not rows.empty:
+                    chunk_created, chunk_updated, chunk_rejected = upsert_batches(rows, chunk.columns)
+                    created += chunk_created
+                    updated += chunk_updated
+                    for index, reason in chunk_rejected.items():
+                        reasons[index] = reason
+
+                bad = frame[reasons != ''].assign(reject_reason=reasons[reasons != ''])
+                # 行号从 1 开始计数数据行 (不含表头)
+                bad.insert(0, 'row', bad.index + total + 1)
+                writer.writerows(bad.to_dict('records'))
+                rejected_count += len(bad)
+                total += len(chunk)
+                if options['verbosity'] >= 2:
+                    elapsed = time.time() - start_time
+                    self.stdout.write(f'已处理 {total} 行，拒绝 {rejected_count} 行，{total / elapsed if elapsed else 0:.0f} 行/秒')
+
+        duration = time.time() - start_time
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}导入完成，读取 {total} 行，新增批次 {created} 个，更新批次 {updated} 个，拒绝 {rejected_count} 行，'
+            f'耗时: {duration:.2f} 秒 ({total / duration if duration else 0:.0f} 行/秒)'
+        ))
+        if rejected_count:
+            self.stdout.write(self.style.WARNING(f'被拒绝的行已写入: {rejects_path}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api.stock import recompute_capacity
+import time
+
+class Command(BaseCommand):
+    help = '根据库存批次数量 × 物资单位体积重新计算各医院的当前库存占用 (修复偏差或修改单位体积之后)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hospital', action='append', dest='hospitals',
+            help='只重新计算指定医院 (hospital_id)，可重复指定',
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        count = recompute_capacity(options['hospitals'])
+        duration = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f'仓储占用重新计算完成，共 {count} 家医院，耗时: {duration:.2f} 秒。'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from api.stock import reconcile_stock_balances
+import time
+
+class Command(BaseCommand):
+    help = '根据库存批次重新汇总各医院各物资的库存余额 (修复偏差或刷新已过期的余额)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hospital', action='append', dest='hospitals',
+            help='只对指定医院 (hospital_id) 对账，可重复指定',
+        )
+        parser.add_argument(
+            '--stale-only', action='store_true',
+            help='只刷新最早失效日期已过的余额，适合每日定时执行',
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        count = reconcile_stock_balances(options['hospitals'], stale_only=options['stale_only'])
+        duration = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f'库存余额对账完成，写入 {count} 行，耗时: {duration:.2f} 秒。'))
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.scheduler import DEFAULT_JITTER, SCHEDULED_JOBS, start_scheduler
+import signal
+import threading
+
+class Command(BaseCommand):
+    help = '常驻进程，按配置的间隔定时执行预警检查、优先级重算等任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--job', action='append', dest='jobs', choices=list(SCHEDULED_JOBS),
+            help='只运行指定任务，可重复指定 (默认全部)',
+        )
+        parser.add_argument(
+            '--interval', action='append', dest='intervals', default=[], metavar='JOB=SECONDS',
+            help='覆盖任务的运行间隔 (秒)，如 check_inventory_alerts=30，可重复指定',
+        )
+        parser.add_argument(
+            '--jitter', type=float, default=DEFAULT_JITTER, help='间隔随机抖动比例 (0~1，默认 0.1)',
+        )
+        parser.add_argument('--once', action='store_true', help='每个任务只运行一次后退出')
+
+    def _intervals(self, options):
+        intervals = {
+            name: interval for name, (_, _, interval) in SCHEDULED_JOBS.items()
+            if not options['jobs'] or name in options['jobs']
+        }
+        for value in options['intervals']:
+            name, _, seconds = value.partition('=')
+            if name not in SCHEDULED_JOBS:
+                raise CommandError(f'未知任务: {name}')
+            try:
+                seconds = float(seconds)
+            except ValueError:
+                raise CommandError(f'无效的间隔: {value}')
+            if seconds <= 0:
+                raise CommandError('--interval 必须大于 0')
+            if name in intervals:
+                intervals[name] = seconds
+        return intervals
+
+    def _report(self, name, metrics, output):
+        with self._output_lock:
+            if output is None:
+                self.stdout.write(self.style.WARNING(f'[{name}] 其他进程正在运行，本次跳过'))
+                return
+            if self.verbosity >= 2 and output.strip():
+                self.stdout.write(output.rstrip())
+            if metrics.last_failed:
+                self.stdout.write(self.style.ERROR(
+                    f'[{name}] 第 {metrics.runs} 次运行失败: {metrics.last_error}，耗时: {metrics.last_seconds:.2f} 秒'
+                ))
+            else:
+                self.stdout.write(
+                    f'[{name}] 第 {metrics.runs} 次运行完成，耗时: {metrics.last_seconds:.2f} 秒'
+                )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['jitter'] < 1:
+            raise CommandError('--jitter 必须在 0 和 1 之间')
+        intervals = self._intervals(options)
+        if not intervals:
+            raise CommandError('没有需要运行的任务')
+
+        self.verbosity = options['verbosity']
+        self._output_lock = threading.Lock()
+        stop, threads, metrics = start_scheduler(
+            intervals, jitter=options['jitter'], report=self._report, verbosity=self.verbosity,
+            once=options['once'],
+        )
+        self.stdout.write(', '.join(f'{name} 每 {seconds:g} 秒' for name, seconds in intervals.items()))
+
+        # SIGTERM/SIGINT 后等待正在运行的任务结束再退出
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+
+        for name, job_metrics in metrics.items():
+            stats = job_metrics.as_dict()
+            self.stdout.write(
+                f"{name}: 运行 {stats['runs']} 次，失败 {stats['failures']} 次，跳过 {stats['skipped']} 次，"
+                f"平均耗时: {stats['avg_seconds'] or 0:.2f} 秒，最长耗时: {stats['max_seconds']:.2f} 秒"
+            )
+        self.stdout.write(self.style.SUCCESS('调度进程已退出'))
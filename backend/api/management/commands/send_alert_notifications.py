@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.notifications import DEFAULT_WORKERS, DELIVERY_BATCH_SIZE, build_digests, deliver_notifications
+import time
+
+class Command(BaseCommand):
+    help = '把新预警按医院和预警类型合并为通知摘要，并用工作线程池发送到期的摘要邮件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='发送线程数')
+        parser.add_argument('--limit', type=int, default=DELIVERY_BATCH_SIZE, help='本次最多发送的摘要数')
+        parser.add_argument(
+            '--hospital', action='append', dest='hospitals',
+            help='只为指定医院 (hospital_id) 生成摘要，可重复指定',
+        )
+        parser.add_argument('--skip-digest', action='store_true', help='不生成新摘要，只发送 (重试) 已有的摘要')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['limit'] < 1:
+            raise CommandError('--workers 和 --limit 必须大于 0')
+
+        start_time = time.time()
+        digests = 0 if options['skip_digest'] else build_digests(options['hospitals'])
+        result = deliver_notifications(workers=options['workers'], limit=options['limit'])
+        duration = time.time() - start_time
+        self.stdout.write(
+            f"生成摘要 {digests} 条；领取 {result['claimed']} 条，发送成功 {result['sent']} 条，"
+            f"待重试 {result['retried']} 条，放弃 {result['failed']} 条，吞吐 {result['per_second']:.1f} 条/秒"
+        )
+        self.stdout.write(self.style.SUCCESS(f'预警通知处理完成，耗时: {duration:.2f} 秒。'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.ledger import take_snapshots
+from datetime import datetime, timedelta
+import time
+
+class Command(BaseCommand):
+    help = '生成每日库存快照 (默认昨天)，供时点库存和消耗量查询使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='快照日期 YYYY-MM-DD，默认昨天')
+        parser.add_argument(
+            '--days', type=int, default=1,
+            help='从快照日期往前连续生成的天数 (首次部署时可用于补齐历史快照)',
+        )
+        parser.add_argument(
+            '--hospital', action='append', dest='hospitals',
+            help='只为指定医院 (hospital_id) 生成快照，可重复指定',
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('日期格式应为 YYYY-MM-DD')
+        else:
+            end_date = timezone.now().date() - timedelta(days=1)
+        if options['days'] < 1:
+            raise CommandError('--days 必须大于 0')
+
+        start_time = time.time()
+        count = 0
+        # 按日期从早到晚生成，每天的快照都由前一天的快照加当天流水推算
+        for offset in range(options['days'] - 1, -1, -1):
+            snapshot_date = end_date - timedelta(days=offset)
+            count += take_snapshots(snapshot_date, options['hospitals'])
+        duration = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f'库存快照生成完成，写入 {count} 行，耗时: {duration:.2f} 秒。'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from api.alerts import sweep_expired_stock
+import time
+
+class Command(BaseCommand):
+    help = '隔离已过期仍有库存的批次，并批量创建已过期预警'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hospital', action='append', dest='hospitals',
+            help='只清扫指定医院 (hospital_id)，可重复指定',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='只统计将要隔离的批次和创建的预警，不写入')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        quarantined, released, result = sweep_expired_stock(options['hospitals'], dry_run=options['dry_run'])
+        duration = time.time() - start_time
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}过期清扫完成，隔离批次 {quarantined} 个，解除隔离 {released} 个，新建已过期预警 {result['created']} 条，"
+            f"耗时: {duration:.2f} 秒。"
+        ))
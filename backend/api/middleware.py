@@ -0,0 +1,12 @@
+from .alerts import deferred_alert_evaluation
+
+
+class AlertEvaluationMiddleware:
+    """一次请求内的批次/分配写入在请求结束时合并评估预警，避免逐条写入逐次检查"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deferred_alert_evaluation():
+            return self.get_response(request)
@@ -0,0 +1,125 @@
+# Generated by Django 5.1.4 on 2026-10-19 07:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import date
+
+from django.db import migrations, models
+
+# 与 api.models.STOCK_EXPIRY_EPOCH 一致 (迁移中不引用应用代码)
+STOCK_EXPIRY_EPOCH = date(2000, 1, 1)
+
+
+def backfill_stock_balances(apps, schema_editor):
+    """由已有的未删除批次汇总各医院各物资的库存余额，部署后无需再手动对账"""
+    InventoryBatch = apps.get_model("api", "InventoryBatch")
+    StockBalance = apps.get_model("api", "StockBalance")
+
+    today = django.utils.timezone.now().date()
+    balances = {}
+    for hospital_id, supply_id, quantity, expiration_date in InventoryBatch.objects.filter(
+        is_deleted=False
+    ).values_list("hospital_id", "supply_id", "quantity", "expiration_date").iterator(chunk_size=2000):
+        balance = balances.get((hospital_id, supply_id))
+        if balance is None:
+            balance = balances[(hospital_id, supply_id)] = StockBalance(
+                hospital_id=hospital_id, supply_id=supply_id, as_of=today
+            )
+        balance.batch_count += 1
+        balance.total_quantity += quantity
+        if quantity > 0 and expiration_date >= today:
+            balance.available_quantity += quantity
+            balance.expiry_weight += quantity * (expiration_date - STOCK_EXPIRY_EPOCH).days
+            if balance.earliest_expiry is None or expiration_date < balance.earliest_expiry:
+                balance.earliest_expiry = expiration_date
+    StockBalance.objects.bulk_create(balances.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_alter_requestitem_options_requestitem_priority_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "batch_count",
+                    models.PositiveIntegerField(default=0, verbose_name="批次数"),
+                ),
+                (
+                    "total_quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="库存总量"),
+                ),
+                (
+                    "available_quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="未过期库存量"),
+                ),
+                (
+                    "earliest_expiry",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="最早失效日期"
+                    ),
+                ),
+                (
+                    "expiry_weight",
+                    models.BigIntegerField(default=0, verbose_name="失效日期加权和"),
+                ),
+                (
+                    "as_of",
+                    models.DateField(
+                        default=django.utils.timezone.now, verbose_name="计算日期"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_balances",
+                        to="api.hospital",
+                    ),
+                ),
+                (
+                    "supply",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_balances",
+                        to="api.medicalsupply",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "库存余额",
+                "indexes": [
+                    models.Index(
+                        fields=["supply", "available_quantity"],
+                        name="balance_supply_avail_idx",
+                    ),
+                    models.Index(
+                        fields=["earliest_expiry"], name="balance_earliest_expiry_idx"
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("hospital", "supply"), name="unique_stock_balance"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_stock_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,209 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.db import migrations, models
+
+
+def backfill_movements(apps, schema_editor):
+    """
+    为已有数据生成期初流水：每个批次按 当前数量 + 已分配数量 记一笔入库，
+    每条分配记录记一笔出库，使历史消耗量也可以从流水中查询。
+    """
+    InventoryBatch = apps.get_model("api", "InventoryBatch")
+    ItemFulfillment = apps.get_model("api", "ItemFulfillment")
+    InventoryMovement = apps.get_model("api", "InventoryMovement")
+
+    batches = {
+        row[0]: row
+        for row in InventoryBatch.objects.filter(is_deleted=False).values_list(
+            "batch_id", "hospital_id", "supply_id", "batch_number", "quantity",
+            "received_date", "received_by_id",
+        )
+    }
+    issued = defaultdict(int)
+    movements = []
+    for fulfillment_id, batch_id, quantity, fulfilled_time, fulfilled_by_id in (
+        ItemFulfillment.objects.filter(is_deleted=False).values_list(
+            "fulfillment_id", "inventory_batch_id", "quantity", "fulfilled_time", "fulfilled_by_id",
+        )
+    ):
+        batch = batches.get(batch_id)
+        if batch is None:
+            continue
+        issued[batch_id] += quantity
+        movements.append(InventoryMovement(
+            hospital_id=batch[1], supply_id=batch[2], batch_id=batch_id, batch_number=batch[3],
+            movement_type="IS", quantity=-quantity, occurred_at=fulfilled_time,
+            reference=str(fulfillment_id), operator_id=fulfilled_by_id,
+        ))
+    for batch_id, hospital_id, supply_id, batch_number, quantity, received_date, received_by_id in batches.values():
+        received = quantity + issued[batch_id]
+        if received:
+            movements.append(InventoryMovement(
+                hospital_id=hospital_id, supply_id=supply_id, batch_id=batch_id, batch_number=batch_number,
+                movement_type="RC", quantity=received, occurred_at=datetime.combine(received_date, time.min),
+                reference="期初", operator_id=received_by_id,
+            ))
+    InventoryMovement.objects.bulk_create(movements, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_stockbalance"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryMovement",
+            fields=[
+                ("movement_id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "batch_number",
+                    models.CharField(blank=True, max_length=50, verbose_name="批次号"),
+                ),
+                (
+                    "movement_type",
+                    models.CharField(
+                        choices=[
+                            ("RC", "入库"),
+                            ("IS", "出库"),
+                            ("AD", "盘点调整"),
+                            ("TR", "调拨"),
+                            ("EX", "过期报损"),
+                        ],
+                        max_length=2,
+                        verbose_name="变动类型",
+                    ),
+                ),
+                ("quantity", models.IntegerField(verbose_name="变动数量")),
+                (
+                    "occurred_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="发生时间"
+                    ),
+                ),
+                (
+                    "reference",
+                    models.CharField(
+                        blank=True, max_length=64, verbose_name="关联单据"
+                    ),
+                ),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="movements",
+                        to="api.inventorybatch",
+                    ),
+                ),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movements",
+                        to="api.hospital",
+                    ),
+                ),
+                (
+                    "operator",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="inventory_movements",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "supply",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movements",
+                        to="api.medicalsupply",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "出入库流水",
+                "indexes": [
+                    models.Index(
+                        fields=["hospital", "occurred_at"],
+                        name="movement_hospital_time_idx",
+                    ),
+                    models.Index(
+                        fields=["hospital", "supply", "occurred_at"],
+                        name="movement_hosp_supply_time_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="InventorySnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("snapshot_date", models.DateField(verbose_name="快照日期")),
+                ("quantity", models.IntegerField(default=0, verbose_name="在库数量")),
+                (
+                    "cumulative_received",
+                    models.BigIntegerField(default=0, verbose_name="累计入库量"),
+                ),
+                (
+                    "cumulative_issued",
+                    models.BigIntegerField(default=0, verbose_name="累计出库量"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now=True, verbose_name="生成时间"),
+                ),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="api.hospital",
+                    ),
+                ),
+                (
+                    "supply",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="api.medicalsupply",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "库存快照",
+                "indexes": [
+                    models.Index(
+                        fields=["hospital", "snapshot_date"],
+                        name="snapshot_hospital_date_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("hospital", "supply", "snapshot_date"),
+                        name="unique_inventory_snapshot",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_movements, migrations.RunPython.noop),
+    ]
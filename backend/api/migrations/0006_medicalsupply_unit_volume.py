@@ -0,0 +1,57 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:02
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def recompute_capacity(apps, schema_editor):
+    """当前库存改为由库存批次派生，按 数量 × 单位体积 重新计算一次作为累加的起点"""
+    Hospital = apps.get_model("api", "Hospital")
+    InventoryBatch = apps.get_model("api", "InventoryBatch")
+    volume = ExpressionWrapper(
+        F("quantity") * F("supply__unit_volume"), output_field=DecimalField(max_digits=20, decimal_places=4)
+    )
+    used = dict(
+        InventoryBatch.objects.filter(is_deleted=False)
+        .values("hospital_id")
+        .annotate(used=Sum(volume))
+        .order_by()
+        .values_list("hospital_id", "used")
+    )
+    for hospital in Hospital.objects.all():
+        hospital.current_capacity = used.get(hospital.pk) or 0
+        hospital.save(update_fields=["current_capacity"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_inventorymovement_inventorysnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicalsupply",
+            name="unit_volume",
+            field=models.DecimalField(
+                decimal_places=4,
+                default=Decimal("0.0010"),
+                help_text="每计量单位占用的仓储容量 (m³)，用于计算医院当前库存占用",
+                max_digits=10,
+                verbose_name="单位体积",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="hospital",
+            name="current_capacity",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="由库存批次数量 × 物资单位体积累加维护，可用 recompute_capacity 命令重新计算",
+                max_digits=10,
+                verbose_name="当前库存",
+            ),
+        ),
+        migrations.RunPython(recompute_capacity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_medicalsupply_unit_volume"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventorybatch",
+            index=models.Index(
+                fields=["hospital", "supply", "expiration_date"], name="batch_fefo_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_inventorybatch_batch_fefo_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventoryalert",
+            index=models.Index(
+                fields=["hospital", "is_resolved", "is_deleted", "alert_type"],
+                name="alert_hospital_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventorybatch",
+            index=models.Index(
+                fields=[
+                    "hospital",
+                    "supply",
+                    "is_deleted",
+                    "expiration_date",
+                    "quantity",
+                ],
+                name="batch_live_fefo_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="requestitem",
+            index=models.Index(
+                fields=["supply", "is_deleted", "request"], name="item_supply_live_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supplyrequest",
+            index=models.Index(
+                fields=["status", "is_deleted"], name="request_status_idx"
+            ),
+        ),
+        # 先建新索引再删除旧的 FEFO 索引，拣选查询始终有可用索引
+        migrations.RemoveIndex(
+            model_name="inventorybatch",
+            name="batch_fefo_idx",
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:19
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedRecord",
+            fields=[
+                ("record_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("model", models.CharField(max_length=50, verbose_name="原模型")),
+                ("object_id", models.CharField(max_length=64, verbose_name="原主键")),
+                (
+                    "root_model",
+                    models.CharField(max_length=50, verbose_name="归档根模型"),
+                ),
+                ("root_id", models.CharField(max_length=64, verbose_name="归档根主键")),
+                (
+                    "hospital_id",
+                    models.UUIDField(blank=True, null=True, verbose_name="医院ID"),
+                ),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[("DL", "已删除"), ("CL", "已关闭")],
+                        max_length=2,
+                        verbose_name="归档原因",
+                    ),
+                ),
+                ("closed_at", models.DateTimeField(verbose_name="关闭时间")),
+                (
+                    "archived_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="归档时间"),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        verbose_name="原记录",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "归档记录",
+                "indexes": [
+                    models.Index(fields=["root_id"], name="archive_root_idx"),
+                    models.Index(
+                        fields=["hospital_id", "model", "closed_at"],
+                        name="archive_hospital_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model", "object_id"), name="unique_archived_record"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:21
+
+import django.db.models.deletion
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_expiry_buckets(apps, schema_editor):
+    """按失效日期所在周 (周一) 汇总已有的未删除、数量大于零的批次"""
+    InventoryBatch = apps.get_model("api", "InventoryBatch")
+    ExpiryBucket = apps.get_model("api", "ExpiryBucket")
+
+    buckets = defaultdict(int)
+    for hospital_id, supply_id, quantity, expiration_date in InventoryBatch.objects.filter(
+        is_deleted=False, quantity__gt=0
+    ).values_list("hospital_id", "supply_id", "quantity", "expiration_date"):
+        week_start = expiration_date - timedelta(days=expiration_date.weekday())
+        buckets[(hospital_id, supply_id, week_start)] += quantity
+    ExpiryBucket.objects.bulk_create(
+        [
+            ExpiryBucket(hospital_id=hospital_id, supply_id=supply_id, week_start=week_start, quantity=quantity)
+            for (hospital_id, supply_id, week_start), quantity in buckets.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_archivedrecord"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpiryBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("week_start", models.DateField(verbose_name="失效周 (周一)")),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="在库数量"),
+                ),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="expiry_buckets",
+                        to="api.hospital",
+                    ),
+                ),
+                (
+                    "supply",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="expiry_buckets",
+                        to="api.medicalsupply",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "失效日历",
+                "indexes": [
+                    models.Index(
+                        fields=["week_start", "hospital", "supply", "quantity"],
+                        name="expiry_bucket_week_idx",
+                    ),
+                    models.Index(
+                        fields=["hospital", "week_start"],
+                        name="expiry_bucket_hospital_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("hospital", "supply", "week_start"),
+                        name="unique_expiry_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_expiry_buckets, migrations.RunPython.noop),
+    ]
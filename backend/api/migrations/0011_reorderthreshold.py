@@ -0,0 +1,84 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_expirybucket"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReorderThreshold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "avg_daily_demand",
+                    models.FloatField(default=0, verbose_name="日均消耗量"),
+                ),
+                (
+                    "demand_std",
+                    models.FloatField(default=0, verbose_name="日消耗量标准差"),
+                ),
+                (
+                    "lead_time_days",
+                    models.PositiveIntegerField(verbose_name="补货提前期 (天)"),
+                ),
+                ("service_level", models.FloatField(verbose_name="服务水平")),
+                ("window_days", models.PositiveIntegerField(verbose_name="统计天数")),
+                (
+                    "safety_stock",
+                    models.PositiveIntegerField(default=0, verbose_name="安全库存"),
+                ),
+                (
+                    "reorder_point",
+                    models.PositiveIntegerField(default=0, verbose_name="再订货点"),
+                ),
+                ("computed_at", models.DateTimeField(verbose_name="计算时间")),
+            ],
+            options={
+                "verbose_name": "再订货点",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="itemfulfillment",
+            index=models.Index(fields=["fulfilled_time"], name="fulfillment_time_idx"),
+        ),
+        migrations.AddField(
+            model_name="reorderthreshold",
+            name="hospital",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reorder_thresholds",
+                to="api.hospital",
+            ),
+        ),
+        migrations.AddField(
+            model_name="reorderthreshold",
+            name="supply",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reorder_thresholds",
+                to="api.medicalsupply",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="reorderthreshold",
+            constraint=models.UniqueConstraint(
+                fields=("hospital", "supply"), name="unique_reorder_threshold"
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:28
+
+import uuid
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_open_keys(apps, schema_editor):
+    """为已有的未解决预警生成去重键；同一键的重复预警只保留最新一条，其余标记为已解决"""
+    InventoryAlert = apps.get_model("api", "InventoryAlert")
+
+    seen = set()
+    duplicates = []
+    keyed = []
+    for alert_id, alert_type, hospital_id, supply_id, batch_id in (
+        InventoryAlert.objects.filter(is_resolved=False, is_deleted=False)
+        .order_by("-created_at")
+        .values_list("alert_id", "alert_type", "hospital_id", "supply_id", "batch_id")
+    ):
+        batch_hex = uuid.UUID(str(batch_id)).hex if batch_id else ""
+        key = f'{alert_type}:{uuid.UUID(str(hospital_id)).hex}:{supply_id or ""}:{batch_hex}'
+        if key in seen:
+            duplicates.append(alert_id)
+        else:
+            seen.add(key)
+            keyed.append(InventoryAlert(alert_id=alert_id, open_key=key))
+    InventoryAlert.objects.bulk_update(keyed, ["open_key"], batch_size=1000)
+    for start in range(0, len(duplicates), 1000):
+        InventoryAlert.objects.filter(alert_id__in=duplicates[start:start + 1000]).update(
+            is_resolved=True, resolved_time=timezone.now()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_reorderthreshold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventoryalert",
+            name="open_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=100,
+                null=True,
+                verbose_name="去重键",
+            ),
+        ),
+        migrations.RunPython(backfill_open_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="inventoryalert",
+            name="open_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=100,
+                null=True,
+                unique=True,
+                verbose_name="去重键",
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_inventoryalert_open_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlertDailyCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="日期")),
+                (
+                    "category",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("DG", "药品"),
+                            ("DV", "医疗设备"),
+                            ("PP", "防护装备"),
+                            ("RT", "检测试剂"),
+                            ("CS", "一次性耗材"),
+                            ("OT", "其他"),
+                        ],
+                        max_length=2,
+                        verbose_name="物资类型",
+                    ),
+                ),
+                (
+                    "alert_type",
+                    models.CharField(
+                        choices=[
+                            ("LS", "库存不足"),
+                            ("EX", "即将过期"),
+                            ("ED", "已过期"),
+                            ("CP", "仓储容量预警"),
+                        ],
+                        max_length=2,
+                        verbose_name="预警类型",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="预警数"),
+                ),
+            ],
+            options={
+                "verbose_name": "预警日统计",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="inventoryalert",
+            index=models.Index(
+                fields=["created_at", "alert_type", "is_deleted"],
+                name="alert_created_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="alertdailycount",
+            name="hospital",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="alert_daily_counts",
+                to="api.hospital",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="alertdailycount",
+            index=models.Index(
+                fields=["day", "alert_type", "count"], name="alert_daily_type_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="alertdailycount",
+            constraint=models.UniqueConstraint(
+                fields=("day", "hospital", "category", "alert_type"),
+                name="unique_alert_daily_count",
+            ),
+        ),
+    ]
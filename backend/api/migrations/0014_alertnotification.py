@@ -0,0 +1,119 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:32
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_alertdailycount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlertNotification",
+            fields=[
+                (
+                    "notification_id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "alert_type",
+                    models.CharField(
+                        choices=[
+                            ("LS", "库存不足"),
+                            ("EX", "即将过期"),
+                            ("ED", "已过期"),
+                            ("CP", "仓储容量预警"),
+                        ],
+                        max_length=2,
+                        verbose_name="预警类型",
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.CharField(blank=True, max_length=254, verbose_name="收件人"),
+                ),
+                ("subject", models.CharField(max_length=200, verbose_name="主题")),
+                ("body", models.TextField(verbose_name="正文")),
+                ("alert_count", models.PositiveIntegerField(verbose_name="预警数")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PD", "待发送"),
+                            ("ST", "已发送"),
+                            ("FL", "发送失败"),
+                            ("SK", "无收件人"),
+                        ],
+                        default="PD",
+                        max_length=2,
+                        verbose_name="状态",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="发送次数"),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="下次发送时间"
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="最近错误")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="发送时间"
+                    ),
+                ),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="alert_notifications",
+                        to="api.hospital",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "预警通知",
+            },
+        ),
+        migrations.AddField(
+            model_name="inventoryalert",
+            name="notification",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="alerts",
+                to="api.alertnotification",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="alertnotification",
+            index=models.Index(
+                fields=["status", "next_attempt_at"], name="notification_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="alertnotification",
+            index=models.Index(
+                fields=["status", "sent_at"], name="notification_sent_idx"
+            ),
+        ),
+    ]
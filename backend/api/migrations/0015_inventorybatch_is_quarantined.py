@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_alertnotification"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventorybatch",
+            name="is_quarantined",
+            field=models.BooleanField(default=False, verbose_name="是否隔离"),
+        ),
+        migrations.AddIndex(
+            model_name="inventorybatch",
+            index=models.Index(
+                fields=[
+                    "hospital",
+                    "supply",
+                    "is_deleted",
+                    "is_quarantined",
+                    "expiration_date",
+                    "quantity",
+                ],
+                name="batch_usable_fefo_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventorybatch",
+            index=models.Index(
+                fields=["is_quarantined", "is_deleted", "expiration_date"],
+                name="batch_quarantine_idx",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="inventorybatch",
+            name="batch_live_fefo_idx",
+        ),
+    ]
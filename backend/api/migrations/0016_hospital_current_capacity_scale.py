@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:45
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def recompute_capacity(apps, schema_editor):
+    """按新的精度重新计算仓储占用，修正此前 2 位小数累加产生的偏差"""
+    Hospital = apps.get_model("api", "Hospital")
+    InventoryBatch = apps.get_model("api", "InventoryBatch")
+
+    volume = ExpressionWrapper(
+        F("quantity") * F("supply__unit_volume"), output_field=DecimalField(max_digits=20, decimal_places=4)
+    )
+    used = dict(
+        InventoryBatch.objects.filter(is_deleted=False)
+        .values("hospital_id")
+        .annotate(used=Sum(volume))
+        .values_list("hospital_id", "used")
+    )
+    for hospital_id in Hospital.objects.values_list("hospital_id", flat=True):
+        Hospital.objects.filter(pk=hospital_id).update(current_capacity=used.get(hospital_id) or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_inventorybatch_is_quarantined"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hospital",
+            name="current_capacity",
+            field=models.DecimalField(
+                decimal_places=4,
+                default=0,
+                help_text="由库存批次数量 × 物资单位体积累加维护 (与单位体积同为 4 位小数，累加不产生舍入误差)，可用 recompute_capacity 命令重新计算",
+                max_digits=12,
+                verbose_name="当前库存",
+            ),
+        ),
+        migrations.RunPython(recompute_capacity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:46
+
+from django.db import migrations, models
+
+
+def relabel_returns(apps, schema_editor):
+    """减少分配时退回批次的流水此前记为数量为正的出库，改为退回类型"""
+    InventoryMovement = apps.get_model("api", "InventoryMovement")
+    InventoryMovement.objects.filter(movement_type="IS", quantity__gt=0).update(movement_type="RT")
+
+
+def unlabel_returns(apps, schema_editor):
+    InventoryMovement = apps.get_model("api", "InventoryMovement")
+    InventoryMovement.objects.filter(movement_type="RT").update(movement_type="IS")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0016_hospital_current_capacity_scale"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="inventorymovement",
+            name="movement_type",
+            field=models.CharField(
+                choices=[
+                    ("RC", "入库"),
+                    ("IS", "出库"),
+                    ("RT", "退回"),
+                    ("AD", "盘点调整"),
+                    ("TR", "调拨"),
+                    ("EX", "过期报损"),
+                ],
+                max_length=2,
+                verbose_name="变动类型",
+            ),
+        ),
+        migrations.RunPython(relabel_returns, unlabel_returns),
+    ]
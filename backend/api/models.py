@@ -1,15 +1,29 @@
 import uuid
+from datetime import date, timedelta
+from decimal import Decimal
 from django.db import models
 from django.contrib.gis.db import models as gis_models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+# 默认管理器只返回未删除的记录；需要包含已逻辑删除的记录时使用 all_objects
+class LiveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 # 基础模型类，包含通用字段
 class BaseModel(models.Model):
     created_at = models.DateTimeField("创建时间", auto_now_add=True)
     updated_at = models.DateTimeField("更新时间", auto_now=True)
     is_deleted = models.BooleanField("是否删除", default=False)
+
+    # all_objects 先声明，作为默认管理器 (_default_manager)：唯一性校验 (DRF UniqueValidator、validate_unique)
+    # 和关联查询仍能看到已逻辑删除的记录，与数据库唯一约束一致；业务查询使用只返回未删除记录的 objects
+    all_objects = models.Manager()
+    objects = LiveManager()
     
     class Meta:
         abstract = True
@@ -35,7 +49,11 @@ class Hospital(BaseModel):
     geo_location = gis_models.PointField("地理坐标")  # 需要安装GEOS库
     contact_info = models.JSONField("联系信息", default=dict)
     storage_volume = models.DecimalField("仓储容量", max_digits=10, decimal_places=2)
-    current_capacity = models.DecimalField("当前库存", max_digits=10, decimal_places=2)
+    current_capacity = models.DecimalField(
+        "当前库存", max_digits=12, decimal_places=4, default=0,
+        help_text="由库存批次数量 × 物资单位体积累加维护 (与单位体积同为 4 位小数，累加不产生舍入误差)，"
+                  "可用 recompute_capacity 命令重新计算"
+    )
     region = models.CharField("所属地区", max_length=50, blank=True)
     is_active = models.BooleanField("是否活跃", default=True)
     warning_threshold = models.DecimalField("库存预警阈值", max_digits=5, decimal_places=2, default=20.00, help_text="百分比，例如20.00表示当库存低于容量的20%时预警")
@@ -88,6 +106,10 @@ class MedicalSupply(BaseModel):
     description = models.TextField("描述", blank=True)
     avg_price = models.DecimalField("平均价格", max_digits=10, decimal_places=2, null=True, blank=True)
     min_stock_level = models.PositiveIntegerField("最低库存量", default=0)
+    unit_volume = models.DecimalField(
+        "单位体积", max_digits=10, decimal_places=4, default=Decimal('0.0010'),
+        help_text="每计量单位占用的仓储容量 (m³)，用于计算医院当前库存占用"
+    )
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='supplies')
     
     def __str__(self):
@@ -117,13 +139,42 @@ class InventoryBatch(BaseModel):
     unit_price = models.DecimalField("单价", max_digits=10, decimal_places=2, null=True, blank=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='batches')
     quality_check_passed = models.BooleanField("质检通过", default=True)
+    # 隔离的批次 (如过期清扫标记的过期批次) 不计入可用库存、不参与拣选，库存汇总按此列过滤，无需比较失效日期
+    is_quarantined = models.BooleanField("是否隔离", default=False)
     notes = models.TextField("备注", blank=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的归属、数量与删除标记，供信号处理函数识别批次的变动 (余额维护与出入库流水)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_values = {
+            name: loaded[name] for name in ('hospital_id', 'supply_id', 'quantity', 'is_deleted') if name in loaded
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        # 失效日期被更正为未过期时解除过期隔离
+        if self.is_quarantined and self.expiration_date >= timezone.now().date():
+            self.is_quarantined = False
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'is_quarantined' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'is_quarantined']
+        super().save(*args, **kwargs)
+
     class Meta:
         indexes = [
             models.Index(fields=['expiration_date'], name='expiry_idx'),
             models.Index(fields=['received_date'], name='received_date_idx'),
             models.Index(fields=['batch_number'], name='batch_number_idx'),
+            # FEFO 拣选按 (医院, 物资, 未删除, 未隔离) 顺序扫描失效日期，加锁读取只触及候选批次；
+            # 末尾的 quantity 使库存余额汇总只读索引即可完成
+            models.Index(
+                fields=['hospital', 'supply', 'is_deleted', 'is_quarantined', 'expiration_date', 'quantity'],
+                name='batch_usable_fefo_idx'
+            ),
+            # 过期清扫按失效日期范围查找尚未隔离的批次
+            models.Index(fields=['is_quarantined', 'is_deleted', 'expiration_date'], name='batch_quarantine_idx'),
         ]
         verbose_name = "库存批次"
 
@@ -157,6 +208,9 @@ class SupplyRequest(BaseModel):
     class Meta:
         ordering = ['-priority', 'required_by']
         verbose_name = "物资请求"
+        indexes = [
+            models.Index(fields=['status', 'is_deleted'], name='request_status_idx'),
+        ]
 
 # 物资请求明细表
 class RequestItem(BaseModel):
@@ -177,6 +231,10 @@ class RequestItem(BaseModel):
             )
         ]
         ordering = ['-priority', 'request__required_by'] # 可以考虑将排序移到这里，或保留在ViewSet中
+        indexes = [
+            # 按物资查找未完成的请求项，再按 request 关联请求状态
+            models.Index(fields=['supply', 'is_deleted', 'request'], name='item_supply_live_idx'),
+        ]
         verbose_name = "请求明细"
 
 # 请求项目的履行记录
@@ -196,6 +254,16 @@ class ItemFulfillment(BaseModel):
                 name="fulfillment_quantity_positive"
             )
         ]
+        indexes = [
+            # 再订货点按时间窗口汇总历史出库
+            models.Index(fields=['fulfilled_time'], name='fulfillment_time_idx'),
+        ]
+
+def alert_open_key(alert_type, hospital_id, supply_id=None, batch_id=None):
+    """未解决预警的去重键：同一类型、医院、物资、批次同时只保留一条未解决的预警"""
+    hospital_hex = uuid.UUID(str(hospital_id)).hex
+    batch_hex = uuid.UUID(str(batch_id)).hex if batch_id else ''
+    return f'{alert_type}:{hospital_hex}:{supply_id or ""}:{batch_hex}'
 
 # 库存预警表
 class InventoryAlert(BaseModel):
@@ -214,10 +282,246 @@ class InventoryAlert(BaseModel):
     is_resolved = models.BooleanField("是否解决", default=False)
     resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='resolved_alerts')
     resolved_time = models.DateTimeField("解决时间", null=True, blank=True)
+    # 未解决预警的去重键 (唯一)，解决或删除后置空；并发检查以此做 upsert，不会重复创建同一预警
+    open_key = models.CharField("去重键", max_length=100, null=True, blank=True, unique=True, editable=False)
+    # 包含该预警的通知摘要，为空表示尚未通知
+    notification = models.ForeignKey(
+        'AlertNotification', on_delete=models.SET_NULL, null=True, blank=True, related_name='alerts'
+    )
+
+    def save(self, *args, **kwargs):
+        if self.is_resolved or self.is_deleted:
+            self.open_key = None
+        else:
+            self.open_key = alert_open_key(self.alert_type, self.hospital_id, self.supply_id, self.batch_id)
+        super().save(*args, **kwargs)
     
     class Meta:
         verbose_name = "库存预警"
         indexes = [
             models.Index(fields=['alert_type'], name='alert_type_idx'),
             models.Index(fields=['is_resolved'], name='alert_resolved_idx'),
+            # 按医院统计/查找未解决的预警
+            models.Index(fields=['hospital', 'is_resolved', 'is_deleted', 'alert_type'], name='alert_hospital_open_idx'),
+            # 预警趋势按创建日期范围汇总
+            models.Index(fields=['created_at', 'alert_type', 'is_deleted'], name='alert_created_idx'),
+        ]
+
+# 加权失效日期的计算基准日：expiry_weight 为 数量 × 失效日期距基准日的天数 之和
+STOCK_EXPIRY_EPOCH = date(2000, 1, 1)
+
+# 各医院各物资的库存余额 (由库存批次派生，随批次/分配记录的写入在同一事务中维护)
+class StockBalance(models.Model):
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='stock_balances')
+    supply = models.ForeignKey(MedicalSupply, on_delete=models.CASCADE, related_name='stock_balances')
+    batch_count = models.PositiveIntegerField("批次数", default=0)
+    total_quantity = models.PositiveIntegerField("库存总量", default=0)
+    available_quantity = models.PositiveIntegerField("未过期库存量", default=0)
+    earliest_expiry = models.DateField("最早失效日期", null=True, blank=True)
+    expiry_weight = models.BigIntegerField("失效日期加权和", default=0)
+    as_of = models.DateField("计算日期", default=timezone.now)
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
+
+    @property
+    def weighted_expiry(self):
+        """未过期库存按数量加权的平均失效日期"""
+        if not self.available_quantity:
+            return None
+        return STOCK_EXPIRY_EPOCH + timedelta(days=round(self.expiry_weight / self.available_quantity))
+
+    def avg_days_remaining(self, today=None):
+        """未过期库存按数量加权的平均剩余天数"""
+        if not self.available_quantity:
+            return 0
+        today = today or timezone.now().date()
+        return max(0.0, self.expiry_weight / self.available_quantity - (today - STOCK_EXPIRY_EPOCH).days)
+
+    class Meta:
+        verbose_name = "库存余额"
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'supply'], name='unique_stock_balance'),
+        ]
+        indexes = [
+            models.Index(fields=['supply', 'available_quantity'], name='balance_supply_avail_idx'),
+            models.Index(fields=['earliest_expiry'], name='balance_earliest_expiry_idx'),
+        ]
+
+
+def expiry_week(day):
+    """失效日期所在周的周一，作为失效日历的分桶键"""
+    return day - timedelta(days=day.weekday())
+
+
+# 失效日历：各医院各物资按失效日期所在周汇总的在库数量 (只统计数量大于零的未删除批次)，
+# 与库存余额一起维护，"N 天内到期" 和 "已过期仍在库" 按周分桶范围查询，无需扫描批次表
+class ExpiryBucket(models.Model):
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='expiry_buckets')
+    supply = models.ForeignKey(MedicalSupply, on_delete=models.CASCADE, related_name='expiry_buckets')
+    week_start = models.DateField("失效周 (周一)")
+    quantity = models.PositiveIntegerField("在库数量", default=0)
+
+    class Meta:
+        verbose_name = "失效日历"
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'supply', 'week_start'], name='unique_expiry_bucket'),
+        ]
+        indexes = [
+            # 全网按周范围汇总时只读索引
+            models.Index(fields=['week_start', 'hospital', 'supply', 'quantity'], name='expiry_bucket_week_idx'),
+            models.Index(fields=['hospital', 'week_start'], name='expiry_bucket_hospital_idx'),
+        ]
+
+
+# 各医院各物资的再订货点与安全库存：由 compute_reorder_points 根据历史出库量计算，
+# 库存不足检查优先使用这里的再订货点，没有记录的医院/物资回退到物资的最低库存量
+class ReorderThreshold(models.Model):
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='reorder_thresholds')
+    supply = models.ForeignKey(MedicalSupply, on_delete=models.CASCADE, related_name='reorder_thresholds')
+    avg_daily_demand = models.FloatField("日均消耗量", default=0)
+    demand_std = models.FloatField("日消耗量标准差", default=0)
+    lead_time_days = models.PositiveIntegerField("补货提前期 (天)")
+    service_level = models.FloatField("服务水平")
+    window_days = models.PositiveIntegerField("统计天数")
+    safety_stock = models.PositiveIntegerField("安全库存", default=0)
+    reorder_point = models.PositiveIntegerField("再订货点", default=0)
+    computed_at = models.DateTimeField("计算时间")
+
+    class Meta:
+        verbose_name = "再订货点"
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'supply'], name='unique_reorder_threshold'),
+        ]
+
+
+# 预警日统计：compact_alerts 把超过保留期的已解决预警按创建日期、医院、物资类型、预警类型汇总到这里后删除明细，
+# 趋势与总数统计把日统计与仍在预警表中的明细相加 (同一条预警只会出现在其中一处)
+class AlertDailyCount(models.Model):
+    day = models.DateField("日期")
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='alert_daily_counts')
+    # 仓储容量预警不关联物资，物资类型为空
+    category = models.CharField("物资类型", max_length=2, choices=MedicalSupply.SupplyCategory.choices, blank=True)
+    alert_type = models.CharField("预警类型", max_length=2, choices=InventoryAlert.AlertType.choices)
+    count = models.PositiveIntegerField("预警数", default=0)
+
+    class Meta:
+        verbose_name = "预警日统计"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'hospital', 'category', 'alert_type'], name='unique_alert_daily_count'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'alert_type', 'count'], name='alert_daily_type_idx'),
+        ]
+
+
+# 出入库流水 (只追加不修改)：每条记录是某医院某物资在某批次上的一次数量变动，quantity 为带符号的变动量
+class InventoryMovement(models.Model):
+    class MovementType(models.TextChoices):
+        RECEIPT = 'RC', '入库'
+        ISSUE = 'IS', '出库'
+        RETURN = 'RT', '退回'
+        ADJUSTMENT = 'AD', '盘点调整'
+        TRANSFER = 'TR', '调拨'
+        EXPIRY = 'EX', '过期报损'
+
+    movement_id = models.BigAutoField(primary_key=True)
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='movements')
+    supply = models.ForeignKey(MedicalSupply, on_delete=models.CASCADE, related_name='movements')
+    # 批次被物理删除后流水仍需保留，因此外键置空并冗余保存批次号
+    batch = models.ForeignKey(InventoryBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    batch_number = models.CharField("批次号", max_length=50, blank=True)
+    movement_type = models.CharField("变动类型", max_length=2, choices=MovementType.choices)
+    quantity = models.IntegerField("变动数量")
+    occurred_at = models.DateTimeField("发生时间", default=timezone.now)
+    reference = models.CharField("关联单据", max_length=64, blank=True)
+    operator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory_movements')
+
+    class Meta:
+        verbose_name = "出入库流水"
+        indexes = [
+            models.Index(fields=['hospital', 'occurred_at'], name='movement_hospital_time_idx'),
+            models.Index(fields=['hospital', 'supply', 'occurred_at'], name='movement_hosp_supply_time_idx'),
+        ]
+
+# 每日库存快照：snapshot_date 当天结束时各医院各物资的在库数量及累计入库/出库量
+# 时点库存 = 最近快照 + 快照之后的流水增量；区间消耗量 = 两个时点累计出库量之差
+class InventorySnapshot(models.Model):
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='snapshots')
+    supply = models.ForeignKey(MedicalSupply, on_delete=models.CASCADE, related_name='snapshots')
+    snapshot_date = models.DateField("快照日期")
+    quantity = models.IntegerField("在库数量", default=0)
+    cumulative_received = models.BigIntegerField("累计入库量", default=0)
+    cumulative_issued = models.BigIntegerField("累计出库量", default=0)
+    created_at = models.DateTimeField("生成时间", auto_now=True)
+
+    class Meta:
+        verbose_name = "库存快照"
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'supply', 'snapshot_date'], name='unique_inventory_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['hospital', 'snapshot_date'], name='snapshot_hospital_date_idx'),
+        ]
+
+
+# 归档记录：已逻辑删除或关闭较久的请求、请求项、分配记录、预警和批次由 archive_records 命令分批移出业务表。
+# 每行保存一条原记录的全部字段 (data)，同一请求的请求项和分配记录以 root_id 关联到请求
+class ArchivedRecord(models.Model):
+    class Reason(models.TextChoices):
+        DELETED = 'DL', '已删除'
+        CLOSED = 'CL', '已关闭'
+
+    record_id = models.BigAutoField(primary_key=True)
+    model = models.CharField("原模型", max_length=50)
+    object_id = models.CharField("原主键", max_length=64)
+    root_model = models.CharField("归档根模型", max_length=50)
+    root_id = models.CharField("归档根主键", max_length=64)
+    # 不使用外键：医院删除后归档数据仍然保留
+    hospital_id = models.UUIDField("医院ID", null=True, blank=True)
+    reason = models.CharField("归档原因", max_length=2, choices=Reason.choices)
+    closed_at = models.DateTimeField("关闭时间")
+    archived_at = models.DateTimeField("归档时间", auto_now_add=True)
+    data = models.JSONField("原记录", encoder=DjangoJSONEncoder)
+
+    class Meta:
+        verbose_name = "归档记录"
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='unique_archived_record'),
+        ]
+        indexes = [
+            models.Index(fields=['root_id'], name='archive_root_idx'),
+            models.Index(fields=['hospital_id', 'model', 'closed_at'], name='archive_hospital_idx'),
+        ]
+
+
+# 预警通知摘要：每家医院每种预警类型的新预警合并为一封邮件，发往医院联系信息中的 email，
+# 由工作线程池发送，失败后按指数退避重试，status/attempts/last_error 记录投递状态
+class AlertNotification(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'PD', '待发送'
+        SENT = 'ST', '已发送'
+        FAILED = 'FL', '发送失败'
+        SKIPPED = 'SK', '无收件人'
+
+    notification_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='alert_notifications')
+    alert_type = models.CharField("预警类型", max_length=2, choices=InventoryAlert.AlertType.choices)
+    recipient = models.CharField("收件人", max_length=254, blank=True)
+    subject = models.CharField("主题", max_length=200)
+    body = models.TextField("正文")
+    alert_count = models.PositiveIntegerField("预警数")
+    status = models.CharField("状态", max_length=2, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField("发送次数", default=0)
+    next_attempt_at = models.DateTimeField("下次发送时间", default=timezone.now)
+    last_error = models.TextField("最近错误", blank=True)
+    created_at = models.DateTimeField("创建时间", auto_now_add=True)
+    sent_at = models.DateTimeField("发送时间", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "预警通知"
+        indexes = [
+            # 工作线程按到期时间领取待发送的通知
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+            models.Index(fields=['status', 'sent_at'], name='notification_sent_idx'),
         ]
@@ -0,0 +1,223 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from .models import AlertNotification, Hospital, InventoryAlert
+
+# 预警通知：
+#   1. build_digests 把尚未通知的未解决预警按 (医院, 预警类型) 合并为一条通知摘要，预警记录关联到摘要，不会重复通知；
+#   2. deliver_notifications 领取到期的待发送摘要 (加锁并设置租约，多进程不会重复发送)，
+#      分给工作线程池，每个线程复用一个邮件连接批量发送；
+#   3. 发送失败按指数退避重试，超过 MAX_ATTEMPTS 次标记为发送失败。
+# 邮件后端由 settings.ALERT_NOTIFICATION_EMAIL_BACKEND 指定 (控制台/文件/SMTP)
+
+logger = logging.getLogger(__name__)
+
+Status = AlertNotification.Status
+
+DEFAULT_WORKERS = 4
+DELIVERY_BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+# 第 n 次失败后等待 BACKOFF_SECONDS · 2^(n-1) 秒 (±20% 抖动)，最长 BACKOFF_MAX_SECONDS
+BACKOFF_SECONDS = 60
+BACKOFF_MAX_SECONDS = 3600
+# 领取后的租约：发送进程中途退出时，租约到期后可被重新领取
+LEASE_SECONDS = 300
+# 摘要正文最多列出的预警条数
+DIGEST_MAX_LINES = 50
+
+
+def _recipient(contact_info):
+    """医院联系信息中的邮箱 (contact_info 形如 {"phone": ..., "email": ...})"""
+    return contact_info.get('email', '') if isinstance(contact_info, dict) else ''
+
+
+def _digest(hospital_name, alert_type, messages):
+    label = InventoryAlert.AlertType(alert_type).label
+    lines = [f'- {message}' for message in messages[:DIGEST_MAX_LINES]]
+    if len(messages) > DIGEST_MAX_LINES:
+        lines.append(f'... 等共 {len(messages)} 条')
+    subject = f'[{label}] {hospital_name}：{len(messages)} 条新预警'
+    return subject[:200], f'{hospital_name} 有 {len(messages)} 条新的{label}预警：\n\n' + '\n'.join(lines)
+
+
+def build_digests(hospital_ids=None):
+    """
+    为尚未通知的未解决预警生成通知摘要，返回生成的摘要数。
+    加锁读取时跳过其他进程正在处理的预警，并发执行不会把同一预警放进两条摘要。
+    """
+    with transaction.atomic():
+        alerts = InventoryAlert.objects.filter(notification__isnull=True, is_resolved=False)
+        if hospital_ids is not None:
+            alerts = alerts.filter(hospital_id__in=hospital_ids)
+        rows = list(
+            alerts.select_for_update(skip_locked=True, of=('self',))
+            .order_by('hospital_id', 'alert_type', 'created_at')
+            .values_list('alert_id', 'hospital_id', 'alert_type', 'message')
+        )
+        if not rows:
+            return 0
+
+        groups = defaultdict(list)
+        for alert_id, hospital_id, alert_type, message in rows:
+            groups[(hospital_id, alert_type)].append((alert_id, message))
+        hospitals = {
+            hospital_id: (name, _recipient(contact_info))
+            for hospital_id, name, contact_info in Hospital.objects.filter(
+                pk__in={hospital_id for hospital_id, _ in groups}
+            ).values_list('hospital_id', 'name', 'contact_info')
+        }
+
+        notifications = []
+        for (hospital_id, alert_type), alerts_in_group in groups.items():
+            name, recipient = hospitals.get(hospital_id, ('', ''))
+            subject, body = _digest(name, alert_type, [message for _, message in alerts_in_group])
+            notifications.append(AlertNotification(
+                hospital_id=hospital_id, alert_type=alert_type, recipient=recipient, subject=subject, body=body,
+                alert_count=len(alerts_in_group), status=Status.PENDING if recipient else Status.SKIPPED,
+            ))
+        AlertNotification.objects.bulk_create(notifications, batch_size=DELIVERY_BATCH_SIZE)
+        for notification, alerts_in_group in zip(notifications, groups.values()):
+            InventoryAlert.objects.filter(pk__in=[alert_id for alert_id, _ in alerts_in_group]).update(
+                notification=notification
+            )
+    return len(notifications)
+
+
+def claim_due_notifications(limit=DELIVERY_BATCH_SIZE):
+    """领取到期的待发送摘要：加锁读取 (跳过其他进程已锁定的行) 并把下次发送时间推后一个租约"""
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            AlertNotification.objects.filter(status=Status.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .select_for_update(skip_locked=True)[:limit]
+        )
+        if notifications:
+            AlertNotification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+            )
+    return notifications
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _record_failure(notification, error):
+    attempts = notification.attempts + 1
+    now = timezone.now()
+    failed = attempts >= MAX_ATTEMPTS
+    AlertNotification.objects.filter(pk=notification.pk).update(
+        attempts=attempts,
+        status=Status.FAILED if failed else Status.PENDING,
+        next_attempt_at=now if failed else now + timedelta(seconds=backoff_delay(attempts)),
+        last_error=str(error)[:2000],
+    )
+    return failed
+
+
+def _deliver_chunk(notifications, backend):
+    """工作线程：复用一个邮件连接发送一组摘要，返回 (成功数, 重试数, 放弃数)"""
+    sent = retried = failed = 0
+    try:
+        mail = get_connection(backend, fail_silently=False)
+        try:
+            mail.open()
+        except Exception as e:
+            # 连接邮件服务器失败，整组按发送失败处理
+            for notification in notifications:
+                if _record_failure(notification, e):
+                    failed += 1
+                else:
+                    retried += 1
+            return sent, retried, failed
+        try:
+            for notification in notifications:
+                try:
+                    EmailMessage(
+                        notification.subject, notification.body, settings.DEFAULT_FROM_EMAIL,
+                        [notification.recipient], connection=mail,
+                    ).send()
+                except Exception as e:
+                    logger.warning(f'Alert notification {notification.pk} failed: {e}')
+                    if _record_failure(notification, e):
+                        failed += 1
+                    else:
+                        retried += 1
+                    continue
+                AlertNotification.objects.filter(pk=notification.pk).update(
+                    status=Status.SENT, attempts=F('attempts') + 1, sent_at=timezone.now(), last_error='',
+                )
+                sent += 1
+        finally:
+            mail.close()
+    finally:
+        # 工作线程结束时关闭本线程的数据库连接
+        connection.close()
+    return sent, retried, failed
+
+
+def deliver_notifications(workers=DEFAULT_WORKERS, limit=DELIVERY_BATCH_SIZE, backend=None):
+    """
+    领取并发送到期的摘要，返回 {'claimed', 'sent', 'retried', 'failed', 'seconds', 'per_second'}。
+    领取的摘要按轮转分给 workers 个线程，每个线程使用独立的邮件连接和数据库连接。
+    """
+    started = time.perf_counter()
+    backend = backend or settings.ALERT_NOTIFICATION_EMAIL_BACKEND
+    notifications = claim_due_notifications(limit)
+    chunks = [notifications[i::workers] for i in range(workers) if notifications[i::workers]]
+    sent = retried = failed = 0
+    if chunks:
+        with ThreadPoolExecutor(max_workers=len(chunks), thread_name_prefix='alert-notify') as pool:
+            for chunk_sent, chunk_retried, chunk_failed in pool.map(lambda c: _deliver_chunk(c, backend), chunks):
+                sent += chunk_sent
+                retried += chunk_retried
+                failed += chunk_failed
+    seconds = time.perf_counter() - started
+    return {
+        'claimed': len(notifications),
+        'sent': sent,
+        'retried': retried,
+        'failed': failed,
+        'seconds': seconds,
+        'per_second': sent / seconds if seconds > 0 else 0.0,
+    }
+
+
+def notification_metrics(window_minutes=60):
+    """
+    投递指标：各状态的摘要数、待发送积压及最早一条的等待秒数，
+    以及最近 window_minutes 分钟内的发送量、每分钟吞吐和平均投递延迟 (生成到发送的秒数)。
+    """
+    now = timezone.now()
+    since = now - timedelta(minutes=window_minutes)
+    by_status = dict(AlertNotification.objects.values('status').annotate(total=Count('pk')).values_list(
+        'status', 'total'
+    ).order_by())
+    oldest_pending = AlertNotification.objects.filter(status=Status.PENDING).aggregate(
+        oldest=Min('created_at')
+    )['oldest']
+    # 时间窗口内的发送量有限，延迟直接在 Python 中计算
+    recent = list(AlertNotification.objects.filter(status=Status.SENT, sent_at__gte=since).values_list(
+        'created_at', 'sent_at'
+    ))
+    lags = [(sent_at - created_at).total_seconds() for created_at, sent_at in recent]
+    return {
+        'by_status': {label: by_status.get(value, 0) for value, label in Status.choices},
+        'pending': by_status.get(Status.PENDING, 0),
+        'oldest_pending_seconds': round((now - oldest_pending).total_seconds(), 1) if oldest_pending else 0,
+        'window_minutes': window_minutes,
+        'sent_in_window': len(recent),
+        'sent_per_minute': round(len(recent) / window_minutes, 2),
+        'avg_delivery_lag_seconds': round(sum(lags) / len(lags), 1) if lags else None,
+        'max_delivery_lag_seconds': round(max(lags), 1) if lags else None,
+    }
@@ -0,0 +1,146 @@
+import json
+import uuid
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from .allocation import _candidate_batches
+from .models import (
+    Hospital, MedicalSupply, InventoryBatch, SupplyRequest, RequestItem, InventoryAlert,
+    StockBalance, InventoryMovement
+)
+
+# 热点查询登记表：每个查询函数接收样例参数 (医院、物资、当天日期)，返回与线上相同写法的查询集。
+# check_query_plans 命令对这些查询执行 EXPLAIN FORMAT=JSON，出现全表扫描即视为索引失效
+HOT_QUERIES = {}
+
+# MySQL 执行计划中的访问方式：ALL 为全表扫描，index 为全索引扫描
+FULL_TABLE_SCAN = 'ALL'
+FULL_INDEX_SCAN = 'index'
+
+OPEN_REQUEST_STATUSES = [SupplyRequest.RequestStatus.SUBMITTED, SupplyRequest.RequestStatus.APPROVED]
+
+
+def hot_query(label):
+    """登记一个热点查询，以函数名作为查询名称"""
+    def register(func):
+        HOT_QUERIES[func.__name__] = (label, func)
+        return func
+    return register
+
+
+@hot_query('FEFO 候选批次')
+def fefo_candidates(hospital_id, supply_id, today):
+    return _candidate_batches(hospital_id, supply_id, today)
+
+
+@hot_query('库存余额汇总批次')
+def balance_batches(hospital_id, supply_id, today):
+    return InventoryBatch.objects.filter(
+        hospital_id=hospital_id, supply_id__in=[supply_id], is_deleted=False
+    ).values_list('supply_id', 'quantity', 'expiration_date')
+
+
+@hot_query('医院库存汇总')
+def hospital_inventory(hospital_id, supply_id, today):
+    return InventoryBatch.objects.filter(hospital_id=hospital_id, is_deleted=False, quantity__gt=0)
+
+
+@hot_query('即将过期批次')
+def expiring_batches(hospital_id, supply_id, today):
+    return InventoryBatch.objects.filter(
+        expiration_date__lte=today + timedelta(days=30), expiration_date__gt=today, is_deleted=False
+    )
+
+
+@hot_query('待隔离过期批次')
+def expired_unquarantined(hospital_id, supply_id, today):
+    return InventoryBatch.objects.filter(
+        is_quarantined=False, is_deleted=False, expiration_date__lt=today, quantity__gt=0
+    )
+
+
+@hot_query('物资未完成请求项')
+def open_request_items(hospital_id, supply_id, today):
+    return RequestItem.objects.filter(
+        supply_id=supply_id, is_deleted=False, request__is_deleted=False,
+        request__status__in=OPEN_REQUEST_STATUSES, quantity__gt=F('allocated'),
+    ).order_by()
+
+
+@hot_query('未完成请求')
+def open_requests(hospital_id, supply_id, today):
+    return SupplyRequest.objects.filter(status__in=OPEN_REQUEST_STATUSES, is_deleted=False).order_by()
+
+
+@hot_query('医院未解决预警')
+def hospital_open_alerts(hospital_id, supply_id, today):
+    return InventoryAlert.objects.filter(hospital_id=hospital_id, is_resolved=False, is_deleted=False)
+
+
+@hot_query('查找未解决的库存不足预警')
+def open_low_stock_alert(hospital_id, supply_id, today):
+    return InventoryAlert.objects.filter(
+        hospital_id=hospital_id, supply_id=supply_id, alert_type=InventoryAlert.AlertType.LOW_STOCK,
+        is_resolved=False,
+    )
+
+
+@hot_query('按类型读取未解决预警键')
+def open_alerts_by_type(hospital_id, supply_id, today):
+    return InventoryAlert.objects.filter(
+        alert_type=InventoryAlert.AlertType.EXPIRING, is_resolved=False, is_deleted=False
+    ).values_list('open_key', 'alert_id')
+
+
+@hot_query('可调出库存余额')
+def surplus_balances(hospital_id, supply_id, today):
+    return StockBalance.objects.filter(supply_id=supply_id, available_quantity__gte=1)
+
+
+@hot_query('医院区间流水')
+def hospital_movements(hospital_id, supply_id, today):
+    return InventoryMovement.objects.filter(
+        hospital_id=hospital_id, occurred_at__gte=today - timedelta(days=30), occurred_at__lt=today
+    )
+
+
+def sample_parameters():
+    """取一家医院和一种物资作为样例参数 (空库时用占位值，执行计划同样有效)"""
+    hospital_id = Hospital.objects.values_list('pk', flat=True).first() or uuid.UUID(int=0)
+    supply_id = MedicalSupply.objects.values_list('pk', flat=True).first() or ''
+    return hospital_id, supply_id, timezone.now().date()
+
+
+def _table_accesses(node):
+    """遍历 JSON 执行计划，返回每张表的 (表名, 访问方式, 使用的索引, 预估扫描行数)"""
+    if isinstance(node, list):
+        for child in node:
+            yield from _table_accesses(child)
+    elif isinstance(node, dict):
+        if 'access_type' in node:
+            yield (
+                node.get('table_name', ''), node['access_type'], node.get('key'),
+                node.get('rows_examined_per_scan', node.get('rows')),
+            )
+        for child in node.values():
+            yield from _table_accesses(child)
+
+
+def explain_hot_queries(names=None, min_rows=0):
+    """
+    对登记的热点查询执行 EXPLAIN，返回 [(名称, 说明, 各表访问方式, 全表扫描的表)]。
+    预估扫描行数低于 min_rows 的全表扫描 (如很小的表) 不计入。
+    """
+    parameters = sample_parameters()
+    results = []
+    for name, (label, build) in HOT_QUERIES.items():
+        if names and name not in names:
+            continue
+        plan = json.loads(build(*parameters).explain(format='json'))
+        accesses = list(_table_accesses(plan))
+        full_scans = [
+            access for access in accesses
+            if access[1] == FULL_TABLE_SCAN and (access[3] is None or access[3] >= min_rows)
+        ]
+        results.append((name, label, accesses, full_scans))
+    return results
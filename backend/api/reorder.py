@@ -0,0 +1,116 @@
+import math
+from datetime import timedelta
+import numpy as np
+from scipy.stats import norm
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .functions import bulk_upsert
+from .models import ItemFulfillment, ReorderThreshold
+
+# 再订货点与安全库存：
+#   日消耗量 d 取统计窗口内每天从该医院批次出库的数量 (无出库的日期记为 0)
+#   安全库存 SS = z · σ(d) · √L，再订货点 ROP = 均值(d) · L + SS
+# 其中 L 为补货提前期 (天)，z 为服务水平对应的标准正态分位数。
+# 一次分组查询取出全网 (医院, 物资, 日期) 的出库量，用 np.bincount 按 (医院, 物资) 同时求和与平方和，
+# 不按行循环计算
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_SERVICE_LEVEL = 0.95
+
+THRESHOLD_UPDATE_FIELDS = [
+    'avg_daily_demand', 'demand_std', 'lead_time_days', 'service_level', 'window_days',
+    'safety_stock', 'reorder_point', 'computed_at',
+]
+
+
+def reorder_level():
+    """库存余额查询中使用的补货阈值：有再订货点时用再订货点，否则用物资的最低库存量"""
+    return Coalesce(
+        Subquery(
+            ReorderThreshold.objects.filter(
+                hospital_id=OuterRef('hospital_id'), supply_id=OuterRef('supply_id')
+            ).values('reorder_point')[:1]
+        ),
+        F('supply__min_stock_level'),
+    )
+
+
+def daily_issues(start, end, hospital_ids=None):
+    """[start, end) 内每个 (医院, 物资, 日期) 的出库量，返回 [(hospital_id, supply_id, 日期, 数量)]"""
+    fulfillments = ItemFulfillment.objects.filter(
+        is_deleted=False, fulfilled_time__gte=start, fulfilled_time__lt=end
+    )
+    if hospital_ids is not None:
+        fulfillments = fulfillments.filter(inventory_batch__hospital_id__in=hospital_ids)
+    return list(
+        fulfillments.annotate(day=TruncDate('fulfilled_time'))
+        .values('inventory_batch__hospital_id', 'inventory_batch__supply_id', 'day')
+        .annotate(total=Sum('quantity'))
+        .values_list('inventory_batch__hospital_id', 'inventory_batch__supply_id', 'day', 'total')
+        .order_by()
+    )
+
+
+def demand_statistics(pair_index, quantities, window_days):
+    """
+    pair_index 为每条日出库记录所属 (医院, 物资) 的序号，quantities 为对应的日出库量。
+    返回每个 (医院, 物资) 的日均消耗量和日消耗量标准差 (样本标准差，窗口内无出库的日期按 0 计)。
+    """
+    total = np.bincount(pair_index, weights=quantities)
+    total_sq = np.bincount(pair_index, weights=quantities * quantities)
+    mean = total / window_days
+    if window_days > 1:
+        variance = np.maximum(total_sq - window_days * mean * mean, 0) / (window_days - 1)
+    else:
+        variance = np.zeros_like(mean)
+    return mean, np.sqrt(variance)
+
+
+def reorder_points(mean, std, lead_time_days, service_level):
+    """返回 (安全库存, 再订货点)，均向上取整"""
+    z = norm.ppf(service_level)
+    safety_stock = np.ceil(z * std * math.sqrt(lead_time_days))
+    reorder_point = np.ceil(mean * lead_time_days + safety_stock)
+    return safety_stock.astype(int), reorder_point.astype(int)
+
+
+def compute_reorder_thresholds(hospital_ids=None, window_days=DEFAULT_WINDOW_DAYS,
+                               lead_time_days=DEFAULT_LEAD_TIME_DAYS, service_level=DEFAULT_SERVICE_LEVEL):
+    """
+    根据最近 window_days 天 (不含今天) 的出库记录重新计算再订货点，覆盖写入 ReorderThreshold。
+    窗口内没有出库的 (医院, 物资) 删除原有记录，回退到物资的最低库存量。返回写入的行数。
+    """
+    if not 0 < service_level < 1:
+        raise ValueError('service_level 必须在 0 和 1 之间')
+    now = timezone.now()
+    end = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = daily_issues(end - timedelta(days=window_days), end, hospital_ids)
+
+    pairs = {}
+    pair_index = np.fromiter(
+        (pairs.setdefault((hospital_id, supply_id), len(pairs)) for hospital_id, supply_id, _, _ in rows),
+        dtype=np.int64, count=len(rows),
+    )
+    quantities = np.fromiter((int(total) for *_, total in rows), dtype=float, count=len(rows))
+    mean, std = demand_statistics(pair_index, quantities, window_days)
+    safety_stock, reorder_point = reorder_points(mean, std, lead_time_days, service_level)
+
+    thresholds = [
+        ReorderThreshold(
+            hospital_id=hospital_id, supply_id=supply_id,
+            avg_daily_demand=round(float(mean[i]), 4), demand_std=round(float(std[i]), 4),
+            lead_time_days=lead_time_days, service_level=service_level, window_days=window_days,
+            safety_stock=int(safety_stock[i]), reorder_point=int(reorder_point[i]), computed_at=now,
+        )
+        for (hospital_id, supply_id), i in pairs.items()
+    ]
+    with transaction.atomic():
+        bulk_upsert(ReorderThreshold, thresholds, ['hospital', 'supply'], THRESHOLD_UPDATE_FIELDS, batch_size=2000)
+        stale = ReorderThreshold.objects.filter(computed_at__lt=now)
+        if hospital_ids is not None:
+            stale = stale.filter(hospital_id__in=hospital_ids)
+        stale.delete()
+    return len(thresholds)
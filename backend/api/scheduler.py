@@ -0,0 +1,158 @@
+import io
+import logging
+import random
+import threading
+import time
+from django.core.management import call_command
+from django.db import connection
+
+# 常驻调度：在同一进程中按固定间隔执行管理命令，避免每次 cron 触发都重新加载 Django、GDAL/GEOS 和数值计算库。
+# 每个任务一个线程 (线程内的数据库连接在多次运行间复用)，同一任务在进程内天然不会重叠；
+# 多个调度进程之间用 MySQL 命名锁 GET_LOCK 保证同一任务同时只有一个实例在运行
+
+logger = logging.getLogger(__name__)
+
+# 任务名称: (管理命令, 命令参数, 默认间隔秒数)
+SCHEDULED_JOBS = {
+    'check_inventory_alerts': ('check_inventory_alerts', [], 60),
+    'recalculate_priorities': ('recalculate_priorities', [], 300),
+    'refresh_stale_balances': ('reconcile_stock_balances', ['--stale-only'], 3600),
+    'sweep_expired_stock': ('sweep_expired_stock', [], 3600),
+    'send_alert_notifications': ('send_alert_notifications', [], 60),
+    'compact_alerts': ('compact_alerts', [], 86400),
+}
+
+DEFAULT_JITTER = 0.1
+LOCK_PREFIX = 'run_scheduler:'
+
+
+class JobMetrics:
+    """单个任务的运行统计"""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self.last_failed = False
+        self.last_error = ''
+
+    def record(self, seconds, error=None):
+        self.runs += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+        self.last_failed = error is not None
+        if error is not None:
+            self.failures += 1
+            self.last_error = str(error)
+
+    def as_dict(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'avg_seconds': round(self.total_seconds / self.runs, 3) if self.runs else None,
+            'max_seconds': round(self.max_seconds, 3),
+            'last_seconds': round(self.last_seconds, 3) if self.last_seconds is not None else None,
+            'last_error': self.last_error,
+        }
+
+
+def _acquire_lock(name):
+    """获取跨进程的任务锁 (不等待)；非 MySQL 数据库不加锁"""
+    if connection.vendor != 'mysql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT GET_LOCK(%s, 0)', [LOCK_PREFIX + name])
+        return cursor.fetchone()[0] == 1
+
+
+def _release_lock(name):
+    if connection.vendor != 'mysql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT RELEASE_LOCK(%s)', [LOCK_PREFIX + name])
+
+
+def _ensure_connection():
+    """保留长连接，只在连接已断开 (如数据库重启、超过 wait_timeout) 时关闭，下次查询自动重连"""
+    if connection.connection is not None and not connection.is_usable():
+        connection.close()
+
+
+def run_job(name, metrics, verbosity=1):
+    """执行一次任务，返回命令输出；其他进程正在运行同一任务时跳过并返回 None"""
+    command, args, _ = SCHEDULED_JOBS[name]
+    started = time.perf_counter()
+    output = io.StringIO()
+    try:
+        _ensure_connection()
+        locked = _acquire_lock(name)
+    except Exception as e:
+        # 数据库暂时不可用：记为失败，关闭连接后等下一次运行重连，任务线程不退出
+        logger.exception('Scheduled job %s could not acquire its lock', name)
+        connection.close()
+        metrics.record(time.perf_counter() - started, e)
+        return ''
+    if not locked:
+        metrics.skipped += 1
+        return None
+    error = None
+    try:
+        call_command(command, *args, stdout=output, stderr=output, verbosity=verbosity)
+    except Exception as e:
+        error = e
+        logger.exception('Scheduled job %s failed', name)
+    finally:
+        metrics.record(time.perf_counter() - started, error)
+        try:
+            _release_lock(name)
+        except Exception:
+            # 连接已断开时锁随连接一起释放
+            connection.close()
+    return output.getvalue()
+
+
+def next_delay(interval, jitter):
+    """下次运行前的等待时间：间隔按 ±jitter 比例随机抖动，避免多个任务/进程同时触发"""
+    return interval * (1 + random.uniform(-jitter, jitter))
+
+
+def job_loop(name, interval, jitter, metrics, stop, report, verbosity=1, once=False):
+    """
+    任务线程主循环：按固定节奏 (从上次开始时间起算) 运行，运行时间超过间隔时结束后立即开始下一次。
+    stop 为 threading.Event，置位后在当前运行结束时退出；report(name, metrics, output) 在每次运行后回调。
+    """
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            output = run_job(name, metrics, verbosity)
+            report(name, metrics, output)
+            if once:
+                break
+            stop.wait(max(next_delay(interval, jitter) - (time.monotonic() - started), 0))
+    finally:
+        connection.close()
+
+
+def start_scheduler(intervals, jitter=DEFAULT_JITTER, report=None, verbosity=1, once=False):
+    """
+    为 intervals ({任务名称: 间隔秒数}) 中的每个任务启动一个线程。
+    返回 (stop 事件, 线程列表, {任务名称: JobMetrics})。
+    """
+    report = report or (lambda name, metrics, output: None)
+    stop = threading.Event()
+    metrics = {name: JobMetrics() for name in intervals}
+    threads = [
+        threading.Thread(
+            target=job_loop, name=f'scheduler-{name}',
+            args=(name, interval, jitter, metrics[name], stop, report, verbosity, once), daemon=True,
+        )
+        for name, interval in intervals.items()
+    ]
+    for thread in threads:
+        thread.start()
+    return stop, threads, metrics
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Hospital, Supplier, MedicalSupply, InventoryBatch, SupplyRequest, RequestItem, InventoryAlert, User
+from .models import (
+    Hospital, Supplier, MedicalSupply, InventoryBatch, SupplyRequest, RequestItem, InventoryAlert, User,
+    InventoryMovement, ArchivedRecord, ReorderThreshold, AlertNotification
+)
 
 # 用户序列化器 (已存在，确保包含 username)
 class UserSerializer(serializers.ModelSerializer):
@@ -144,6 +147,90 @@ class InventoryAlertSerializer(serializers.ModelSerializer):
             'message', 'created_at', 'is_resolved', # ... 其他需要的字段 ...
         ]
 
+# 批量入库序列化器：外键以主键形式提交，由视图统一批量解析，避免逐行查询
+class InventoryBatchBulkCreateSerializer(serializers.ModelSerializer):
+    # 覆盖默认字段以去掉逐行的唯一性/外键查询，唯一性由视图批量检查
+    batch_number = serializers.CharField(max_length=50)
+    hospital = serializers.UUIDField()
+    supply = serializers.CharField(max_length=20)
+    supplier = serializers.UUIDField(required=False, allow_null=True)
+
+    class Meta:
+        model = InventoryBatch
+        fields = [
+            'batch_number', 'hospital', 'supply', 'supplier', 'quantity',
+            'production_date', 'expiration_date', 'storage_condition',
+            'received_date', 'unit_price', 'quality_check_passed', 'notes',
+        ]
+
+    def validate(self, attrs):
+        if attrs['expiration_date'] < attrs['production_date']:
+            raise serializers.ValidationError({'expiration_date': '失效日期不能早于生产日期'})
+        return attrs
+
+# 批量库存数量调整序列化器
+class InventoryBatchQuantitySerializer(serializers.Serializer):
+    batch_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0)
+
+# 批量分配序列化器
+class RequestItemAllocateSerializer(serializers.Serializer):
+    item_id = serializers.UUIDField()
+    allocated_quantity = serializers.IntegerField(min_value=0)
+
+# 出入库流水序列化器
+class InventoryMovementSerializer(serializers.ModelSerializer):
+    hospital_name = serializers.CharField(source='hospital.name', read_only=True)
+    supply_name = serializers.CharField(source='supply.name', read_only=True)
+    movement_type_display = serializers.CharField(source='get_movement_type_display', read_only=True)
+    operator_name = serializers.CharField(source='operator.username', read_only=True, default=None)
+
+    class Meta:
+        model = InventoryMovement
+        fields = [
+            'movement_id', 'hospital', 'hospital_name', 'supply', 'supply_name', 'batch', 'batch_number',
+            'movement_type', 'movement_type_display', 'quantity', 'occurred_at', 'reference', 'operator_name',
+        ]
+
+# 归档记录序列化器
+class ArchivedRecordSerializer(serializers.ModelSerializer):
+    reason_display = serializers.CharField(source='get_reason_display', read_only=True)
+
+    class Meta:
+        model = ArchivedRecord
+        fields = [
+            'record_id', 'model', 'object_id', 'root_model', 'root_id', 'hospital_id', 'reason', 'reason_display',
+            'closed_at', 'archived_at', 'data',
+        ]
+
+# 再订货点序列化器
+class ReorderThresholdSerializer(serializers.ModelSerializer):
+    hospital_name = serializers.CharField(source='hospital.name', read_only=True)
+    supply_name = serializers.CharField(source='supply.name', read_only=True)
+    min_stock_level = serializers.IntegerField(source='supply.min_stock_level', read_only=True)
+
+    class Meta:
+        model = ReorderThreshold
+        fields = [
+            'id', 'hospital', 'hospital_name', 'supply', 'supply_name', 'avg_daily_demand', 'demand_std',
+            'lead_time_days', 'service_level', 'window_days', 'safety_stock', 'reorder_point', 'min_stock_level',
+            'computed_at',
+        ]
+
+# 预警通知摘要序列化器 (只读)
+class AlertNotificationSerializer(serializers.ModelSerializer):
+    hospital_name = serializers.CharField(source='hospital.name', read_only=True)
+    alert_type_display = serializers.CharField(source='get_alert_type_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = AlertNotification
+        fields = [
+            'notification_id', 'hospital', 'hospital_name', 'alert_type', 'alert_type_display', 'recipient',
+            'subject', 'body', 'alert_count', 'status', 'status_display', 'attempts', 'next_attempt_at',
+            'last_error', 'created_at', 'sent_at',
+        ]
+
 class HospitalSerializer(serializers.ModelSerializer):
     # 添加等级和地区的可读名称 (如果前端需要直接显示)
     level_display = serializers.CharField(source='get_level_display', read_only=True)
@@ -151,6 +238,8 @@ class HospitalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Hospital
         fields = '__all__' # 包含 level_display
+        # 当前库存由库存批次累加维护，不接受客户端写入
+        read_only_fields = ['current_capacity']
 
 
 class DashboardSummarySerializer(serializers.Serializer):
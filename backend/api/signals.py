@@ -0,0 +1,76 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .alerts import queue_alert_evaluation
+from .ledger import batch_movements, record_movements
+from .models import Hospital, MedicalSupply, InventoryBatch, ItemFulfillment
+from .stock import recompute_capacity, refresh_stock_balances, stock_maintenance_is_suspended
+
+
+# 物资单位体积变化后，重新计算持有该物资的医院的仓储占用
+@receiver(pre_save, sender=MedicalSupply)
+def remember_unit_volume(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_unit_volume = (
+        MedicalSupply.all_objects.filter(pk=instance.pk).values_list('unit_volume', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=MedicalSupply)
+def recompute_capacity_on_unit_volume(sender, instance, created=False, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_unit_volume', None)
+    if raw or created or previous is None or previous == instance.unit_volume:
+        return
+    hospital_ids = InventoryBatch.objects.filter(
+        supply=instance, is_deleted=False
+    ).values_list('hospital_id', flat=True).distinct()
+    recompute_capacity(list(hospital_ids))
+
+
+def _deleted_with_hospital(origin):
+    """删除医院时级联删除的批次/分配记录无需维护余额，余额行会随医院一起删除"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Hospital
+    return isinstance(origin, Hospital)
+
+
+def _batch_keys(batch):
+    keys = {(batch.hospital_id, batch.supply_id)}
+    loaded = getattr(batch, '_loaded_values', {})
+    if 'hospital_id' in loaded and 'supply_id' in loaded:
+        keys.add((loaded['hospital_id'], loaded['supply_id']))
+    return keys
+
+
+# 库存批次写入/删除后，在同一事务中记录出入库流水并刷新所属医院/物资的库存余额，提交后增量评估预警
+@receiver(post_save, sender=InventoryBatch)
+def refresh_balance_on_batch_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw or stock_maintenance_is_suspended():
+        return
+    record_movements(batch_movements(instance, created=created))
+    refresh_stock_balances(_batch_keys(instance))
+    queue_alert_evaluation(_batch_keys(instance))
+    instance._loaded_values = {
+        'hospital_id': instance.hospital_id, 'supply_id': instance.supply_id,
+        'quantity': instance.quantity, 'is_deleted': instance.is_deleted,
+    }
+
+
+@receiver(post_delete, sender=InventoryBatch)
+def refresh_balance_on_batch_delete(sender, instance, origin=None, **kwargs):
+    if stock_maintenance_is_suspended() or _deleted_with_hospital(origin):
+        return
+    record_movements(batch_movements(instance, deleted=True))
+    refresh_stock_balances(_batch_keys(instance))
+    queue_alert_evaluation(_batch_keys(instance))
+
+
+@receiver([post_save, post_delete], sender=ItemFulfillment)
+def refresh_balance_on_fulfillment(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or stock_maintenance_is_suspended() or _deleted_with_hospital(origin):
+        return
+    batch = InventoryBatch.objects.filter(pk=instance.inventory_batch_id).values('hospital_id', 'supply_id').first()
+    if batch:
+        refresh_stock_balances({(batch['hospital_id'], batch['supply_id'])})
+        queue_alert_evaluation({(batch['hospital_id'], batch['supply_id'])})
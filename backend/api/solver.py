@@ -0,0 +1,194 @@
+import time
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+from scipy.spatial import cKDTree
+from django.db.models import F
+from .models import Hospital, RequestItem, StockBalance, SupplyRequest
+from .stock import refresh_stale_stock_balances
+
+# 短缺时的全网分配方案：把一种物资各医院的可调出库存分配给所有未分配完的请求项。
+# 建模为带优先级的最小费用运输问题：
+#   min Σ 距离(i, j)·x[i, j] + Σ 罚金(j)·u[j]
+#   s.t. Σ_i x[i, j] + u[j] = 需求量(j)      (每个请求项的需求，u 为未满足量)
+#        Σ_j x[i, j] ≤ 可调出量(i)          (每家医院的可调出库存)
+# 罚金随请求项优先级增大且大于任何运输距离，库存不足时优先满足高优先级请求项，其次才比较距离。
+# 每个请求项只考虑距离最近的 k 家有库存的医院 (KD 树查询)，约束矩阵保持稀疏，数千家医院也能在数秒内求解。
+# 运输问题的约束矩阵全单模，HiGHS 内点法求解后经 crossover 得到的最优顶点解即为整数解。
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_NEIGHBOURS = 20
+# 调拨候选医院默认返回数量
+DEFAULT_TRANSFER_CANDIDATES = 5
+# 紧急请求在优先级之上额外增加的权重
+EMERGENCY_WEIGHT = 1.0
+
+
+def _unit_vectors(lon, lat):
+    """经纬度转换为单位球面上的三维坐标，弦长与球面距离单调对应，可直接用 KD 树做近邻查询"""
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def solve_transport(source_xyz, capacity, demand_xyz, need, weight, neighbours=DEFAULT_NEIGHBOURS):
+    """
+    求解运输问题，全部为 NumPy 数组运算。
+    返回 (source_index, demand_index, quantity, distance_km, unmet)：前四个为等长数组，描述每一条调拨，
+    unmet 为每个请求项的未满足量。
+    """
+    # 只有可调出量大于 0 的医院参与近邻查询
+    sources = np.flatnonzero(capacity > 0)
+    n_demand, n_source = len(need), len(sources)
+    if not n_demand or not n_source:
+        empty = np.empty(0, dtype=int)
+        return empty, empty, empty, np.empty(0), np.rint(need).astype(int)
+
+    k = min(neighbours, n_source)
+    chord, nearest = cKDTree(source_xyz[sources]).query(demand_xyz, k=k)
+    chord, nearest = chord.reshape(n_demand, k), sources[nearest.reshape(n_demand, k)]
+    distance = _chord_to_km(chord)
+
+    # 罚金大于任何一条候选路线的距离，保证有库存可调时不会因距离而放弃满足需求
+    base = 2 * distance.max() + 1
+    penalty = base * (1 + weight)
+
+    n_routes = n_demand * k
+    cost = np.concatenate((distance.ravel(), penalty))
+    route_demand = np.repeat(np.arange(n_demand), k)
+    route_source = nearest.ravel()
+
+    # 需求等式约束：每行是一个请求项的 k 条路线加上它的未满足量变量
+    a_eq = sparse.csr_matrix(
+        (np.ones(n_routes + n_demand),
+         (np.concatenate((route_demand, np.arange(n_demand))), np.arange(n_routes + n_demand))),
+        shape=(n_demand, n_routes + n_demand),
+    )
+    # 供给不等式约束：每行是一家医院出现在所有请求项候选中的路线
+    a_ub = sparse.csr_matrix(
+        (np.ones(n_routes), (route_source, np.arange(n_routes))),
+        shape=(len(capacity), n_routes + n_demand),
+    )
+    result = linprog(
+        cost, A_ub=a_ub, b_ub=capacity, A_eq=a_eq, b_eq=need, bounds=(0, None), method='highs-ipm',
+    )
+    if result.status != 0:
+        raise RuntimeError(f'分配方案求解失败: {result.message}')
+
+    flows = np.rint(result.x[:n_routes]).astype(int)
+    unmet = np.rint(result.x[n_routes:]).astype(int)
+    used = flows > 0
+    return route_source[used], route_demand[used], flows[used], distance.ravel()[used], unmet
+
+
+def build_allocation_plan(supply_code, neighbours=DEFAULT_NEIGHBOURS, reserve_min_stock=True):
+    """
+    为一种物资生成全网分配方案 (只计算，不写入)。
+    需求为已提交/已批准且未分配完的请求项，权重为请求项优先级 (紧急请求额外加权)；
+    供给为各活跃医院的未过期库存，reserve_min_stock=True 时每家医院保留最低库存量不参与调出。
+    """
+    started = time.perf_counter()
+    refresh_stale_stock_balances(supply_id=supply_code)
+
+    items = list(RequestItem.objects.filter(
+        supply_id=supply_code, is_deleted=False, request__is_deleted=False,
+        request__status__in=[SupplyRequest.RequestStatus.SUBMITTED, SupplyRequest.RequestStatus.APPROVED],
+        quantity__gt=F('allocated'),
+    ).values_list('item_id', 'request_id', 'request__hospital_id', 'quantity', 'allocated', 'priority',
+                  'request__emergency'))
+    balances = list(StockBalance.objects.filter(
+        supply_id=supply_code, available_quantity__gt=0, hospital__is_deleted=False, hospital__is_active=True,
+    ).values_list('hospital_id', 'available_quantity', 'supply__min_stock_level'))
+
+    hospital_ids = {row[2] for row in items} | {row[0] for row in balances}
+    locations = {
+        hospital_id: (point.x, point.y)
+        for hospital_id, point in Hospital.objects.filter(pk__in=hospital_ids).values_list('hospital_id', 'geo_location')
+    }
+    items = [row for row in items if row[2] in locations]
+    balances = [row for row in balances if row[0] in locations]
+
+    need = np.array([quantity - allocated for _, _, _, quantity, allocated, _, _ in items], dtype=float)
+    weight = np.array(
+        [(priority or 0) + (EMERGENCY_WEIGHT if emergency else 0) for *_, priority, emergency in items], dtype=float
+    )
+    reserve = np.array([min_stock if reserve_min_stock else 0 for _, _, min_stock in balances], dtype=float)
+    capacity = np.maximum(np.array([available for _, available, _ in balances], dtype=float) - reserve, 0)
+    demand_xyz = _unit_vectors(*np.array([locations[row[2]] for row in items], dtype=float).reshape(-1, 2).T)
+    source_xyz = _unit_vectors(*np.array([locations[row[0]] for row in balances], dtype=float).reshape(-1, 2).T)
+
+    source_index, demand_index, quantity, distance, unmet = solve_transport(
+        source_xyz, capacity, demand_xyz, need, weight, neighbours
+    )
+
+    transfers = [
+        {
+            'item_id': items[j][0],
+            'request_id': items[j][1],
+            'hospital_id': items[j][2],
+            'source_hospital_id': balances[i][0],
+            'quantity': int(q),
+            'distance_km': round(float(d), 2),
+        }
+        for i, j, q, d in zip(source_index, demand_index, quantity, distance)
+    ]
+    return {
+        'supply_id': supply_code,
+        'item_count': len(items),
+        'source_count': len(balances),
+        'total_need': int(need.sum()),
+        'total_available': int(capacity.sum()),
+        'total_allocated': int(quantity.sum()),
+        'total_unmet': int(unmet.sum()),
+        'total_distance_km': round(float((quantity * distance).sum()), 2),
+        'transfers': transfers,
+        'unmet': [
+            {'item_id': items[j][0], 'request_id': items[j][1], 'quantity': int(unmet[j])}
+            for j in np.flatnonzero(unmet)
+        ],
+        'solve_seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def find_transfer_candidates(hospital, supply, quantity, k=DEFAULT_TRANSFER_CANDIDATES, max_distance_km=None):
+    """
+    为 hospital 缺少的 quantity 件 supply 查找可调出的医院：未过期库存扣除最低库存量后仍不少于 quantity。
+    返回按距离升序 (距离相同时可调出量多者优先) 的前 k 家医院。
+    最低库存量是物资级别的常量，候选条件即 available_quantity >= 最低库存量 + quantity，
+    可直接走 (supply, available_quantity) 索引的范围扫描；距离在候选集上用 NumPy 一次算出。
+    """
+    refresh_stale_stock_balances(supply_id=supply.pk)
+    threshold = supply.min_stock_level + quantity
+    rows = list(StockBalance.objects.filter(
+        supply=supply, available_quantity__gte=threshold,
+        hospital__is_deleted=False, hospital__is_active=True,
+    ).exclude(hospital=hospital).values_list(
+        'hospital_id', 'hospital__name', 'hospital__region', 'hospital__geo_location', 'available_quantity',
+    ))
+    if not rows or hospital.geo_location is None:
+        return []
+
+    origin = _unit_vectors(np.array([hospital.geo_location.x]), np.array([hospital.geo_location.y]))
+    coords = np.array([(point.x, point.y) for _, _, _, point, _ in rows], dtype=float)
+    distance = _chord_to_km(np.linalg.norm(_unit_vectors(coords[:, 0], coords[:, 1]) - origin, axis=1))
+    surplus = np.array([available for *_, available in rows], dtype=float) - supply.min_stock_level
+
+    within = np.flatnonzero(distance <= max_distance_km) if max_distance_km is not None else np.arange(len(rows))
+    if len(within) > k:
+        # 先用 argpartition 取出最近的 k 家，只对这 k 家排序
+        within = within[np.argpartition(distance[within], k - 1)[:k]]
+    order = within[np.lexsort((-surplus[within], distance[within]))]
+    return [
+        {
+            'hospital_id': rows[i][0],
+            'name': rows[i][1],
+            'region': rows[i][2],
+            'available_quantity': rows[i][4],
+            'surplus': int(surplus[i]),
+            'distance_km': round(float(distance[i]), 2),
+        }
+        for i in order
+    ]
@@ -0,0 +1,257 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+from .functions import bulk_upsert
+from .models import (
+    ExpiryBucket, Hospital, InventoryBatch, MedicalSupply, StockBalance, STOCK_EXPIRY_EPOCH, expiry_week
+)
+
+# 库存余额维护：所有余额均由未删除的库存批次重新汇总得到，
+# 单条写入由信号处理函数触发，批量写入 (bulk_create/update) 由调用方显式调用 refresh_stock_balances；
+# 失效日历 (ExpiryBucket) 与余额在同一次批次汇总中一起重建
+
+BALANCE_UPDATE_FIELDS = [
+    'batch_count', 'total_quantity', 'available_quantity', 'earliest_expiry',
+    'expiry_weight', 'as_of', 'updated_at',
+]
+
+_state = threading.local()
+
+
+@contextmanager
+def stock_maintenance_suspended():
+    """在代码块内暂停信号触发的余额维护 (批量删除/归档等由调用方在结束后统一对账)"""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def stock_maintenance_is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def _compute_hospital_balances(hospital_id, supply_ids, restrict=True, lock=False, today=None):
+    """
+    汇总一家医院的批次，返回未保存的 (StockBalance 列表, ExpiryBucket 列表)。supply_ids 中的物资即使没有批次也会返回零余额；
+    restrict=False 时汇总该医院的全部物资。lock=True 时以加锁读取批次行，与并发写入同一医院/物资的事务串行。
+    """
+    today = today or timezone.now().date()
+    batches = InventoryBatch.objects.filter(hospital_id=hospital_id, is_deleted=False)
+    if restrict:
+        batches = batches.filter(supply_id__in=supply_ids)
+    if lock:
+        batches = batches.select_for_update()
+
+    balances = {
+        supply_id: StockBalance(hospital_id=hospital_id, supply_id=supply_id, as_of=today)
+        for supply_id in supply_ids
+    }
+    buckets = defaultdict(int)
+    for supply_id, quantity, expiration_date, quarantined in batches.values_list(
+        'supply_id', 'quantity', 'expiration_date', 'is_quarantined'
+    ):
+        if quantity > 0:
+            buckets[(supply_id, expiry_week(expiration_date))] += quantity
+        balance = balances.get(supply_id)
+        if balance is None:
+            balance = balances[supply_id] = StockBalance(hospital_id=hospital_id, supply_id=supply_id, as_of=today)
+        balance.batch_count += 1
+        balance.total_quantity += quantity
+        if quantity > 0 and expiration_date >= today and not quarantined:
+            balance.available_quantity += quantity
+            balance.expiry_weight += quantity * (expiration_date - STOCK_EXPIRY_EPOCH).days
+            if balance.earliest_expiry is None or expiration_date < balance.earliest_expiry:
+                balance.earliest_expiry = expiration_date
+    return list(balances.values()), [
+        ExpiryBucket(hospital_id=hospital_id, supply_id=supply_id, week_start=week_start, quantity=quantity)
+        for (supply_id, week_start), quantity in buckets.items()
+    ]
+
+
+def _replace_expiry_buckets(hospital_id, supply_ids, buckets):
+    """用重新汇总的结果替换一家医院若干物资的失效日历；supply_ids 为 None 时替换该医院的全部物资"""
+    stale = ExpiryBucket.objects.filter(hospital_id=hospital_id)
+    if supply_ids is not None:
+        stale = stale.filter(supply_id__in=supply_ids)
+    stale.delete()
+    ExpiryBucket.objects.bulk_create(buckets, batch_size=500)
+
+
+def refresh_stock_balances(keys):
+    """
+    按 (hospital_id, supply_id) 重新计算库存余额，在当前事务中完成。
+    每家医院只执行一次批次查询。
+    """
+    supplies_by_hospital = defaultdict(set)
+    for hospital_id, supply_id in keys:
+        if hospital_id and supply_id:
+            supplies_by_hospital[hospital_id].add(supply_id)
+    if not supplies_by_hospital:
+        return 0
+
+    today = timezone.now().date()
+    with transaction.atomic():
+        balances = []
+        for hospital_id, supply_ids in supplies_by_hospital.items():
+            hospital_balances, buckets = _compute_hospital_balances(hospital_id, supply_ids, lock=True, today=today)
+            balances.extend(hospital_balances)
+            _replace_expiry_buckets(hospital_id, supply_ids, buckets)
+        bulk_upsert(StockBalance, balances, ['hospital', 'supply'], BALANCE_UPDATE_FIELDS)
+    return len(balances)
+
+
+def adjust_stock_balance(hospital_id, supply_id, changes, today=None):
+    """
+    按批次数量变动增量更新一行库存余额和对应的失效日历，不重新读取批次，供并发出库等已锁定批次的路径使用。
+    changes 为 [(expiration_date, quantity_delta)]。最早失效日期只会前移；
+    批次被取空后保留原值，待该日期过去后由 refresh_stale_stock_balances 修正。
+    """
+    _adjust_expiry_buckets(hospital_id, supply_id, changes)
+    today = today or timezone.now().date()
+    unexpired = [(expiration_date, delta) for expiration_date, delta in changes if expiration_date >= today]
+    updates = {
+        'total_quantity': F('total_quantity') + sum(delta for _, delta in changes),
+        'available_quantity': F('available_quantity') + sum(delta for _, delta in unexpired),
+        'expiry_weight': F('expiry_weight') + sum(
+            delta * (expiration_date - STOCK_EXPIRY_EPOCH).days for expiration_date, delta in unexpired
+        ),
+        'updated_at': timezone.now(),
+    }
+    earliest = min((expiration_date for expiration_date, delta in unexpired if delta > 0), default=None)
+    if earliest is not None:
+        updates['earliest_expiry'] = Coalesce(Least('earliest_expiry', Value(earliest)), Value(earliest))
+    if not StockBalance.objects.filter(hospital_id=hospital_id, supply_id=supply_id).update(**updates):
+        refresh_stock_balances({(hospital_id, supply_id)})
+
+
+def _adjust_expiry_buckets(hospital_id, supply_id, changes):
+    """按周增减失效日历的数量；增加时先补齐不存在的分桶行，再统一用 F() 增减"""
+    deltas = defaultdict(int)
+    for expiration_date, delta in changes:
+        deltas[expiry_week(expiration_date)] += delta
+    ExpiryBucket.objects.bulk_create([
+        ExpiryBucket(hospital_id=hospital_id, supply_id=supply_id, week_start=week_start)
+        for week_start, delta in deltas.items() if delta > 0
+    ], ignore_conflicts=True)
+    for week_start, delta in deltas.items():
+        if delta:
+            ExpiryBucket.objects.filter(
+                hospital_id=hospital_id, supply_id=supply_id, week_start=week_start
+            ).update(quantity=F('quantity') + delta)
+
+
+def refresh_stale_stock_balances(**filters):
+    """
+    刷新最早失效日期已过的余额：这些余额的未过期库存量随日期推移已经变化。
+    读取未过期库存前调用，filters 用于限定范围 (如 supply_id=...)。
+    """
+    stale = StockBalance.objects.filter(earliest_expiry__lt=timezone.now().date(), **filters)
+    return refresh_stock_balances(list(stale.values_list('hospital_id', 'supply_id')))
+
+
+def quarantine_expired_batches(hospital_ids=None, today=None, dry_run=False):
+    """
+    过期清扫：用一条 UPDATE 把已过期 (失效日期早于今天) 且仍有库存的批次标记为隔离，返回标记的批次数。
+    过期批次本就不计入可用库存，隔离不改变库存余额，因此无需刷新余额。
+    """
+    today = today or timezone.now().date()
+    batches = InventoryBatch.objects.filter(
+        is_quarantined=False, is_deleted=False, expiration_date__lt=today, quantity__gt=0
+    )
+    if hospital_ids is not None:
+        batches = batches.filter(hospital_id__in=hospital_ids)
+    if dry_run:
+        return batches.count()
+    return batches.update(is_quarantined=True, updated_at=timezone.now())
+
+
+def release_unexpired_batches(hospital_ids=None, today=None, dry_run=False):
+    """
+    解除失效日期已更正为未过期的批次的隔离 (批量写入、queryset.update 等不经过 save 的路径)，返回解除的批次数。
+    隔离的未过期批次不计入可用库存，解除后刷新对应的库存余额。
+    """
+    today = today or timezone.now().date()
+    batches = InventoryBatch.objects.filter(is_quarantined=True, is_deleted=False, expiration_date__gte=today)
+    if hospital_ids is not None:
+        batches = batches.filter(hospital_id__in=hospital_ids)
+    if dry_run:
+        return batches.count()
+    with transaction.atomic():
+        keys = set(batches.select_for_update().values_list('hospital_id', 'supply_id'))
+        if not keys:
+            return 0
+        released = batches.update(is_quarantined=False, updated_at=timezone.now())
+        refresh_stock_balances(keys)
+    return released
+
+
+def reconcile_stock_balances(hospital_ids=None, stale_only=False):
+    """
+    全量或按医院对账：逐家医院重新汇总并覆盖余额。
+    stale_only=True 时只处理最早失效日期已过 (未过期库存已发生变化) 的余额。
+    返回写入的余额行数。
+    """
+    today = timezone.now().date()
+    if stale_only:
+        if hospital_ids is None:
+            return refresh_stale_stock_balances()
+        return refresh_stale_stock_balances(hospital_id__in=hospital_ids)
+
+    if hospital_ids is None:
+        hospital_ids = list(Hospital.objects.values_list('hospital_id', flat=True))
+
+    count = 0
+    for hospital_id in hospital_ids:
+        with transaction.atomic():
+            # 已有余额的物资也要参与，批次被清空的物资会被置零
+            existing = set(StockBalance.objects.filter(hospital_id=hospital_id).values_list('supply_id', flat=True))
+            balances, buckets = _compute_hospital_balances(hospital_id, existing, restrict=False, today=today)
+            bulk_upsert(StockBalance, balances, ['hospital', 'supply'], BALANCE_UPDATE_FIELDS)
+            _replace_expiry_buckets(hospital_id, None, buckets)
+            count += len(balances)
+    return count
+
+
+def adjust_hospital_capacity(movements):
+    """
+    按出入库流水的数量变动累加医院仓储占用 (数量 × 物资单位体积)。
+    使用 F() 在数据库中增减，每家医院一条 UPDATE，与并发写入同一医院的事务互不覆盖。
+    """
+    volumes = dict(MedicalSupply.objects.filter(
+        unspsc_code__in={movement.supply_id for movement in movements}
+    ).values_list('unspsc_code', 'unit_volume'))
+    deltas = defaultdict(Decimal)
+    for movement in movements:
+        deltas[movement.hospital_id] += movement.quantity * volumes.get(movement.supply_id, Decimal(0))
+    for hospital_id, delta in deltas.items():
+        if delta:
+            Hospital.objects.filter(pk=hospital_id).update(current_capacity=F('current_capacity') + delta)
+
+
+def recompute_capacity(hospital_ids=None):
+    """
+    根据未删除的库存批次重新计算医院仓储占用，用于修复偏差或修改物资单位体积之后。
+    逐家医院加锁后重算，期间该医院的增量更新会等待提交后再叠加。返回更新的医院数。
+    """
+    if hospital_ids is None:
+        hospital_ids = list(Hospital.objects.values_list('hospital_id', flat=True))
+
+    volume = ExpressionWrapper(
+        F('quantity') * F('supply__unit_volume'), output_field=DecimalField(max_digits=20, decimal_places=4)
+    )
+    for hospital_id in hospital_ids:
+        with transaction.atomic():
+            Hospital.objects.select_for_update().filter(pk=hospital_id).values_list('pk').first()
+            used = InventoryBatch.objects.filter(
+                hospital_id=hospital_id, is_deleted=False
+            ).aggregate(used=Sum(volume))['used'] or 0
+            Hospital.objects.filter(pk=hospital_id).update(current_capacity=used)
+    return len(hospital_ids)
@@ -6,12 +6,14 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.views import obtain_auth_token
 from .views import (
     HospitalViewSet, SupplierViewSet, MedicalSupplyViewSet,
-    InventoryBatchViewSet, SupplyRequestViewSet, InventoryAlertViewSet,
+    InventoryBatchViewSet, SupplyRequestViewSet, InventoryAlertViewSet, InventoryMovementViewSet,
+    ArchivedRecordViewSet, ReorderThresholdViewSet, AlertNotificationViewSet,
     CustomAuthToken, CurrentUserView,RequestItemAllocationViewSet,
     dashboard_supplies_overview, dashboard_hospitals_overview, 
     dashboard_inventory_alerts, dashboard_hospitals_map,
     dashboard_request_fulfillment, dashboard_alert_trends,
-    dashboard_hospital_rankings, dashboard_request_status
+    dashboard_hospital_rankings, dashboard_request_status,
+    export_data, lookup_list
 )
 
 router = DefaultRouter()
@@ -21,6 +23,10 @@ router.register(r'supplies', MedicalSupplyViewSet)
 router.register(r'inventory-batches', InventoryBatchViewSet)
 router.register(r'supply-requests', SupplyRequestViewSet)
 router.register(r'inventory-alerts', InventoryAlertViewSet)
+router.register(r'inventory-movements', InventoryMovementViewSet)
+router.register(r'archive', ArchivedRecordViewSet)
+router.register(r'reorder-thresholds', ReorderThresholdViewSet)
+router.register(r'alert-notifications', AlertNotificationViewSet)
 router.register(r'allocation-items', RequestItemAllocationViewSet, basename='allocation-item')
 
 urlpatterns = [
@@ -37,4 +43,10 @@ urlpatterns = [
     path('dashboard/alert-trends/', dashboard_alert_trends),
     path('dashboard/hospital-rankings/', dashboard_hospital_rankings),
     path('dashboard/request-status/', dashboard_request_status),
+
+    # 下拉选择器精简列表
+    path('lookups/<str:name>/', lookup_list),
+
+    # 流式导出
+    path('exports/<str:resource>/', export_data),
 ]
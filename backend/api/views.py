@@ -4,29 +4,83 @@ from rest_framework.authentication import SessionAuthentication, TokenAuthentica
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, CharFilter, BooleanFilter, DateFilter
-from django.db.models import Count, Sum, Q, F, Avg, OuterRef, Subquery, IntegerField, FloatField, Value, Case, When
+from django.db.models import (
+    Count, Sum, Min, Q, F, Avg, OuterRef, Subquery, IntegerField, FloatField, Value, Case, When, ExpressionWrapper
+)
 from django.db.models.functions import Coalesce, ExtractDay, Now
+from django.db import transaction, IntegrityError
+from django.http import StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
 from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
 import pandas as pd
 import numpy as np
 import math
 import logging
-from .models import Hospital, Supplier, MedicalSupply, InventoryBatch, SupplyRequest, RequestItem, InventoryAlert
+import csv
+import json
+import uuid
+from .functions import DaysUntil
+from .lookups import LOOKUP_SOURCES, get_lookup_payload
+from .solver import DEFAULT_NEIGHBOURS, DEFAULT_TRANSFER_CANDIDATES, build_allocation_plan, find_transfer_candidates
+from .allocation import allocate_item as allocate_from_stock
+from .expiry import expiring_quantities
+from .reorder import (
+    DEFAULT_LEAD_TIME_DAYS, DEFAULT_SERVICE_LEVEL, DEFAULT_WINDOW_DAYS, compute_reorder_thresholds
+)
+from .alerts import queue_alert_evaluation
+from .alert_history import alert_counts_by_day, total_alert_count
+from .notifications import notification_metrics
+from .ledger import build_movement, record_movements, stock_levels_at, consumption_between
+from .stock import refresh_stock_balances, refresh_stale_stock_balances
+from .models import (
+    Hospital, Supplier, MedicalSupply, InventoryBatch, SupplyRequest, RequestItem,
+    ItemFulfillment, InventoryAlert, StockBalance, InventoryMovement, ArchivedRecord, ReorderThreshold,
+    AlertNotification
+)
 from .serializers import (
     HospitalSerializer, SupplierSerializer, MedicalSupplySerializer,
     InventoryBatchSerializer, SupplyRequestSerializer, RequestItemSerializer,
     InventoryAlertSerializer, UserSerializer,
-    RequestItemAllocationSerializer, HospitalBasicSerializer, MedicalSupplyBasicSerializer
+    RequestItemAllocationSerializer, HospitalBasicSerializer, MedicalSupplyBasicSerializer,
+    InventoryBatchBulkCreateSerializer, InventoryBatchQuantitySerializer, RequestItemAllocateSerializer,
+    InventoryMovementSerializer, ArchivedRecordSerializer, ReorderThresholdSerializer, AlertNotificationSerializer
 )
 
 logger = logging.getLogger(__name__)
 
+# 批量接口单次请求允许的最大行数，以及 bulk_create/bulk_update 每条 SQL 的行数
+BULK_MAX_ROWS = 5000
+BULK_BATCH_SIZE = 500
+
+# 时点库存接口统计消耗的最长回溯天数
+STOCK_AT_MAX_DAYS = 3650
+
+
+def _date_param(query_params, name, default=None):
+    """解析单个日期查询参数 (YYYY-MM-DD)，格式错误或日期不存在时返回 400"""
+    value = query_params.get(name)
+    if not value:
+        return default
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({"error": f"{name} 格式应为 YYYY-MM-DD。"})
+    return parsed
+
+
+def _date_range_params(query_params):
+    """解析 ?start= / ?end= (YYYY-MM-DD)，格式错误或日期不存在时返回 400"""
+    return [_date_param(query_params, name) for name in ('start', 'end')]
+
 # 令牌认证视图，扩展DRF自带的视图
 class CustomAuthToken(ObtainAuthToken):
     def post(self, request, *args, **kwargs):
@@ -66,9 +120,151 @@ class HospitalViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(region__icontains=region)
         if level:
             queryset = queryset.filter(level=level)
-            
+
         return queryset
 
+    @action(detail=True, methods=['get'], url_path='inventory-summary')
+    def inventory_summary(self, request, pk=None):
+        """
+        Per-supply stock summary for one hospital, aggregated in a single grouped query:
+        total and non-expired quantity, earliest expiry, quantity-weighted days remaining
+        and whether non-expired stock is below the supply's min_stock_level.
+        """
+        hospital = self.get_object()
+        today = timezone.now().date()
+        not_expired = Q(expiration_date__gte=today, is_quarantined=False)
+
+        rows = InventoryBatch.objects.filter(
+            hospital=hospital, is_deleted=False, quantity__gt=0
+        ).values(
+            'supply_id', 'supply__name', 'supply__category', 'supply__unit', 'supply__min_stock_level'
+        ).annotate(
+            batch_count=Count('batch_id'),
+            total_quantity=Sum('quantity'),
+            available_quantity=Coalesce(Sum('quantity', filter=not_expired), 0),
+            earliest_expiry=Min('expiration_date', filter=not_expired),
+            weighted_days=Sum(
+                ExpressionWrapper(F('quantity') * DaysUntil('expiration_date', today), output_field=IntegerField()),
+                filter=not_expired
+            ),
+        ).order_by('supply__name')
+
+        category_labels = dict(MedicalSupply.SupplyCategory.choices)
+        supplies = []
+        by_category = {}
+        for row in rows:
+            # MySQL 的 SUM 返回 Decimal，这里统一转换为整数
+            available = int(row['available_quantity'])
+            total = int(row['total_quantity'])
+            category_display = category_labels.get(row['supply__category'], row['supply__category'])
+            supplies.append({
+                'supply_id': row['supply_id'],
+                'supply_name': row['supply__name'],
+                'category': row['supply__category'],
+                'category_display': category_display,
+                'unit': row['supply__unit'],
+                'batch_count': row['batch_count'],
+                'total_quantity': total,
+                'available_quantity': available,
+                'earliest_expiry': row['earliest_expiry'],
+                'avg_days_remaining': round(float(row['weighted_days']) / available, 1) if available else None,
+                'min_stock_level': row['supply__min_stock_level'],
+                'below_min_stock': available < row['supply__min_stock_level'],
+            })
+            by_category[category_display] = by_category.get(category_display, 0) + total
+
+        return Response({
+            'hospital_id': hospital.hospital_id,
+            'supply_count': len(supplies),
+            'total_quantity': sum(item['total_quantity'] for item in supplies),
+            'below_min_count': sum(1 for item in supplies if item['below_min_stock']),
+            'by_category': [{'name': name, 'value': value} for name, value in by_category.items()],
+            'supplies': supplies,
+        })
+
+    @action(detail=True, methods=['get'], url_path='stock-at')
+    def stock_at(self, request, pk=None):
+        """
+        Point-in-time stock for one hospital at the end of ?date= (default today),
+        plus consumption over the preceding ?days= (default 30). Both are read from
+        the latest daily snapshot plus the movements recorded after it.
+        """
+        hospital = self.get_object()
+        at_date = _date_param(request.query_params, 'date', default=timezone.now().date())
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"error": "days 必须是整数。"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < days <= STOCK_AT_MAX_DAYS:
+            return Response(
+                {"error": f"days 必须在 1 到 {STOCK_AT_MAX_DAYS} 之间。"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            since = at_date - timedelta(days=days)
+        except OverflowError:
+            return Response({"error": "date 减去 days 超出了可表示的日期范围。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        supply_param = request.query_params.get('supply')
+        supply_ids = [supply_param] if supply_param else None
+        levels = stock_levels_at(hospital.pk, at_date, supply_ids)
+        consumed = consumption_between(hospital.pk, since, at_date, supply_ids)
+        supplies = MedicalSupply.objects.in_bulk(set(levels) | set(consumed))
+
+        rows = []
+        for supply_id in sorted(set(levels) | set(consumed)):
+            supply = supplies.get(supply_id)
+            quantity = levels.get(supply_id, 0)
+            used = consumed.get(supply_id, 0)
+            if not quantity and not used:
+                continue
+            rows.append({
+                'supply_id': supply_id,
+                'supply_name': supply.name if supply else '',
+                'unit': supply.unit if supply else '',
+                'quantity': quantity,
+                'consumed': used,
+                'daily_consumption': round(used / days, 2),
+            })
+
+        return Response({
+            'hospital_id': hospital.hospital_id,
+            'date': at_date,
+            'days': days,
+            'supplies': rows,
+        })
+
+    @action(detail=True, methods=['get'], url_path='transfer-candidates')
+    def transfer_candidates(self, request, pk=None):
+        """
+        Nearest hospitals able to transfer ?quantity= units of ?supply= to this one:
+        their non-expired stock minus the supply's minimum stock level must cover the
+        quantity. Ranked by distance, then surplus. Optional ?k= and ?max_distance= (km).
+        """
+        hospital = self.get_object()
+        supply_code = request.query_params.get('supply')
+        if not supply_code:
+            return Response({"error": "缺少 supply 参数。"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quantity = int(request.query_params.get('quantity', 1))
+            k = int(request.query_params.get('k', DEFAULT_TRANSFER_CANDIDATES))
+            max_distance = request.query_params.get('max_distance')
+            max_distance = float(max_distance) if max_distance else None
+        except ValueError:
+            return Response({"error": "quantity、k 必须是整数，max_distance 必须是数字。"}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity <= 0 or k <= 0:
+            return Response({"error": "quantity 和 k 必须大于 0。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        supply = MedicalSupply.objects.filter(pk=supply_code, is_deleted=False).first()
+        if supply is None:
+            return Response({"error": f"物资 {supply_code} 不存在。"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'hospital_id': hospital.hospital_id,
+            'supply_id': supply.pk,
+            'quantity': quantity,
+            'candidates': find_transfer_candidates(hospital, supply, quantity, k=k, max_distance_km=max_distance),
+        })
+
 # 供应商管理视图集
 class SupplierViewSet(viewsets.ModelViewSet):
     queryset = Supplier.objects.filter(is_deleted=False)
@@ -113,6 +309,31 @@ class MedicalSupplyViewSet(viewsets.ModelViewSet):
             
         return queryset
 
+    @action(detail=True, methods=['get'], url_path='allocation-plan')
+    def allocation_plan(self, request, pk=None):
+        """
+        Dry run of the network-wide allocation for this supply: distributes available
+        stock across all open request items as a priority-weighted min-cost
+        transportation problem and returns the plan without applying it.
+        Optional ?k= (candidate sources per item) and ?reserve_min_stock=false.
+        """
+        supply = self.get_object()
+        try:
+            neighbours = int(request.query_params.get('k', DEFAULT_NEIGHBOURS))
+        except ValueError:
+            return Response({"error": "k 必须是整数。"}, status=status.HTTP_400_BAD_REQUEST)
+        if neighbours <= 0:
+            return Response({"error": "k 必须大于 0。"}, status=status.HTTP_400_BAD_REQUEST)
+        reserve_min_stock = request.query_params.get('reserve_min_stock', 'true').lower() != 'false'
+
+        try:
+            plan = build_allocation_plan(supply.pk, neighbours=neighbours, reserve_min_stock=reserve_min_stock)
+        except RuntimeError as e:
+            logger.error(f"Allocation plan failed for supply {supply.pk}: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        plan['applied'] = False
+        return Response(plan)
+
 # 库存批次视图集
 class InventoryBatchViewSet(viewsets.ModelViewSet):
     queryset = InventoryBatch.objects.filter(is_deleted=False)
@@ -133,9 +354,222 @@ class InventoryBatchViewSet(viewsets.ModelViewSet):
             # 过滤30天内过期的物资
             thirty_days_later = timezone.now().date() + timedelta(days=30)
             queryset = queryset.filter(expiration_date__lte=thirty_days_later)
-            
+
         return queryset
 
+    def _expiry_rows(self, request, start, end):
+        """按医院/物资汇总失效日期在 [start, end) 内的在库数量，附带名称"""
+        totals = expiring_quantities(
+            start, end,
+            hospital_id=request.query_params.get('hospital_id'),
+            supply_id=request.query_params.get('supply_id'),
+        )
+        hospitals = Hospital.objects.in_bulk({hospital_id for hospital_id, _ in totals})
+        supplies = MedicalSupply.objects.in_bulk({supply_id for _, supply_id in totals})
+        rows = []
+        for (hospital_id, supply_id), quantity in totals.items():
+            hospital, supply = hospitals.get(hospital_id), supplies.get(supply_id)
+            rows.append({
+                'hospital_id': hospital_id,
+                'hospital_name': hospital.name if hospital else '',
+                'supply_id': supply_id,
+                'supply_name': supply.name if supply else '',
+                'unit': supply.unit if supply else '',
+                'quantity': quantity,
+            })
+        rows.sort(key=lambda row: -row['quantity'])
+        return rows
+
+    @action(detail=False, methods=['get'], url_path='expiring')
+    def expiring(self, request):
+        """
+        Quantity on hand expiring within the next ?days= (default 30, today included),
+        grouped by hospital and supply. Read from the weekly expiry calendar; only the
+        partial weeks at either end touch the batch table.
+        Optional ?hospital_id= and ?supply_id=.
+        """
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"error": "days 必须是整数。"}, status=status.HTTP_400_BAD_REQUEST)
+        if days <= 0:
+            return Response({"error": "days 必须大于 0。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.now().date()
+        rows = self._expiry_rows(request, today, today + timedelta(days=days))
+        return Response({
+            'date': today,
+            'days': days,
+            'total_quantity': sum(row['quantity'] for row in rows),
+            'results': rows,
+        })
+
+    @action(detail=False, methods=['get'], url_path='expired-on-hand')
+    def expired_on_hand(self, request):
+        """
+        Quantity already past its expiration date but still on hand, grouped by
+        hospital and supply. Optional ?hospital_id= and ?supply_id=.
+        """
+        today = timezone.now().date()
+        rows = self._expiry_rows(request, None, today)
+        return Response({
+            'date': today,
+            'total_quantity': sum(row['quantity'] for row in rows),
+            'results': rows,
+        })
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Bulk receiving (POST) and bulk quantity adjustment (PATCH).
+        Body is a JSON list of rows. Foreign keys are resolved with one query
+        per model, valid rows are written in a single transaction and invalid
+        rows are reported back by index.
+        """
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "请求体必须是非空的 JSON 数组。"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > BULK_MAX_ROWS:
+            return Response(
+                {"error": f"单次最多提交 {BULK_MAX_ROWS} 行，当前为 {len(rows)} 行。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.method == 'PATCH':
+            return self._bulk_update_quantities(request, rows)
+        return self._bulk_create(request, rows)
+
+    def _bulk_create(self, request, rows):
+        errors = {}
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = InventoryBatchBulkCreateSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+
+        # 每个外键模型只查询一次
+        hospitals = Hospital.objects.filter(is_deleted=False).in_bulk(
+            {data['hospital'] for _, data in valid}
+        )
+        supplies = MedicalSupply.objects.filter(is_deleted=False).in_bulk(
+            {data['supply'] for _, data in valid}
+        )
+        suppliers = Supplier.objects.filter(is_deleted=False).in_bulk(
+            {data['supplier'] for _, data in valid if data.get('supplier')}
+        )
+        # 批次号唯一约束同样覆盖已逻辑删除的批次
+        existing_numbers = set(InventoryBatch.all_objects.filter(
+            batch_number__in=[data['batch_number'] for _, data in valid]
+        ).values_list('batch_number', flat=True))
+
+        received_by = request.user if request.user.is_authenticated else None
+        seen_numbers = set()
+        batches = []
+        for index, data in valid:
+            row_errors = {}
+            hospital = hospitals.get(data['hospital'])
+            supply = supplies.get(data['supply'])
+            supplier = suppliers.get(data['supplier']) if data.get('supplier') else None
+            if hospital is None:
+                row_errors['hospital'] = [f"医院 {data['hospital']} 不存在。"]
+            if supply is None:
+                row_errors['supply'] = [f"物资 {data['supply']} 不存在。"]
+            if data.get('supplier') and supplier is None:
+                row_errors['supplier'] = [f"供应商 {data['supplier']} 不存在。"]
+            if data['batch_number'] in existing_numbers or data['batch_number'] in seen_numbers:
+                row_errors['batch_number'] = [f"批次号 {data['batch_number']} 已存在。"]
+            if row_errors:
+                errors[index] = row_errors
+                continue
+
+            seen_numbers.add(data['batch_number'])
+            batches.append(InventoryBatch(
+                **{**data, 'hospital': hospital, 'supply': supply, 'supplier': supplier},
+                received_by=received_by,
+            ))
+
+        if batches:
+            try:
+                with transaction.atomic():
+                    InventoryBatch.objects.bulk_create(batches, batch_size=BULK_BATCH_SIZE)
+                    # bulk_create 不触发信号，显式记录入库流水并刷新库存余额
+                    record_movements([
+                        build_movement(batch, batch.quantity, InventoryMovement.MovementType.RECEIPT,
+                                       operator_id=batch.received_by_id)
+                        for batch in batches if batch.quantity
+                    ], batch_size=BULK_BATCH_SIZE)
+                    refresh_stock_balances({(batch.hospital_id, batch.supply_id) for batch in batches})
+                    queue_alert_evaluation({(batch.hospital_id, batch.supply_id) for batch in batches})
+            except IntegrityError as e:
+                # 并发入库时批次号可能在检查之后被占用，整批回滚
+                logger.warning(f"Bulk batch insert rolled back: {e}")
+                return Response(
+                    {"error": "批量入库失败，批次号冲突，请重试。", "detail": str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        return Response(
+            {
+                'created': len(batches),
+                'batches': [
+                    {'batch_id': batch.batch_id, 'batch_number': batch.batch_number}
+                    for batch in batches
+                ],
+                'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+            },
+            status=status.HTTP_201_CREATED if batches else status.HTTP_400_BAD_REQUEST
+        )
+
+    def _bulk_update_quantities(self, request, rows):
+        errors = {}
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = InventoryBatchQuantitySerializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+
+        updated = {}
+        operator_id = request.user.pk if request.user.is_authenticated else None
+        with transaction.atomic():
+            batches = InventoryBatch.objects.filter(is_deleted=False).select_for_update().in_bulk(
+                {data['batch_id'] for _, data in valid}
+            )
+            # 同一批次出现多次时以最后一行为准，流水记录相对加载时数量的净变动
+            original_quantities = {pk: batch.quantity for pk, batch in batches.items()}
+            now = timezone.now()
+            for index, data in valid:
+                batch = batches.get(data['batch_id'])
+                if batch is None:
+                    errors[index] = {'batch_id': [f"批次 {data['batch_id']} 不存在。"]}
+                    continue
+                batch.quantity = data['quantity']
+                batch.updated_at = now
+                updated[batch.pk] = batch
+
+            if updated:
+                InventoryBatch.objects.bulk_update(
+                    list(updated.values()), ['quantity', 'updated_at'], batch_size=BULK_BATCH_SIZE
+                )
+                record_movements([
+                    build_movement(batch, batch.quantity - original_quantities[pk],
+                                   InventoryMovement.MovementType.ADJUSTMENT, operator_id=operator_id)
+                    for pk, batch in updated.items() if batch.quantity != original_quantities[pk]
+                ], batch_size=BULK_BATCH_SIZE)
+                refresh_stock_balances({(batch.hospital_id, batch.supply_id) for batch in updated.values()})
+                queue_alert_evaluation({(batch.hospital_id, batch.supply_id) for batch in updated.values()})
+
+        return Response(
+            {
+                'updated': len(updated),
+                'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+            },
+            status=status.HTTP_200_OK if updated else status.HTTP_400_BAD_REQUEST
+        )
+
 # 请求项目视图集
 class RequestItemViewSet(viewsets.ModelViewSet):
     queryset = RequestItem.objects.filter(is_deleted=False)
@@ -192,7 +626,11 @@ class SupplyRequestViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], url_path='allocate-item')
     def allocate_item(self, request, pk=None):
         """
-        Update the allocated quantity for a specific RequestItem within this SupplyRequest.
+        Set the allocated quantity for a specific RequestItem within this SupplyRequest.
+        Stock is picked first-expiry-first-out from the request's hospital (or
+        'source_hospital_id'), creating ItemFulfillment rows and decrementing batches;
+        lowering the quantity returns stock from the latest fulfillments. Without
+        'allow_partial' a shortfall writes nothing and returns 409.
         Also triggers priority recalculation for requests of the same supply.
         Request body should contain 'item_id' and 'allocated_quantity'.
         """
@@ -215,16 +653,6 @@ class SupplyRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            request_item = RequestItem.objects.select_related('supply').get(
-                item_id=item_id, request=supply_request, is_deleted=False
-            )
-        except RequestItem.DoesNotExist:
-            return Response(
-                {"error": f"在此请求中未找到 ID 为 {item_id} 的请求项。"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
         if supply_request.status not in allowed_statuses:
             return Response(
                 {"error": "只有状态为 '已批准' 或 '已提交' 的请求才能进行分配。"}, # 更新错误信息
@@ -237,15 +665,54 @@ class SupplyRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if allocated_quantity > request_item.quantity:
-            return Response(
-                {"error": f"分配数量 ({allocated_quantity}) 不能超过请求数量 ({request_item.quantity})。"},
-                status=status.HTTP_400_BAD_REQUEST
+        source_hospital_id = request.data.get('source_hospital_id') or None
+        if source_hospital_id is not None:
+            try:
+                source_hospital_id = uuid.UUID(str(source_hospital_id))
+            except ValueError:
+                return Response(
+                    {"error": "'source_hospital_id' 必须是医院 ID (UUID)。"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not Hospital.objects.filter(pk=source_hospital_id, is_deleted=False).exists():
+                return Response(
+                    {"error": f"未找到 ID 为 {source_hospital_id} 的医院。"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        allow_partial = str(request.data.get('allow_partial', '')).lower() in ('1', 'true')
+        operator_id = request.user.pk if request.user.is_authenticated else None
+        with transaction.atomic():
+            try:
+                # 锁定请求项，同一请求项的并发分配串行执行；批次由分配引擎以 SKIP LOCKED 方式加锁
+                request_item = RequestItem.objects.select_related('supply', 'request') \
+                    .select_for_update(of=('self',)) \
+                    .get(item_id=item_id, request=supply_request, is_deleted=False)
+            except RequestItem.DoesNotExist:
+                return Response(
+                    {"error": f"在此请求中未找到 ID 为 {item_id} 的请求项。"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            if allocated_quantity > request_item.quantity:
+                return Response(
+                    {"error": f"分配数量 ({allocated_quantity}) 不能超过请求数量 ({request_item.quantity})。"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # --- 按 FEFO 出库或退回 ---
+            result = allocate_from_stock(
+                request_item, allocated_quantity, operator_id=operator_id,
+                source_hospital_id=source_hospital_id, allow_partial=allow_partial,
             )
-
-        # --- 更新和保存 ---
-        request_item.allocated = allocated_quantity
-        request_item.save()
+            if result.shortfall and not allow_partial:
+                return Response(
+                    {
+                        "error": f"可用库存不足，还差 {result.shortfall}。",
+                        "shortfall": result.shortfall,
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
 
         # --- 触发优先级重新计算 ---
         supply_code = request_item.supply.unspsc_code
@@ -255,9 +722,112 @@ class SupplyRequestViewSet(viewsets.ModelViewSet):
             except Exception as e:
                 logger.error(f"Error triggering priority recalculation: {e}")
 
-        # 返回更新后的请求项数据
-        serializer = RequestItemSerializer(request_item)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # 返回更新后的请求项数据及本次拣选结果
+        data = RequestItemSerializer(request_item).data
+        data['allocation'] = {
+            'picked': result.picked,
+            'released': result.released,
+            'shortfall': result.shortfall,
+            'fulfillments': [
+                {
+                    'fulfillment_id': fulfillment.fulfillment_id,
+                    'batch_id': fulfillment.inventory_batch_id,
+                    'quantity': fulfillment.quantity,
+                }
+                for fulfillment in result.fulfillments
+            ],
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='allocate-items')
+    def allocate_items(self, request):
+        """
+        Allocate many RequestItems, possibly across several SupplyRequests, in one call.
+        Body is a JSON list of {'item_id', 'allocated_quantity'}. Every row is validated
+        before anything is written, then each item is picked FEFO like allocate_item;
+        if any row fails or runs short nothing is applied. Priorities are
+        recalculated once per distinct supply afterwards.
+        """
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "请求体必须是非空的 JSON 数组。"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > BULK_MAX_ROWS:
+            return Response(
+                {"error": f"单次最多提交 {BULK_MAX_ROWS} 行，当前为 {len(rows)} 行。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        errors = {}
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = RequestItemAllocateSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+
+        allowed_statuses = [SupplyRequest.RequestStatus.APPROVED, SupplyRequest.RequestStatus.SUBMITTED]
+        with transaction.atomic():
+            items = RequestItem.objects.filter(is_deleted=False, request__is_deleted=False) \
+                .select_related('request') \
+                .order_by('pk') \
+                .select_for_update(of=('self',)) \
+                .in_bulk({data['item_id'] for _, data in valid})
+
+            updates = {}
+            for index, data in valid:
+                item = items.get(data['item_id'])
+                allocated_quantity = data['allocated_quantity']
+                if item is None:
+                    errors[index] = {'item_id': [f"未找到 ID 为 {data['item_id']} 的请求项。"]}
+                elif item.request.status not in allowed_statuses:
+                    errors[index] = {'item_id': ["只有状态为 '已批准' 或 '已提交' 的请求才能进行分配。"]}
+                elif allocated_quantity > item.quantity:
+                    errors[index] = {'allocated_quantity': [
+                        f"分配数量 ({allocated_quantity}) 不能超过请求数量 ({item.quantity})。"
+                    ]}
+                elif item.pk in updates:
+                    errors[index] = {'item_id': [f"请求项 {item.pk} 在本次提交中重复出现。"]}
+                else:
+                    updates[item.pk] = (item, allocated_quantity)
+
+            if errors:
+                return Response(
+                    {'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            operator_id = request.user.pk if request.user.is_authenticated else None
+            shortfalls = {}
+            for index, data in valid:
+                item, allocated_quantity = updates[data['item_id']]
+                result = allocate_from_stock(item, allocated_quantity, operator_id=operator_id)
+                if result.shortfall:
+                    shortfalls[index] = result.shortfall
+
+            if shortfalls:
+                # 任一请求项库存不足时整批回滚
+                transaction.set_rollback(True)
+                return Response(
+                    {'errors': [
+                        {'index': index, 'errors': {'allocated_quantity': [f"可用库存不足，还差 {shortfall}。"]}}
+                        for index, shortfall in sorted(shortfalls.items())
+                    ]},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        # --- 每种物资只触发一次优先级重新计算 ---
+        supply_codes = {item.supply_id for item, _ in updates.values()}
+        for supply_code in supply_codes:
+            try:
+                calculate_and_update_priorities(supply_code)
+            except Exception as e:
+                logger.error(f"Error triggering priority recalculation for supply {supply_code}: {e}")
+
+        return Response({
+            'updated': len(updates),
+            'supplies_recalculated': sorted(supply_codes),
+        }, status=status.HTTP_200_OK)
 
 # 库存预警视图集
 class InventoryAlertViewSet(viewsets.ModelViewSet):
@@ -294,6 +864,166 @@ class InventoryAlertViewSet(viewsets.ModelViewSet):
         
         return Response({"detail": "预警已标记为已解决"})
 
+# 出入库流水视图集 (只读，用于审计查询)
+class InventoryMovementViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = InventoryMovement.objects.select_related('hospital', 'supply', 'operator').order_by('-movement_id')
+    serializer_class = InventoryMovementSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 查询参数过滤；按医院查询时配合时间范围可以走 (hospital, occurred_at) 索引
+        hospital_id = self.request.query_params.get('hospital_id')
+        supply = self.request.query_params.get('supply')
+        batch_number = self.request.query_params.get('batch_number')
+        movement_type = self.request.query_params.get('movement_type')
+
+        if hospital_id:
+            queryset = queryset.filter(hospital_id=hospital_id)
+        if supply:
+            queryset = queryset.filter(supply_id=supply)
+        if batch_number:
+            queryset = queryset.filter(batch_number=batch_number)
+        if movement_type:
+            queryset = queryset.filter(movement_type=movement_type)
+        # 日期范围换算为时间范围，避免在 occurred_at 上套用 DATE() 导致索引失效
+        start, end = _date_range_params(self.request.query_params)
+        if start:
+            queryset = queryset.filter(occurred_at__gte=start)
+        if end:
+            queryset = queryset.filter(occurred_at__lt=end + timedelta(days=1))
+
+        return queryset
+
+# 再订货点视图集 (只读，由 recompute 或 compute_reorder_points 命令计算)
+class ReorderThresholdViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ReorderThreshold.objects.select_related('hospital', 'supply').order_by('hospital_id', 'supply_id')
+    serializer_class = ReorderThresholdSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 查询参数过滤
+        hospital_id = self.request.query_params.get('hospital_id')
+        supply = self.request.query_params.get('supply')
+
+        if hospital_id:
+            queryset = queryset.filter(hospital_id=hospital_id)
+        if supply:
+            queryset = queryset.filter(supply_id=supply)
+
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='recompute')
+    def recompute(self, request):
+        """
+        Recompute reorder points and safety stock from fulfillment history for the
+        whole network (or the hospitals in "hospital_ids"). Optional body fields:
+        window_days, lead_time_days, service_level.
+        """
+        try:
+            window_days = int(request.data.get('window_days', DEFAULT_WINDOW_DAYS))
+            lead_time_days = int(request.data.get('lead_time_days', DEFAULT_LEAD_TIME_DAYS))
+            service_level = float(request.data.get('service_level', DEFAULT_SERVICE_LEVEL))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "window_days、lead_time_days 必须是整数，service_level 必须是数字。"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if window_days <= 0 or lead_time_days <= 0 or not 0 < service_level < 1:
+            return Response(
+                {"error": "window_days、lead_time_days 必须大于 0，service_level 必须在 0 和 1 之间。"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        hospital_ids = request.data.get('hospital_ids') or None
+        if hospital_ids is not None:
+            try:
+                if not isinstance(hospital_ids, list):
+                    raise ValueError
+                hospital_ids = [uuid.UUID(str(hospital_id)) for hospital_id in hospital_ids]
+            except ValueError:
+                return Response(
+                    {"error": "hospital_ids 必须是医院 ID (UUID) 的数组。"}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+        started = timezone.now()
+        count = compute_reorder_thresholds(
+            hospital_ids, window_days=window_days, lead_time_days=lead_time_days, service_level=service_level,
+        )
+        return Response({
+            'count': count,
+            'window_days': window_days,
+            'lead_time_days': lead_time_days,
+            'service_level': service_level,
+            'seconds': round((timezone.now() - started).total_seconds(), 3),
+        })
+
+# 归档记录视图集 (只读)：已归档的请求、请求项、分配记录、预警和批次只能通过该接口查询
+class ArchivedRecordViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ArchivedRecord.objects.order_by('-record_id')
+    serializer_class = ArchivedRecordSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 查询参数过滤；root_id 可查出一个请求连同其请求项和分配记录
+        model = self.request.query_params.get('model')
+        object_id = self.request.query_params.get('object_id')
+        root_id = self.request.query_params.get('root_id')
+        hospital_id = self.request.query_params.get('hospital_id')
+        reason = self.request.query_params.get('reason')
+
+        if model:
+            queryset = queryset.filter(model=model)
+        if object_id:
+            queryset = queryset.filter(object_id=object_id)
+        if root_id:
+            queryset = queryset.filter(root_id=root_id)
+        if hospital_id:
+            queryset = queryset.filter(hospital_id=hospital_id)
+        if reason:
+            queryset = queryset.filter(reason=reason)
+        start, end = _date_range_params(self.request.query_params)
+        if start:
+            queryset = queryset.filter(closed_at__gte=start)
+        if end:
+            queryset = queryset.filter(closed_at__lt=end + timedelta(days=1))
+
+        return queryset
+
+# 预警通知摘要视图集 (只读，用于查看投递状态)
+class AlertNotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = AlertNotification.objects.select_related('hospital').order_by('-created_at')
+    serializer_class = AlertNotificationSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 查询参数过滤
+        hospital_id = self.request.query_params.get('hospital_id')
+        notification_status = self.request.query_params.get('status')
+        alert_type = self.request.query_params.get('alert_type')
+
+        if hospital_id:
+            queryset = queryset.filter(hospital_id=hospital_id)
+        if notification_status:
+            queryset = queryset.filter(status=notification_status)
+        if alert_type:
+            queryset = queryset.filter(alert_type=alert_type)
+
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def metrics(self, request):
+        """
+        Delivery metrics: digests per status, pending backlog and the age of the
+        oldest pending digest, plus throughput and delivery lag over the last
+        "window" minutes (default 60).
+        """
+        try:
+            window = int(request.query_params.get('window', 60))
+        except ValueError:
+            return Response({"error": "window 必须是整数。"}, status=status.HTTP_400_BAD_REQUEST)
+        if window < 1:
+            return Response({"error": "window 必须大于 0。"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(notification_metrics(window))
+
 # 新增：用于物资分配的 RequestItem 视图集
 class RequestItemAllocationFilter(FilterSet):
     supply_code = CharFilter(field_name='supply__unspsc_code', lookup_expr='exact')
@@ -373,12 +1103,13 @@ def dashboard_supplies_overview(request):
         # 3. 统计物资总数 (保持不变)
         total_supplies = MedicalSupply.objects.filter(is_deleted=False).count()
 
-        # 4. 高效计算低库存物资数量
-        batch_quantity_subquery = InventoryBatch.objects.filter(
-            supply=OuterRef('pk'),
-            is_deleted=False
+        # 4. 高效计算低库存物资数量 (读取库存余额表，每种物资只需汇总各医院的一行余额；
+        #    只计可用库存，已过期/隔离的批次不计入)
+        refresh_stale_stock_balances()
+        batch_quantity_subquery = StockBalance.objects.filter(
+            supply=OuterRef('pk')
         ).values('supply').annotate(
-            total_qty=Sum('quantity')
+            total_qty=Sum('available_quantity')
         ).values('total_qty')
 
         low_stock_supplies = MedicalSupply.objects.filter(is_deleted=False).annotate(
@@ -440,7 +1171,8 @@ def dashboard_inventory_alerts(request):
     获取库存预警概览和最近预警列表 (用于左下角组件)。
     """
     try:
-        total_alerts = InventoryAlert.objects.filter(is_deleted=False).count()
+        # 已压缩的历史预警计入日统计表
+        total_alerts = total_alert_count()
 
         unresolved_alerts = InventoryAlert.objects.filter(is_deleted=False, is_resolved=False).count()
 
@@ -619,6 +1351,8 @@ def dashboard_alert_trends(request):
             date_labels.append(current_date.strftime('%Y-%m-%d'))
             current_date += timedelta(days=1)
         
+        # 一次分组查询明细表，较早日期中已压缩的部分从日统计表读取
+        counts = alert_counts_by_day(start_date, end_date)
         datasets = []
         for alert_type_choice in InventoryAlert.AlertType.choices:
             alert_type = alert_type_choice[0]
@@ -627,12 +1361,7 @@ def dashboard_alert_trends(request):
             data = []
             for label_date in date_labels:
                 date_obj = timezone.datetime.strptime(label_date, '%Y-%m-%d').date()
-                count = InventoryAlert.objects.filter(
-                    alert_type=alert_type,
-                    created_at__date=date_obj,
-                    is_deleted=False
-                ).count()
-                data.append(count)
+                data.append(counts.get((date_obj, alert_type), 0))
             
             datasets.append({
                 'type': alert_type,
@@ -709,6 +1438,148 @@ def dashboard_request_status(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+# --- 下拉选择器精简列表 ---
+@api_view(['GET'])
+def lookup_list(request, name):
+    """
+    Compact id/name/code list for pickers, cached per process and keyed by a
+    database stamp shared by all processes. The version token and the strong
+    ETag are hashes of the list content, so requests that pass ?v=<version>
+    matching the current content get a long-lived immutable Cache-Control,
+    others revalidate.
+    """
+    if name not in LOOKUP_SOURCES:
+        return Response(
+            {"error": f"不支持的列表: {name}，可选: {', '.join(LOOKUP_SOURCES)}"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    payload, etag = get_lookup_payload(name)
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(payload)
+    response['ETag'] = etag
+    if request.query_params.get('v') == payload['version']:
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+# --- 流式导出 ---
+# 每种可导出资源：(基础查询集工厂, values() 投影字段, 按医院过滤时使用的字段)
+EXPORT_RESOURCES = {
+    'batches': (
+        lambda: InventoryBatch.objects.filter(is_deleted=False),
+        [
+            'batch_id', 'batch_number', 'hospital__org_code', 'hospital__name', 'supply_id',
+            'supply__name', 'supplier__name', 'quantity', 'unit_price', 'production_date',
+            'expiration_date', 'received_date', 'quality_check_passed', 'is_quarantined',
+        ],
+        'hospital_id',
+    ),
+    'requests': (
+        lambda: SupplyRequest.objects.filter(is_deleted=False),
+        [
+            'request_id', 'hospital__org_code', 'hospital__name', 'status', 'priority', 'emergency',
+            'request_time', 'required_by', 'requester__username', 'approver__username', 'approval_time',
+        ],
+        'hospital_id',
+    ),
+    'fulfillments': (
+        lambda: ItemFulfillment.objects.filter(is_deleted=False),
+        [
+            'fulfillment_id', 'request_item__request_id', 'request_item_id', 'request_item__supply_id',
+            'inventory_batch__batch_number', 'inventory_batch__hospital__name', 'quantity',
+            'fulfilled_by__username', 'fulfilled_time',
+        ],
+        'inventory_batch__hospital_id',
+    ),
+    'alerts': (
+        lambda: InventoryAlert.objects.filter(is_deleted=False),
+        [
+            'alert_id', 'hospital__org_code', 'hospital__name', 'supply_id', 'batch__batch_number',
+            'alert_type', 'message', 'is_resolved', 'resolved_time', 'created_at',
+        ],
+        'hospital_id',
+    ),
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """csv.writer 的伪文件对象，write 直接返回写入的行"""
+    def write(self, value):
+        return value
+
+
+def _iter_export_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield values() rows in primary-key order, one bounded chunk at a time.
+    Keyset pagination is used instead of QuerySet.iterator() because the MySQL
+    driver buffers the whole result set client-side, which would defeat streaming.
+    """
+    pk_name = queryset.model._meta.pk.name
+    queryset = queryset.order_by(pk_name).values(pk_name, *[field for field in fields if field != pk_name])
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][pk_name]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_data(request, resource):
+    """
+    Stream a full table as CSV (default) or NDJSON (?fmt=ndjson).
+    Optional ?hospital_id= narrows the export to one hospital.
+    """
+    if resource not in EXPORT_RESOURCES:
+        return Response(
+            {"error": f"不支持的导出类型: {resource}，可选: {', '.join(EXPORT_RESOURCES)}"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    fmt = request.query_params.get('fmt', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return Response({"error": "fmt 只能是 csv 或 ndjson。"}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset_factory, fields, hospital_field = EXPORT_RESOURCES[resource]
+    queryset = queryset_factory()
+    hospital_id = request.query_params.get('hospital_id')
+    if hospital_id:
+        queryset = queryset.filter(**{hospital_field: hospital_id})
+    rows = _iter_export_rows(queryset, fields)
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+
+        def stream():
+            yield writer.writerow(fields)
+            for row in rows:
+                yield writer.writerow([row[field] for field in fields])
+
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        def stream():
+            for row in rows:
+                yield json.dumps(
+                    {field: row[field] for field in fields}, cls=DjangoJSONEncoder, ensure_ascii=False
+                ) + '\n'
+
+        content_type = 'application/x-ndjson; charset=utf-8'
+
+    response = StreamingHttpResponse(stream(), content_type=content_type)
+    filename = f"{resource}_{timezone.now():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 # --- 辅助函数：计算优先级 (严格按照 Solve2.py 逻辑) ---
 def calculate_and_update_priorities(supply_code: str):
     """
@@ -756,32 +1627,23 @@ def calculate_and_update_priorities(supply_code: str):
         request_ids_to_update = set()
         today = timezone.now().date()
 
+        # 该物资在各医院的库存余额，一次查询取出 (先刷新因批次到期而过时的余额)
+        refresh_stale_stock_balances(supply_id=supply_code)
+        balances = {
+            balance.hospital_id: balance
+            for balance in StockBalance.objects.filter(supply_id=supply_code)
+        }
+
         for item in relevant_items:
             request_ids_to_update.add(item.request.request_id)
             hospital_id = item.request.hospital.hospital_id
-            supply_code_for_inventory = item.supply.unspsc_code
 
             # --- 库存相关计算 ---
-            valid_batches = InventoryBatch.objects.filter(
-                hospital_id=hospital_id,
-                supply__unspsc_code=supply_code_for_inventory,
-                is_deleted=False,
-                expiration_date__gte=today,
-                quantity__gt=0
-            )
-            # total_quantity 对应 Solve2.py 中的 total_quantity
-            current_stock = valid_batches.aggregate(total_qty=Coalesce(Sum('quantity'), 0))['total_qty']
-
-            weighted_days_sum = 0
-            total_qty_for_avg = 0
-            for batch in valid_batches:
-                days_remaining = (batch.expiration_date - today).days
-                days = max(0, days_remaining)
-                weighted_days_sum += days * batch.quantity
-                total_qty_for_avg += batch.quantity
-
-            # avg_days_remaining (成本指标)
-            avg_days_remaining = (weighted_days_sum / total_qty_for_avg) if total_qty_for_avg > 0 else 0
+            balance = balances.get(hospital_id)
+            # total_quantity 对应 Solve2.py 中的 total_quantity (未过期库存)
+            current_stock = balance.available_quantity if balance else 0
+            # avg_days_remaining (成本指标)，按数量加权的平均剩余天数
+            avg_days_remaining = balance.avg_days_remaining(today) if balance else 0
             # --- 库存相关计算结束 ---
 
             requested = item.requested_qty
@@ -58,6 +58,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # 如果使用CORS，需要添加
+    "api.middleware.AlertEvaluationMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -96,6 +97,23 @@ REST_FRAMEWORK = {
     ],
 }
 
+# 进程内缓存，用于下拉选择器精简列表等；多进程部署时可改为 Redis/Memcached 等共享缓存
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "hospital-supplies",
+    }
+}
+
+# 预警通知邮件的发送后端：默认输出到控制台；
+# 可改为 "django.core.mail.backends.filebased.EmailBackend" (写入 EMAIL_FILE_PATH)，
+# 或 "django.core.mail.backends.smtp.EmailBackend" (本地可用 python -m aiosmtpd -n -l localhost:1025 代替邮件中继)
+ALERT_NOTIFICATION_EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+EMAIL_HOST = "localhost"
+EMAIL_PORT = 1025
+EMAIL_FILE_PATH = BASE_DIR / "notifications"
+DEFAULT_FROM_EMAIL = "alerts@hospital-supplies.local"
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
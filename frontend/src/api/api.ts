@@ -225,6 +225,8 @@ export const ALERTS_API = {
 export const HOSPITALS_API = {
 	list: "/api/hospitals/",
 	detail: (id: string) => `/api/hospitals/${id}/`,
+	inventorySummary: (id: string) => `/api/hospitals/${id}/inventory-summary/`, // 按物资汇总的库存
+	lookup: "/api/lookups/hospitals/", // 下拉选择器精简列表
 	overview: "/api/dashboard/hospitals-overview/", // 确保这个路径与后端匹配
 	map: "/api/dashboard/hospitals-map/", // 确保这个路径与后端匹配
 };
@@ -240,6 +242,7 @@ export const INVENTORY_API = {
 export const SUPPLIES_API = {
 	list: "/api/supplies/",
 	detail: (id: string) => `/api/supplies/${id}/`,
+	lookup: "/api/lookups/supplies/", // 下拉选择器精简列表
 	overview: "/api/dashboard/supplies-overview/",
 };
 
@@ -256,6 +259,7 @@ export const REQUESTS_API = {
 	approve: (id: string) => `/api/supply-requests/${id}/approve/`, // 添加 approve URL
 	reject: (id: string) => `/api/supply-requests/${id}/reject/`, // 添加 reject URL
 	allocate_item: (id: string) => `/api/supply-requests/${id}/allocate-item/`, // 添加分配接口 URL
+	allocate_items: "/api/supply-requests/allocate-items/", // 批量分配接口 URL
 	status: "/api/dashboard/request-status/", // 确保这个路径与后端匹配
 	fulfillment: "/api/dashboard/request-fulfillment/", // 确保这个路径与后端匹配
 	trends: "/api/dashboard/alert-trends/", // 确保这个路径与后端匹配
@@ -27,11 +27,26 @@ export const getHospitals = (params?: any) => {
 	return GET(HOSPITALS_API.list, params || {});
 };
 
+/**
+ * 医院下拉选择器精简列表 (仅 id/名称/编码，带缓存版本号，不分页)
+ */
+export const getHospitalLookups = () => {
+	return GET(HOSPITALS_API.lookup, {});
+};
+
 // 修改后的医院详情API函数，合并了两个函数的功能
 export const getHospitalDetail = (id: string, params?: any) => {
 	return GET(HOSPITALS_API.detail(id), params || {});
 };
 
+/**
+ * 获取医院按物资汇总的库存 (服务端聚合，包含按类别汇总)
+ * @param id 医院ID
+ */
+export const getHospitalInventorySummary = (id: string) => {
+	return GET(HOSPITALS_API.inventorySummary(id), {});
+};
+
 export const hospitalsOverview = () => {
 	return GET(HOSPITALS_API.overview, {});
 };
@@ -91,6 +106,13 @@ export const getSupplies = (params?: any) => {
 	return GET(SUPPLIES_API.list, params || {});
 };
 
+/**
+ * 物资下拉选择器精简列表 (仅编码/名称/单位，带缓存版本号，不分页)
+ */
+export const getSupplyLookups = () => {
+	return GET(SUPPLIES_API.lookup, {});
+};
+
 export const getSupplyDetail = (code: string) => {
 	return GET(SUPPLIES_API.detail(code), {});
 };
@@ -155,6 +177,16 @@ export function updateRequestItemAllocation(
 	});
 }
 
+/**
+ * 批量更新多个请求项的分配数量 (可跨多个请求，全部校验通过后一次性提交)
+ * @param allocations 形如 [{ item_id, allocated_quantity }] 的数组
+ */
+export function updateRequestItemAllocations(
+	allocations: { item_id: string | number; allocated_quantity: number }[]
+) {
+	return POST(REQUESTS_API.allocate_items, allocations as any);
+}
+
 /**
  * 获取待分配的物资请求项列表
  * @param params 包含筛选和分页参数，例如 { supply_code: '...', request__hospital_id: '...', page: 1, page_size: 10, ordering: '-request__priority' }